@@ -0,0 +1,97 @@
+# Condition catalogue at scale: builds a synthetic SQLite catalogue, then
+# times lazy open, weighted sampling (overall and filtered), lookup by name
+# and end-to-end patient creation, next to the old
+# random.choice(list(dict)) approach over an in-memory dict of the same size.
+#
+#   cd src && python -m bench.catalogue --conditions 10000
+import argparse
+import os
+import random
+import string
+import tempfile
+import time
+
+from bench.common import percentile, rss_bytes
+from patient.catalogue import Condition, SQLiteCatalogue, build_catalogue
+
+SPECIALTIES = ["general practice", "neurology", "cardiology", "pulmonology", "gastroenterology",
+               "dermatology", "infectious disease", "endocrinology", "rheumatology", "psychiatry"]
+
+
+def synthetic_conditions(n: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+
+    def term() -> str:
+        return " ".join("".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9)))
+                        for _ in range(rng.randint(1, 3)))
+
+    conditions = []
+    for i in range(n):
+        symptoms = [term() for _ in range(6)]
+        conditions.append(Condition(
+            f"condition {i}", rng.choice(SPECIALTIES), rng.randint(1, 5), rng.paretovariate(1.5),
+            symptoms, [term() for _ in range(6)], [term() for _ in range(3)],
+            {symptoms[0]: [term()]},
+        ))
+    return conditions
+
+
+def timed(fn, repeat: int) -> list:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def report(name: str, samples: list):
+    print(f"{name:<34} p50={percentile(samples, 50) * 1e6:8.1f}us p99={percentile(samples, 99) * 1e6:8.1f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--conditions", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20000)
+    args = parser.parse_args()
+
+    conditions = synthetic_conditions(args.conditions)
+    path = os.path.join(tempfile.mkdtemp(), "catalogue.db")
+    start = time.perf_counter()
+    build_catalogue(path, conditions)
+    print(f"built {args.conditions} conditions in {time.perf_counter() - start:.2f}s, "
+          f"{os.path.getsize(path) / 2**20:.1f} MiB on disk")
+
+    # Old approach: everything resident in dicts, a list rebuilt per draw.
+    symptoms = {c.name: c.symptoms for c in conditions}
+    report("dict: random.choice(list(keys))",
+           timed(lambda: symptoms[random.choice(list(symptoms.keys()))], min(args.repeat, 2000)))
+    del symptoms, conditions
+
+    baseline = rss_bytes()
+    start = time.perf_counter()
+    catalogue = SQLiteCatalogue(path)
+    opened = time.perf_counter() - start
+    start = time.perf_counter()
+    catalogue.sample()
+    first = time.perf_counter() - start
+    print(f"open {opened * 1e3:.2f}ms, first sample (builds alias table) {first * 1e3:.1f}ms")
+
+    report("sqlite: weighted sample", timed(catalogue.sample, args.repeat))
+    catalogue.sample(specialty="neurology", difficulty=3)
+    report("sqlite: sample neurology/3", timed(lambda: catalogue.sample(specialty="neurology", difficulty=3),
+                                               args.repeat))
+    names = [f"condition {random.randrange(args.conditions)}" for _ in range(args.repeat)]
+    report("sqlite: get by name", timed(lambda: catalogue.get(names.pop()), args.repeat))
+
+    def create():
+        details = catalogue.sample()
+        return details.name, details.symptoms[:random.randint(4, 6)]
+
+    report("patient creation (catalogue part)", timed(create, args.repeat))
+    print(f"RSS after warm-up: +{(rss_bytes() - baseline) / 2**20:.1f} MiB "
+          f"(condition cache holds {catalogue._by_id.cache_info().currsize})")
+
+
+if __name__ == "__main__":
+    main()
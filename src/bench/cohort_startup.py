@@ -0,0 +1,62 @@
+# Session start-up for a whole class: a burst of concurrent create-patient
+# requests (one per trainee) against a single POST /api/cohort, for growing
+# class sizes.
+#
+#   cd src && python -m bench.cohort_startup --sizes 10,50,200
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from bench.common import free_port, percentile, start_server
+from main import manager
+
+
+async def burst(base: str, size: int) -> tuple:
+    async with httpx.AsyncClient(base_url=f"http://{base}", timeout=60) as client:
+        async def create(i: int) -> float:
+            start = time.perf_counter()
+            res = await client.post(f"/api/doctor/trainee_{size}_{i}/create-patient")
+            res.raise_for_status()
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(create(i) for i in range(size)))
+        return time.perf_counter() - start, latencies
+
+
+async def cohort(base: str, size: int) -> float:
+    async with httpx.AsyncClient(base_url=f"http://{base}", timeout=60) as client:
+        start = time.perf_counter()
+        res = await client.post("/api/cohort", json={"doctors": {f"cohort_{size}_{i}": 1 for i in range(size)}})
+        res.raise_for_status()
+        return time.perf_counter() - start
+
+
+async def run(args):
+    port = free_port()
+    server = start_server(port)
+    base = f"127.0.0.1:{port}"
+    await asyncio.sleep(0.5)
+
+    print(f"pool={manager.pool.size}")
+    print(f"{'class':>6} {'burst total':>12} {'p50 req':>9} {'p99 req':>9} {'cohort call':>12}")
+    for size in map(int, args.sizes.split(",")):
+        total, latencies = await burst(base, size)
+        single = await cohort(base, size)
+        print(f"{size:>6} {total * 1e3:>10.1f}ms {percentile(latencies, 50) * 1e3:>7.1f}ms "
+              f"{percentile(latencies, 99) * 1e3:>7.1f}ms {single * 1e3:>10.1f}ms")
+        await asyncio.sleep(0.2)
+    server.should_exit = True
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10,50,200")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# Cold-start cost of the server: wall time to import main in a fresh
+# interpreter, the modules that dominate it (from python -X importtime),
+# time until the port answers, and the first turn after startup with and
+# without the lifespan warm-up. Pass --history to append the results as a
+# JSON line so they can be tracked across commits.
+#
+#   cd src && python -m bench.cold_start --runs 5
+#   cd src && python -m bench.cold_start --history bench/data/cold_start.jsonl
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+import websockets
+
+from bench.common import free_port
+
+ENV = dict(os.environ, PATBOT_MODEL_PROVIDER="fake", PATBOT_LOG_FILE="", PATBOT_TRANSCRIPT_DIR="")
+
+
+def import_seconds(runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import main"], env=ENV, check=True)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def slowest_imports(top: int) -> list:
+    # importtime lines: "import time: self [us] | cumulative | package", nested by indent.
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], env=ENV,
+                         capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in out.splitlines()[1:]:
+        _, self_us, cumulative, name = (part.strip() for part in line.replace("import time:", "|").split("|"))
+        if "." not in name:
+            rows.append((int(cumulative) / 1e6, name))
+    return sorted(rows, reverse=True)[:top]
+
+
+async def first_turn(warmup: bool) -> tuple:
+    port = free_port()
+    env = dict(ENV, PATBOT_WARMUP="1" if warmup else "0", PATBOT_PATIENT_POOL="0")
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+            while True:
+                try:
+                    await client.get("/metrics")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.01)
+            ready = time.perf_counter() - start
+            # A trainee needs a moment to open the page before the first message.
+            await asyncio.sleep(2)
+            patient_id = (await client.post("/api/doctor/doc_cold/create-patient")).json()["patient_id"]
+
+        async with websockets.connect(f"ws://127.0.0.1:{port}/ws/patient/{patient_id}") as ws:
+            await ws.recv()
+            turn_start = time.perf_counter()
+            await ws.send(json.dumps({"message": "Hello, how are you today?"}))
+            while json.loads(await ws.recv())["type"] != "patient_response":
+                pass
+            turn = time.perf_counter() - turn_start
+    finally:
+        server.terminate()
+        server.wait()
+    return ready, turn
+
+
+def git_commit() -> str:
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+    return result.stdout.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8)
+    parser.add_argument("--history", help="append the results to this JSONL file")
+    args = parser.parse_args()
+
+    imported = import_seconds(args.runs)
+    print(f"import main     : {imported * 1e3:.0f}ms (median of {args.runs} fresh interpreters)")
+    print("slowest top-level imports (cumulative):")
+    for seconds, name in slowest_imports(args.top):
+        print(f"  {seconds * 1e3:8.1f}ms  {name}")
+
+    results = {"commit": git_commit(), "at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+               "import_ms": round(imported * 1e3)}
+    for warmup in (False, True):
+        ready, turn = asyncio.run(first_turn(warmup))
+        label = "warm-up" if warmup else "no warm-up"
+        print(f"{label:<11}: port answering after {ready * 1e3:.0f}ms, first turn {turn * 1e3:.0f}ms")
+        key = "warm" if warmup else "cold"
+        results[f"{key}_ready_ms"] = round(ready * 1e3)
+        results[f"{key}_first_turn_ms"] = round(turn * 1e3)
+
+    if args.history:
+        with open(args.history, "a") as f:
+            f.write(json.dumps(results) + "\n")
+
+
+if __name__ == "__main__":
+    main()
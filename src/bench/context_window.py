@@ -0,0 +1,80 @@
+# Prompt size and turn latency over long consultations, with and without the
+# bounded context window. The stubbed model charges a per-input-token delay
+# so that prompt growth shows up as latency.
+#
+#   cd src && python -m bench.context_window --turns 60
+import argparse
+import asyncio
+import time
+
+from bench.common import percentile
+from patient import agent
+from patient import patient as patient_module
+from patient.context import ContextWindow
+from patient.fake import FakeChatModel
+from patient.models import set_model
+from patient.patient import Patient
+
+DOCTOR_MESSAGES = [
+    "Hello, nice to meet you.",
+    "What symptoms are you experiencing?",
+    "How long have you had them, and do they get worse at night or after meals?",
+    "Do you smoke or drink alcohol regularly?",
+    "Any other symptoms you have noticed over the past week?",
+    "Have you travelled anywhere recently or been around anyone who was sick?",
+]
+
+REPLY = (
+    "Honestly it has been a rough few days. I have been trying to keep up with work but "
+    "I keep having to stop and rest, and I am not sleeping well either, which makes it all "
+    "feel worse in the mornings when I have to get going again."
+)
+
+SUMMARY = (
+    "The doctor asked about my symptoms, how long I have had them, my habits and recent travel."
+    " I said I have been run down for a few days and am sleeping badly."
+)
+
+
+async def replay(window: ContextWindow, turns: int, input_token_latency: float):
+    agent.context_window = patient_module.context_window = lambda: window
+    model = FakeChatModel(responses=[REPLY], input_token_latency=input_token_latency)
+    set_model("helper", FakeChatModel(responses=["general_question"], script={"New lines:": SUMMARY}))
+    set_model("patient", model)
+
+    patient = Patient("common cold", ["runny nose", "sore throat", "mild cough", "congestion"])
+    rows = []
+    for i in range(turns):
+        start = time.perf_counter()
+        await patient.adoc_turn(DOCTOR_MESSAGES[i % len(DOCTOR_MESSAGES)])
+        rows.append((model.last_input_tokens, time.perf_counter() - start))
+    return rows
+
+
+def report(name: str, rows: list, every: int):
+    print(f"\n{name}")
+    print(f"{'turn':>5} {'prompt tokens':>14} {'latency ms':>11}")
+    for i, (tokens, latency) in enumerate(rows, 1):
+        if i == 1 or i % every == 0:
+            print(f"{i:>5} {tokens:>14} {latency * 1e3:>11.1f}")
+    latencies = [latency for _, latency in rows]
+    print(f"total prompt tokens={sum(t for t, _ in rows)} "
+          f"p50={percentile(latencies, 50) * 1e3:.1f}ms p99={percentile(latencies, 99) * 1e3:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=60)
+    parser.add_argument("--every", type=int, default=10, help="print every Nth turn")
+    parser.add_argument("--input-token-latency", type=float, default=0.0002,
+                        help="stubbed prefill seconds per prompt token")
+    args = parser.parse_args()
+
+    full = asyncio.run(replay(ContextWindow(recent_turns=0), args.turns, args.input_token_latency))
+    windowed = asyncio.run(replay(ContextWindow.from_env(), args.turns, args.input_token_latency))
+    report("full history", full, args.every)
+    report("windowed (PATBOT_CONTEXT_* budgets)", windowed, args.every)
+
+
+if __name__ == "__main__":
+    main()
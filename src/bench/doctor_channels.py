@@ -0,0 +1,144 @@
+# Server-side sockets and memory for many concurrent doctors, each with
+# several patients attached (and optionally a few turns each): one socket
+# per patient versus one multiplexed /ws/doctor socket (JSON or MessagePack).
+#
+#   cd src && python -m bench.doctor_channels --doctors 1000 --patients 5
+#   cd src && python -m bench.doctor_channels --doctors 100 --patients 5 --turns 2
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from contextlib import suppress
+
+import httpx
+import ormsgpack
+import websockets
+
+from bench.common import free_port
+
+MESSAGE = "What symptoms are you experiencing?"
+
+
+def server_stats(pid: int) -> tuple:
+    with open(f"/proc/{pid}/status") as f:
+        rss = next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmRSS"))
+    fds = os.listdir(f"/proc/{pid}/fd")
+    sockets = 0
+    for fd in fds:
+        with suppress(OSError):
+            sockets += os.readlink(f"/proc/{pid}/fd/{fd}").startswith("socket:")
+    return rss, sockets
+
+
+def start(port: int) -> subprocess.Popen:
+    env = dict(os.environ, PATBOT_MODEL_PROVIDER="fake", PATBOT_LOG_FILE="", PATBOT_TRANSCRIPT_DIR="",
+               PATBOT_PATIENT_POOL="0", PATBOT_MAX_PATIENTS="1000000", PATBOT_WS_PING_INTERVAL="600")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+    )
+    while True:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/metrics")
+            return server
+        except httpx.ConnectError:
+            time.sleep(0.1)
+
+
+async def open_patients(base: str, doctors: dict, binary: bool) -> list:
+    async def connect(patient_id: str):
+        ws = await websockets.connect(f"ws://{base}/ws/patient/{patient_id}", max_size=None, open_timeout=None)
+        await ws.recv()
+        return ws, [patient_id]
+
+    ids = [patient_id for patient_ids in doctors.values() for patient_id in patient_ids]
+    return await asyncio.gather(*(connect(patient_id) for patient_id in ids))
+
+
+async def open_doctors(base: str, doctors: dict, binary: bool) -> list:
+    encode = ormsgpack.packb if binary else json.dumps
+
+    async def connect(doctor_id: str, patient_ids: list):
+        encoding = "msgpack" if binary else "json"
+        ws = await websockets.connect(f"ws://{base}/ws/doctor/{doctor_id}?encoding={encoding}", max_size=None,
+                                      open_timeout=None)
+        await ws.recv()
+        for patient_id in patient_ids:
+            await ws.send(encode({"type": "attach", "patient_id": patient_id}))
+            await ws.recv()
+        return ws, patient_ids
+
+    return await asyncio.gather(*(connect(d, ids) for d, ids in doctors.items()))
+
+
+async def turn(ws, patient_ids: list, mode: str) -> int:
+    encode = ormsgpack.packb if mode == "msgpack" else json.dumps
+    decode = ormsgpack.unpackb if mode == "msgpack" else json.loads
+    for patient_id in patient_ids:
+        frame = {"message": MESSAGE} if mode == "patient" else {"type": "message", "patient_id": patient_id,
+                                                                "message": MESSAGE}
+        await ws.send(encode(frame))
+    received, pending = 0, len(patient_ids)
+    while pending:
+        frame = await ws.recv()
+        received += len(frame)
+        pending -= decode(frame)["type"] == "patient_response"
+    return received
+
+
+async def run(mode: str, doctors: int, patients: int, turns: int):
+    port = free_port()
+    server = start(port)
+    base = f"127.0.0.1:{port}"
+    try:
+        async with httpx.AsyncClient(timeout=None) as client:
+            cohort = (await client.post(f"http://{base}/api/cohort", json={
+                "doctors": {f"doctor_{i}": patients for i in range(doctors)}, "seed": 1,
+            })).json()
+        by_doctor = {}
+        for p in cohort["patients"]:
+            by_doctor.setdefault(p["doctor_id"], []).append(p["patient_id"])
+        await asyncio.sleep(0.5)
+        rss_before, sockets_before = server_stats(server.pid)
+
+        start_time = time.perf_counter()
+        opener = open_patients if mode == "patient" else open_doctors
+        sockets = await opener(base, by_doctor, binary=mode == "msgpack")
+        connect_time = time.perf_counter() - start_time
+        rss_after, sockets_after = server_stats(server.pid)
+
+        received = 0
+        start_time = time.perf_counter()
+        for _ in range(turns):
+            received += sum(await asyncio.gather(*(turn(ws, ids, mode) for ws, ids in sockets)))
+        turn_time = time.perf_counter() - start_time
+        await asyncio.gather(*(ws.close() for ws, _ in sockets))
+    finally:
+        server.terminate()
+        server.wait()
+
+    grown = rss_after - rss_before
+    line = (f"{mode:<8} sockets={sockets_after - sockets_before:6d} connect={connect_time:5.1f}s "
+            f"server rss +{grown / 2 ** 20:6.1f}MiB ({grown / doctors / 1024:5.1f}KiB per doctor)")
+    if turns:
+        line += f" turn frames={received / (len(cohort['patients']) * turns):5.0f}B per patient turn {turn_time:5.1f}s"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--doctors", type=int, default=1000)
+    parser.add_argument("--patients", type=int, default=5)
+    parser.add_argument("--turns", type=int, default=0, help="turns per patient after connecting")
+    parser.add_argument("--modes", default="patient,json,msgpack")
+    args = parser.parse_args()
+
+    for mode in args.modes.split(","):
+        asyncio.run(run(mode, args.doctors, args.patients, args.turns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# Two-call (classify, then reply) versus fused single-call turns over the
+# labelled consultations: turn latency, model calls, tokens and how often
+# the stage matches the label. Offline, the fake models answer from the
+# recording, so accuracy is only meaningful with --live.
+#
+#   cd src && python -m bench.fused_turns --latency 0.4 --patients 20
+#   cd src && python -m bench.fused_turns --live --patients 5   # needs ANTHROPIC_API_KEY
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+from bench.common import percentile
+from bench.replay import RECORDING, load_consultations
+from patient import agent
+from patient.classifier import default_classifier
+from patient.fake import FakeChatModel, load_script
+from patient.instrumentation import LLM_CALL_SECONDS, LLM_TOKENS
+from patient.models import get_model, set_model
+from patient.patient import Patient
+
+
+def tokens(direction: str) -> float:
+    return sum(value for _, labels, value in LLM_TOKENS.samples() if ("direction", direction) in labels)
+
+
+def fused_script(consultations: list) -> dict:
+    script = {}
+    for consultation in consultations:
+        for turn in consultation["turns"]:
+            disclosed = consultation["symptoms"] if turn["stage"] == "symptom_inquiry" else []
+            script[turn["doctor"]] = json.dumps({"intent": turn["stage"], "disclosed": disclosed,
+                                                 "reply": turn["patient"]})
+    return script
+
+
+async def consult(recorded: dict, stats: dict):
+    patient = Patient(recorded["condition"], recorded["symptoms"])
+    for turn in recorded["turns"]:
+        start = time.perf_counter()
+        first = None
+        async for _ in patient.astream_turn(turn["doctor"]):
+            if first is None:
+                first = time.perf_counter() - start
+        stats["latencies"].append(time.perf_counter() - start)
+        stats["ttfts"].append(first if first is not None else stats["latencies"][-1])
+        stats["correct"] += patient.state["convo_stage"] == turn["stage"]
+
+
+async def run(mode: str, args, consultations: list):
+    agent.GRAPH_MODE = mode
+    agent.shared_graph.cache_clear()
+    LLM_TOKENS.reset()
+    LLM_CALL_SECONDS.reset()
+    stats = {"latencies": [], "ttfts": [], "correct": 0}
+
+    await asyncio.gather(*(consult(consultations[i % len(consultations)], stats) for i in range(args.patients)))
+    turns = len(stats["latencies"])
+    print(f"{mode:>10} {turns:>6} {statistics.mean(stats['latencies']) * 1e3:>8.0f}ms "
+          f"{percentile(stats['latencies'], 95) * 1e3:>8.0f}ms {percentile(stats['ttfts'], 50) * 1e3:>9.0f}ms "
+          f"{LLM_CALL_SECONDS.total() / turns:>7.2f} {tokens('input') / turns:>8.0f} {tokens('output') / turns:>7.0f} "
+          f"{stats['correct'] / turns:>9.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patients", type=int, default=20, help="concurrent consultations")
+    parser.add_argument("--latency", type=float, default=0.4, help="seconds per fake model call")
+    parser.add_argument("--token-latency", type=float, default=0.01)
+    parser.add_argument("--rules", action="store_true", help="keep the rule-based intent fast path on")
+    parser.add_argument("--live", action="store_true", help="use the configured Anthropic models")
+    args = parser.parse_args()
+
+    os.environ["PATBOT_INTENT_RULES"] = "1" if args.rules else "0"
+    os.environ["PATBOT_INTENT_CACHE_SIZE"] = "0"
+    default_classifier.cache_clear()
+    consultations = load_consultations(RECORDING)
+    helper_script = load_script(str(RECORDING), "helper")
+    patient_script = load_script(str(RECORDING), "patient")
+    fused = fused_script(consultations)
+    helper = get_model("helper") if args.live else FakeChatModel(script=helper_script, responses=["general_question"],
+                                                                  latency=args.latency)
+
+    print(f"patients={args.patients} {'live models' if args.live else f'latency={args.latency}s'} rules={args.rules}")
+    print(f"{'mode':>10} {'turns':>6} {'mean':>10} {'p95':>10} {'ttft p50':>11} {'calls':>7} "
+          f"{'in tok':>8} {'out tok':>7} {'stage acc':>9}")
+    for mode in ("sequential", "fused"):
+        if not args.live:
+            script = fused if mode == "fused" else patient_script
+            set_model("patient", FakeChatModel(script=script, latency=args.latency, token_latency=args.token_latency))
+            set_model("helper", helper)
+        asyncio.run(run(mode, args, consultations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# Accuracy, coverage and latency of the intent classifier tiers over a
+# labelled corpus of doctor messages. The naive Bayes tier is scored with
+# k-fold cross-validation so it never sees the messages it is tested on.
+#
+#   cd src && python -m bench.intent_classifier [--llm]
+import argparse
+import random
+import time
+from pathlib import Path
+
+from bench.common import percentile
+from patient.classifier import NaiveBayesClassifier, RuleClassifier, TieredClassifier, load_corpus
+
+CORPUS = Path(__file__).parent / "data" / "intents.jsonl"
+
+
+def score(name: str, classify, corpus: list):
+    answered = correct = 0
+    latencies = []
+    for text, label in corpus:
+        start = time.perf_counter()
+        predicted = classify(text)
+        latencies.append(time.perf_counter() - start)
+        if predicted is not None:
+            answered += 1
+            correct += predicted == label
+    accuracy = correct / answered if answered else 0.0
+    print(f"{name:<12} coverage={answered / len(corpus):6.1%} accuracy={accuracy:6.1%} "
+          f"p50={percentile(latencies, 50) * 1e3:8.3f}ms p99={percentile(latencies, 99) * 1e3:8.3f}ms")
+
+
+def cross_validated(corpus: list, folds: int, min_confidence: float, with_rules: bool):
+    shuffled = corpus[:]
+    random.Random(0).shuffle(shuffled)
+    rules = RuleClassifier() if with_rules else None
+    predictions = {}
+    for k in range(folds):
+        held_out = shuffled[k::folds]
+        train = [row for i, row in enumerate(shuffled) if i % folds != k]
+        tiered = TieredClassifier(rules, NaiveBayesClassifier(min_confidence).fit(train))
+        for text, _ in held_out:
+            predictions[text] = tiered
+    return lambda text: predictions[text].classify(text)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", default=str(CORPUS))
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--min-confidence", type=float, default=0.9)
+    parser.add_argument("--llm", action="store_true", help="also score the helper model (needs the API)")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    print(f"corpus: {len(corpus)} labelled messages")
+    score("rules", RuleClassifier().classify, corpus)
+    score("naive-bayes", cross_validated(corpus, args.folds, args.min_confidence, False), corpus)
+    score("tiered", cross_validated(corpus, args.folds, args.min_confidence, True), corpus)
+
+    if args.llm:
+        from patient.agent import intent_prompt
+        from patient.models import get_model
+
+        helper = get_model("helper")
+        score("llm", lambda text: helper.invoke(intent_prompt(text)).content.strip(), corpus)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# Keyword scanning cost as the condition catalogue grows: the old per-keyword
+# substring loop, one flat regex alternation, and the prefix-factored
+# KeywordMatcher, each scanning a doctor message against every treatment
+# keyword in a synthetic catalogue.
+#
+#   cd src && python -m bench.keyword_matcher --sizes 10,100,1000,5000
+import argparse
+import random
+import re
+import string
+import time
+
+from bench.common import percentile
+from patient.diagnosis import TREATMENT_OPTIONS
+from patient.matcher import KeywordMatcher
+
+MESSAGES = [
+    "I'd recommend plenty of rest, fluids and paracetamol for the fever.",
+    "No antibiotics for now, let's try a saline nasal spray and steam inhalation.",
+    "I'm prescribing omeprazole; avoid spicy food and take antacids after meals.",
+    "Start you on amoxicillin twice daily for a week and come back if it gets worse.",
+]
+
+
+def synthetic_catalogue(size: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    real = [term for options in TREATMENT_OPTIONS.values() for term in options["accepted"] + options["rejected"]]
+
+    def term() -> str:
+        if rng.random() < 0.2:
+            return rng.choice(real)
+        words = rng.randint(1, 3)
+        return " ".join("".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10))) for _ in range(words))
+
+    return {
+        f"condition {i}": {
+            "accepted": [term() for _ in range(8)],
+            "rejected": [term() for _ in range(4)],
+        }
+        for i in range(size)
+    }
+
+
+def flatten(catalogue: dict) -> dict:
+    terms = {}
+    for options in catalogue.values():
+        terms.update({term: "rejected" for term in options["rejected"]})
+        terms.update({term: "accepted" for term in options["accepted"]})
+    return terms
+
+
+def naive(terms: dict):
+    keywords = list(terms)
+    return lambda text: [keyword for keyword in keywords if keyword in text.lower()]
+
+
+def flat_regex(terms: dict):
+    alternation = "|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True))
+    pattern = re.compile(rf"(?<![\w'])(?:{alternation})(?![\w'])", re.IGNORECASE)
+    return lambda text: pattern.findall(text)
+
+
+def time_scan(scan, repeat: int) -> list:
+    samples = []
+    for _ in range(repeat):
+        for message in MESSAGES:
+            start = time.perf_counter()
+            scan(message)
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10,100,1000,5000", help="comma separated catalogue sizes")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'conditions':>10} {'keywords':>9} {'impl':>12} {'build ms':>9} {'p50 us':>9} {'p99 us':>9}")
+    for size in map(int, args.sizes.split(",")):
+        terms = flatten(synthetic_catalogue(size))
+        for name, build in (("substring", naive), ("flat regex", flat_regex),
+                            ("matcher", lambda t: KeywordMatcher(t).scan)):
+            start = time.perf_counter()
+            scan = build(terms)
+            built = time.perf_counter() - start
+            samples = time_scan(scan, args.repeat)
+            print(f"{size:>10} {len(terms):>9} {name:>12} {built * 1e3:>9.1f} "
+                  f"{percentile(samples, 50) * 1e6:>9.1f} {percentile(samples, 99) * 1e6:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
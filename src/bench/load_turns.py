@@ -0,0 +1,85 @@
+# Load test for the /ws/patient path: N simulated doctors hold concurrent
+# consultations against a stubbed model on a single uvicorn worker.
+#
+#   cd src && python -m bench.load_turns --doctors 200 --turns 5 --latency 0.5
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+import websockets
+
+from bench.common import free_port, percentile, start_server
+from patient.models import set_model
+from patient.fake import FakeChatModel
+
+DOCTOR_MESSAGES = [
+    "Hello, how are you today?",
+    "What symptoms are you experiencing?",
+    "How long have you been feeling like this?",
+    "Any other symptoms?",
+    "I suggest rest and fluids.",
+]
+
+
+async def doctor(base: str, doctor_id: str, turns: int, latencies: list, ttfts: list):
+    async with httpx.AsyncClient(base_url=f"http://{base}") as client:
+        res = await client.post(f"/api/doctor/{doctor_id}/create-patient")
+        patient_id = res.json()["patient_id"]
+
+    async with websockets.connect(f"ws://{base}/ws/patient/{patient_id}", max_size=None) as ws:
+        await ws.recv()
+        for i in range(turns):
+            start = time.perf_counter()
+            first_token = None
+            await ws.send(json.dumps({"message": DOCTOR_MESSAGES[i % len(DOCTOR_MESSAGES)]}))
+            while True:
+                frame = json.loads(await ws.recv())
+                if frame["type"] == "patient_response_delta" and first_token is None:
+                    first_token = time.perf_counter() - start
+                if frame["type"] in ("patient_response", "error"):
+                    break
+            ttfts.append(first_token if first_token is not None else time.perf_counter() - start)
+            latencies.append(time.perf_counter() - start)
+
+
+async def run(args):
+    port = free_port()
+    server = start_server(port)
+    latencies = []
+    ttfts = []
+
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        doctor(f"127.0.0.1:{port}", f"doctor_{i}", args.turns, latencies, ttfts)
+        for i in range(args.doctors)
+    ))
+    elapsed = time.perf_counter() - start
+    server.should_exit = True
+
+    print(f"doctors={args.doctors} turns={args.turns} model_latency={args.latency:.3f}s "
+          f"token_latency={args.token_latency:.3f}s")
+    print(f"turns completed : {len(latencies)} in {elapsed:.2f}s ({len(latencies) / elapsed:.1f} turns/s)")
+    print(f"first token     : p50={percentile(ttfts, 50):.3f}s p99={percentile(ttfts, 99):.3f}s")
+    print(f"turn latency    : p50={percentile(latencies, 50):.3f}s p99={percentile(latencies, 99):.3f}s "
+          f"max={max(latencies):.3f}s mean={statistics.mean(latencies):.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--doctors", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.5, help="stubbed seconds per model call")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="stubbed seconds between tokens")
+    args = parser.parse_args()
+
+    set_model("helper", FakeChatModel(responses=["symptom_inquiry"], latency=args.latency))
+    set_model("patient", FakeChatModel(responses=["I've had a sore throat since yesterday."],
+                                       latency=args.latency, token_latency=args.token_latency))
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
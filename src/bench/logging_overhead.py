@@ -0,0 +1,67 @@
+# Caller-side cost of logging one turn (three records with the full message
+# text), with handlers called inline as before and with the queue pipeline.
+#
+#   cd src && python -m bench.logging_overhead --turns 20000
+import argparse
+import logging
+import logging.handlers
+import queue
+import tempfile
+import time
+
+from bench.common import percentile
+from patient.transcripts import DeferredQueueHandler, TranscriptHandler, rotating_file_handler, transcript
+
+TEXT = "I've had a sore throat since yesterday and my nose keeps running, especially in the mornings."
+
+
+def log_turns(turns: int) -> list:
+    samples = []
+    for i in range(turns):
+        start = time.perf_counter()
+        transcript(f"patient_{i % 200}", "doctor", text="What symptoms are you experiencing?")
+        transcript(f"patient_{i % 200}", "patient", text=TEXT, stage="symptom_inquiry", accepted=False)
+        transcript(f"patient_{i % 200}", "turn", seconds=0.5)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=20000)
+    args = parser.parse_args()
+
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    directory = tempfile.mkdtemp()
+    handlers = [
+        rotating_file_handler(f"{directory}/conversations.log", 10 << 20, 5, compress=True),
+        TranscriptHandler(f"{directory}/transcripts"),
+    ]
+    handlers[0].setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+
+    for handler in handlers:
+        root.addHandler(handler)
+    inline = log_turns(args.turns)
+    for handler in handlers:
+        root.removeHandler(handler)
+
+    records: queue.Queue = queue.Queue(-1)
+    queued = DeferredQueueHandler(records)
+    listener = logging.handlers.QueueListener(records, *handlers)
+    listener.start()
+    root.addHandler(queued)
+    deferred = log_turns(args.turns)
+    root.removeHandler(queued)
+    start = time.perf_counter()
+    listener.stop()
+    drain = time.perf_counter() - start
+
+    for name, samples in (("inline handlers", inline), ("queue + listener", deferred)):
+        print(f"{name:<17} p50={percentile(samples, 50) * 1e6:7.1f}us p99={percentile(samples, 99) * 1e6:7.1f}us "
+              f"max={max(samples) * 1e3:6.2f}ms per turn")
+    print(f"listener drained the backlog {drain:.2f}s after the last turn")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Long consultations against zero-latency fake models: how per-turn
+# overhead grows with the length of the session, and how much memory each
+# patient holds once its session is over.
+#
+#   cd src && python -m bench.long_sessions --patients 20 --turns 200
+import argparse
+import asyncio
+import gc
+import statistics
+import time
+import tracemalloc
+
+from patient.fake import FakeChatModel
+from patient.models import set_model
+from patient.patient import Patient
+
+QUESTIONS = [
+    "How are you feeling today?",
+    "Can you describe your symptoms?",
+    "When did this start?",
+    "Does anything make it better or worse?",
+    "Have you taken any medication for it?",
+    "How have you been sleeping?",
+]
+REPLY = "It has been about the same, doctor. A bit worse in the mornings, better after I rest for a while."
+
+
+async def session(turns: int, timings: list) -> Patient:
+    patient = Patient("common cold", ["runny nose", "sore throat", "mild cough", "congestion"])
+    for i in range(turns):
+        start = time.perf_counter()
+        await patient.adoc_turn(f"{QUESTIONS[i % len(QUESTIONS)]} ({i})")
+        timings[i].append(time.perf_counter() - start)
+    return patient
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patients", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--bucket", type=int, default=20, help="turns per row")
+    parser.add_argument("--memory-patients", type=int, default=5, help="sessions replayed under tracemalloc")
+    args = parser.parse_args()
+
+    set_model("helper", FakeChatModel(responses=["general_question"]))
+    set_model("patient", FakeChatModel(responses=[REPLY]))
+    timings = [[] for _ in range(args.turns)]
+    # Warm the graph and caches outside the measurement.
+    asyncio.run(session(2, [[], []]))
+
+    for _ in range(args.patients):
+        asyncio.run(session(args.turns, timings))
+
+    # tracemalloc slows turns down several times over, so memory gets its own pass.
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    patients = [asyncio.run(session(args.turns, [[] for _ in range(args.turns)])) for _ in range(args.memory_patients)]
+    gc.collect()
+    held = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, "filename"))
+    tracemalloc.stop()
+
+    print(f"{'turns':>9} {'median ms':>10} {'p90 ms':>8}")
+    for start in range(0, args.turns, args.bucket):
+        values = sorted(t for turn in timings[start:start + args.bucket] for t in turn)
+        print(f"{start + 1:>4}-{min(start + args.bucket, args.turns):<4} "
+              f"{statistics.median(values) * 1000:>10.2f} {values[int(len(values) * 0.9)] * 1000:>8.2f}")
+    first = statistics.median(t for turn in timings[:args.bucket] for t in turn)
+    last = statistics.median(t for turn in timings[-args.bucket:] for t in turn)
+    print(f"\nlast/first bucket: {last / first:.2f}x")
+    print(f"memory held per patient after {args.turns} turns: {held / len(patients) / 1024:.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# Patient-creation throughput and per-patient RSS.
+#
+#   cd src && python -m bench.patient_creation --patients 2000
+#   cd src && python -m bench.patient_creation --patients 2000 --graph-per-patient
+import argparse
+import gc
+import time
+
+from bench.common import rss_bytes
+from patient.agent import create_graph, shared_graph
+from patient.diagnosis import CONDITION_SYMPTOMS
+from patient.patient import Patient
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patients", type=int, default=2000)
+    parser.add_argument("--graph-per-patient", action="store_true",
+                        help="compile a graph per patient, as Patient.__init__ used to")
+    args = parser.parse_args()
+
+    conditions = list(CONDITION_SYMPTOMS)
+    shared_graph()
+    gc.collect()
+    baseline = rss_bytes()
+
+    patients = []
+    graphs = []
+    start = time.perf_counter()
+    for i in range(args.patients):
+        condition = conditions[i % len(conditions)]
+        patients.append(Patient(condition, CONDITION_SYMPTOMS[condition][:5]))
+        if args.graph_per_patient:
+            graphs.append(create_graph())
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    grown = rss_bytes() - baseline
+    mode = "graph per patient" if args.graph_per_patient else "shared graph"
+    print(f"mode        : {mode}")
+    print(f"created     : {args.patients} patients in {elapsed:.3f}s ({args.patients / elapsed:,.0f}/s)")
+    print(f"per patient : {elapsed / args.patients * 1e6:.1f}us, {grown / args.patients / 1024:.1f} KiB RSS")
+
+
+if __name__ == "__main__":
+    main()
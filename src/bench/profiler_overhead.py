@@ -0,0 +1,68 @@
+# Per-turn cost of the sampling profiler: the same turns with profiling off
+# and with every turn profiled, against zero-latency fake models so only
+# server-side work is measured. Also prints where the samples landed.
+#
+#   cd src && python -m bench.profiler_overhead --turns 1000 --interval 0.005
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+
+from patient.fake import FakeChatModel
+from patient.models import set_model
+from patient.patient import Patient
+from patient.profiler import Profiler
+
+QUESTIONS = ["How are you feeling today?", "Can you describe your symptoms?", "When did this start?",
+             "Have you taken anything for it?"]
+
+
+async def turns(profiler: Profiler, count: int) -> list:
+    patient = Patient("common cold", ["runny nose", "sore throat", "mild cough", "congestion"])
+    timings = []
+    for i in range(count):
+        start = time.perf_counter()
+        turn = patient.astream_turn(f"{QUESTIONS[i % len(QUESTIONS)]} ({i})")
+        run = profiler.claim("bench", lambda: None)
+        if run is not None:
+            turn = profiler.profiled(run, turn)
+        async for _ in turn:
+            pass
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=0.005)
+    args = parser.parse_args()
+
+    set_model("helper", FakeChatModel(responses=["general_question"]))
+    set_model("patient", FakeChatModel(responses=["It has been about the same, doctor."]))
+    profiler = Profiler(tempfile.mkdtemp(prefix="patbot-profile-"), args.interval)
+    asyncio.run(turns(profiler, 5))
+
+    off, on = [], []
+    for _ in range(args.rounds):
+        off += asyncio.run(turns(profiler, args.turns // args.rounds))
+        profiler.start(seconds=3600)
+        on += asyncio.run(turns(profiler, args.turns // args.rounds))
+        profiler.stop()
+
+    base, profiled = statistics.median(off), statistics.median(on)
+    print(f"{'':>10} {'median ms':>10} {'mean ms':>8}")
+    print(f"{'off':>10} {base * 1000:>10.2f} {statistics.mean(off) * 1000:>8.2f}")
+    print(f"{'profiled':>10} {profiled * 1000:>10.2f} {statistics.mean(on) * 1000:>8.2f}")
+    print(f"\noverhead: {(profiled / base - 1) * 100:+.1f}% at {args.interval * 1000:g}ms sampling")
+
+    run = profiler.current()
+    print(f"\nlast round: {run.samples} samples -> {run.output}")
+    for node, stacks in sorted(run.stacks.items(), key=lambda item: -sum(item[1].values())):
+        print(f"  {node:<20} {sum(stacks.values()):>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# Replays recorded consultations through the full FastAPI/WebSocket stack
+# against scripted offline models, so throughput and latency can be measured
+# reproducibly without network calls. Model delays come from a seeded
+# latency distribution; whatever the turn takes beyond them is server time.
+#
+#   cd src && python -m bench.replay --doctors 50 --rounds 2 --latency lognormal:0.4,0.5
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from pathlib import Path
+
+import httpx
+import websockets
+
+from bench.common import free_port, percentile, start_server
+from patient.fake import LATENCY_DISTRIBUTIONS, FakeChatModel, load_script
+from patient.models import set_model
+
+RECORDING = Path(__file__).parent / "data" / "consultations.jsonl"
+
+
+def load_consultations(path: Path) -> list:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def parse_latency(spec: str) -> tuple:
+    distribution, _, params = spec.partition(":")
+    if distribution not in LATENCY_DISTRIBUTIONS:
+        raise SystemExit(f"--latency must be one of {', '.join(LATENCY_DISTRIBUTIONS)}")
+    mean, _, spread = params.partition(",")
+    return distribution, float(mean or 0), float(spread or 0)
+
+
+async def consultation(base: str, doctor_id: str, turns: list, stats: dict):
+    async with httpx.AsyncClient(base_url=f"http://{base}") as client:
+        res = await client.post(f"/api/doctor/{doctor_id}/create-patient")
+        patient_id = res.json()["patient_id"]
+
+    async with websockets.connect(f"ws://{base}/ws/patient/{patient_id}", max_size=None) as ws:
+        await ws.recv()
+        for turn in turns:
+            start = time.perf_counter()
+            first_token = None
+            await ws.send(json.dumps({"message": turn["doctor"]}))
+            while True:
+                frame = json.loads(await ws.recv())
+                if frame["type"] == "patient_response_delta" and first_token is None:
+                    first_token = time.perf_counter() - start
+                if frame["type"] in ("patient_response", "error"):
+                    break
+            elapsed = time.perf_counter() - start
+            stats["latencies"].append(elapsed)
+            stats["ttfts"].append(first_token if first_token is not None else elapsed)
+            if frame["type"] == "error" or frame["content"] != turn["patient"]:
+                stats["mismatches"] += 1
+
+
+async def doctor(base: str, index: int, rounds: int, consultations: list, stats: dict):
+    for r in range(rounds):
+        recorded = consultations[(index + r) % len(consultations)]
+        await consultation(base, f"doctor_{index}", recorded["turns"], stats)
+
+
+async def run(args, consultations: list, models: list):
+    port = free_port()
+    server = start_server(port)
+    stats = {"latencies": [], "ttfts": [], "mismatches": 0}
+
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        doctor(f"127.0.0.1:{port}", i, args.rounds, consultations, stats)
+        for i in range(args.doctors)
+    ))
+    elapsed = time.perf_counter() - start
+    server.should_exit = True
+
+    latencies, ttfts = stats["latencies"], stats["ttfts"]
+    turns = len(latencies)
+    model_time = sum(model.total_delay for model in models) / turns
+    print(f"recording={args.recording.name} doctors={args.doctors} rounds={args.rounds} "
+          f"latency={args.latency} token_latency={args.token_latency:.3f}s seed={args.seed}")
+    print(f"turns completed : {turns} in {elapsed:.2f}s ({turns / elapsed:.1f} turns/s), "
+          f"{stats['mismatches']} replies differed from the recording")
+    print(f"first token     : p50={percentile(ttfts, 50):.3f}s p95={percentile(ttfts, 95):.3f}s "
+          f"p99={percentile(ttfts, 99):.3f}s")
+    print(f"turn latency    : p50={percentile(latencies, 50):.3f}s p95={percentile(latencies, 95):.3f}s "
+          f"p99={percentile(latencies, 99):.3f}s max={max(latencies):.3f}s")
+    print(f"per turn        : model={model_time * 1e3:.1f}ms "
+          f"server={(statistics.mean(latencies) - model_time) * 1e3:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recording", type=Path, default=RECORDING)
+    parser.add_argument("--doctors", type=int, default=50, help="concurrent simulated doctors")
+    parser.add_argument("--rounds", type=int, default=2, help="consultations replayed per doctor")
+    parser.add_argument("--latency", default="lognormal:0.4,0.5",
+                        help="model call delay as <distribution>:<mean seconds>[,<spread>]")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="seconds between streamed tokens")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    distribution, mean, spread = parse_latency(args.latency)
+    consultations = load_consultations(args.recording)
+    models = []
+    for role, seed in (("helper", args.seed), ("patient", args.seed + 1)):
+        model = FakeChatModel(
+            responses=["general_question"] if role == "helper" else ["Sorry, could you say that again?"],
+            script=load_script(str(args.recording), role),
+            latency=mean,
+            latency_distribution=distribution,
+            latency_spread=spread,
+            token_latency=args.token_latency if role == "patient" else 0.0,
+            seed=seed,
+        )
+        set_model(role, model)
+        models.append(model)
+    asyncio.run(run(args, consultations, models))
+
+
+if __name__ == "__main__":
+    main()
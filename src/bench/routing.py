@@ -0,0 +1,84 @@
+# Per-stage routing against models that don't know when to stop: the same
+# consultations with every call unbounded, then with the routing table's
+# limits. The fake models pad each recorded answer with rambling and stream
+# one word per --token-latency, so output tokens translate into latency.
+#
+#   cd src && python -m bench.routing --patients 20 --token-latency 0.01
+#   cd src && PATBOT_ROUTES=routes.json python -m bench.routing   # try a table
+import argparse
+import asyncio
+import statistics
+import time
+
+from bench.common import percentile
+from bench.replay import RECORDING, load_consultations
+from patient import routing
+from patient.cache import intent_cache
+from patient.fake import FakeChatModel, load_script
+from patient.models import set_model
+from patient.patient import Patient
+from patient.routing import ROUTE_SECONDS, ROUTE_TOKENS, RoutingTable
+
+RAMBLING = (" I should also say that it has been a long week and I have not been sleeping well, and my"
+            " neighbour had something similar last month, so I have been wondering whether it is going"
+            " around, and my mother always said to drink ginger tea for this sort of thing.") * 8
+
+
+async def consult(recorded: dict, timings: dict):
+    patient = Patient(recorded["condition"], recorded["symptoms"])
+    for turn in recorded["turns"]:
+        start = time.perf_counter()
+        await patient.adoc_turn(turn["doctor"])
+        timings.setdefault(patient.state["convo_stage"], []).append(time.perf_counter() - start)
+
+
+def arm(name: str, table: RoutingTable, consultations: list, patients: int):
+    routing.routing_table = lambda: table
+    # Labels from the first arm would otherwise skip the classifier in the second.
+    intent_cache.cache_clear()
+    ROUTE_SECONDS.reset()
+    ROUTE_TOKENS.reset()
+    timings = {}
+
+    async def run():
+        await asyncio.gather(*(consult(consultations[i % len(consultations)], timings) for i in range(patients)))
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    print(f"\n{name}: {time.perf_counter() - start:.2f}s")
+    print(f"  {'route':<40} {'calls':>6} {'mean ms':>8} {'out tok/call':>13}")
+    for route in sorted({labels[0][1] for _, labels, _ in ROUTE_SECONDS.samples() if labels}):
+        calls = ROUTE_SECONDS.count(route=route)
+        print(f"  {route:<40} {calls:>6} {ROUTE_SECONDS.sum(route=route) / calls * 1000:>8.1f} "
+              f"{ROUTE_TOKENS.value(route=route, direction='output') / calls:>13.1f}")
+    print(f"  {'turn stage':<40} {'turns':>6} {'p50 ms':>8} {'p95 ms':>13}")
+    for stage, values in sorted(timings.items()):
+        print(f"  {stage:<40} {len(values):>6} {statistics.median(values) * 1000:>8.1f} "
+              f"{percentile(values, 95) * 1000:>13.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patients", type=int, default=20)
+    parser.add_argument("--token-latency", type=float, default=0.01)
+    parser.add_argument("--latency", type=float, default=0.2, help="time to first token")
+    args = parser.parse_args()
+
+    consultations = load_consultations(RECORDING)
+    # Labels stay as recorded; the classifier route's max_tokens bounds any
+    # trailing text and only the label's first line is used.
+    helper_script = load_script(str(RECORDING), "helper")
+    patient_script = {k: v + RAMBLING for k, v in load_script(str(RECORDING), "patient").items()}
+    set_model("helper", FakeChatModel(script=helper_script, responses=["general_question"],
+                                      latency=args.latency, token_latency=args.token_latency))
+    set_model("patient", FakeChatModel(script=patient_script, latency=args.latency,
+                                       token_latency=args.token_latency))
+
+    routed = RoutingTable.from_env()
+    # Same route names, no limits, so the two arms line up row by row.
+    arm("unbounded", RoutingTable({name: {} for name in routed.routes}), consultations, args.patients)
+    arm("routed", routed, consultations, args.patients)
+
+
+if __name__ == "__main__":
+    main()
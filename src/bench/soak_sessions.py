@@ -0,0 +1,51 @@
+# Soak test for session eviction: creates thousands of patients that are
+# given some history and then abandoned, and samples RSS as the reaper runs.
+#
+#   cd src && python -m bench.soak_sessions --patients 20000
+#   cd src && python -m bench.soak_sessions --patients 20000 --no-reaper
+import argparse
+import gc
+import logging
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from bench.common import rss_bytes
+from main import ConnectionManager, EVICTED_SESSIONS
+from patient.store import InMemoryStore
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patients", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=2000)
+    parser.add_argument("--turns", type=int, default=10, help="history added to each abandoned patient")
+    parser.add_argument("--ttl", type=float, default=0.2)
+    parser.add_argument("--no-reaper", action="store_true")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    manager = ConnectionManager(InMemoryStore(), session_ttl=args.ttl,
+                                max_patients=10 ** 9, max_patients_per_doctor=10 ** 9)
+    filler = "I have had this for a few days and it is getting a little worse each morning. " * 2
+
+    gc.collect()
+    baseline = rss_bytes()
+    print(f"{'created':>8} {'live':>7} {'evicted':>8} {'rss MiB':>8}")
+    for start in range(0, args.patients, args.batch):
+        for i in range(start, min(start + args.batch, args.patients)):
+            patient_id = f"patient_{i}"
+            manager.create_patient(f"doctor_{i % 200}", patient_id)
+            patient = manager.get_patient(patient_id)
+            for _ in range(args.turns):
+                patient.state["messages"] += [HumanMessage(filler), AIMessage(filler)]
+        time.sleep(args.ttl)
+        if not args.no_reaper:
+            manager.reap()
+        gc.collect()
+        print(f"{min(start + args.batch, args.patients):>8} {manager.store.count():>7} "
+              f"{int(EVICTED_SESSIONS.total()):>8} {(rss_bytes() - baseline) / 2 ** 20:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# End-to-end turn latency with and without speculative drafting, replaying
+# the recorded consultations against scripted fake models. Rule-based
+# classification is off by default so every turn needs the helper model,
+# which is the case speculation is meant for.
+#
+#   cd src && python -m bench.speculation --latency 0.4 --patients 20
+#   cd src && python -m bench.speculation --predictor local   # naive Bayes guesses
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from pathlib import Path
+
+from bench.common import percentile
+from bench.replay import RECORDING, load_consultations
+from patient import agent, speculative
+from patient.classifier import default_classifier
+from patient.fake import FakeChatModel, load_script
+from patient.models import set_model
+from patient.patient import Patient
+
+INTENTS = Path(__file__).parent / "data" / "intents.jsonl"
+
+
+async def consult(recorded: dict, latencies: list, ttfts: list):
+    patient = Patient(recorded["condition"], recorded["symptoms"])
+    for turn in recorded["turns"]:
+        start = time.perf_counter()
+        first = None
+        async for _ in patient.astream_turn(turn["doctor"]):
+            if first is None:
+                first = time.perf_counter() - start
+        latencies.append(time.perf_counter() - start)
+        ttfts.append(first if first is not None else latencies[-1])
+
+
+async def run(mode: str, args, consultations: list):
+    agent.GRAPH_MODE = mode
+    agent.shared_graph.cache_clear()
+    speculative.predictor = speculative.StagePredictor()
+    speculative.SPECULATIONS.reset()
+    latencies, ttfts = [], []
+
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        consult(consultations[i % len(consultations)], latencies, ttfts) for i in range(args.patients)
+    ))
+    elapsed = time.perf_counter() - start
+    hit_rate = f"{speculative.speculation_hit_rate():.0%}" if mode == "speculative" else "-"
+    print(f"{mode:>12} {len(latencies):>6} {statistics.mean(latencies) * 1e3:>9.0f}ms "
+          f"{percentile(latencies, 50) * 1e3:>7.0f}ms {percentile(latencies, 95) * 1e3:>7.0f}ms "
+          f"{percentile(ttfts, 50) * 1e3:>8.0f}ms {hit_rate:>9} {elapsed:>7.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patients", type=int, default=20, help="concurrent consultations")
+    parser.add_argument("--latency", type=float, default=0.4, help="seconds per model call")
+    parser.add_argument("--token-latency", type=float, default=0.01)
+    parser.add_argument("--predictor", choices=["transitions", "local"], default="transitions")
+    parser.add_argument("--rules", action="store_true", help="keep the rule-based fast path on")
+    args = parser.parse_args()
+
+    os.environ["PATBOT_INTENT_RULES"] = "1" if args.rules else "0"
+    if args.predictor == "local":
+        os.environ["PATBOT_INTENT_MODEL"] = str(INTENTS)
+        # Confidence above 1 keeps the local model as a predictor only.
+        os.environ["PATBOT_INTENT_MIN_CONFIDENCE"] = "1.1"
+    default_classifier.cache_clear()
+
+    set_model("helper", FakeChatModel(script=load_script(str(RECORDING), "helper"),
+                                      responses=["general_question"], latency=args.latency))
+    set_model("patient", FakeChatModel(script=load_script(str(RECORDING), "patient"),
+                                       latency=args.latency, token_latency=args.token_latency))
+    consultations = load_consultations(RECORDING)
+
+    print(f"patients={args.patients} latency={args.latency}s predictor={args.predictor} rules={args.rules}")
+    print(f"{'mode':>12} {'turns':>6} {'mean':>11} {'p50':>9} {'p95':>9} {'ttft p50':>10} {'hit rate':>9} {'wall':>8}")
+    for mode in ("sequential", "speculative"):
+        asyncio.run(run(mode, args, consultations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+# Latency and bytes on the wire for the frontend shell: a fresh load without
+# compression, a fresh gzip/br load, and a returning visitor's conditional GET.
+#
+#   cd src && python -m bench.static_assets --requests 2000
+import argparse
+import logging
+import time
+
+import httpx
+
+from bench.common import free_port, percentile, start_server
+
+
+def measure(client: httpx.Client, url: str, headers: dict, requests: int):
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get(url, headers=headers)
+        samples.append(time.perf_counter() - start)
+    return samples, response
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    port = free_port()
+    server = start_server(port)
+    url = f"http://127.0.0.1:{port}/"
+    with httpx.Client() as client:
+        etag = client.get(url, headers={"Accept-Encoding": "br, gzip"}).headers.get("etag", "")
+        cases = (
+            ("identity", {"Accept-Encoding": "identity"}),
+            ("compressed", {"Accept-Encoding": "br, gzip"}),
+            ("revalidate (304)", {"Accept-Encoding": "br, gzip", "If-None-Match": etag}),
+        )
+        for name, headers in cases:
+            samples, response = measure(client, url, headers, args.requests)
+            encoding = response.headers.get("content-encoding", "identity")
+            wire = int(response.headers.get("content-length", 0))
+            print(f"{name:<17} status={response.status_code} {encoding:<8} {wire:6d} bytes "
+                  f"p50={percentile(samples, 50) * 1e3:.2f}ms p99={percentile(samples, 99) * 1e3:.2f}ms")
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
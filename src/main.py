@@ -1,31 +1,83 @@
 import os
+import hmac
 import json
+import time
 import random
+import asyncio
 import logging
+from contextlib import asynccontextmanager, suppress
+from functools import partial
 from datetime import datetime
-from typing import Dict
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, FrozenSet, List, Optional, Set, Tuple, Union
+from weakref import WeakValueDictionary
+from fastapi import FastAPI, Header, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import PlainTextResponse, Response
 from dotenv import load_dotenv
+from pydantic import BaseModel, Field, PositiveFloat, PositiveInt
 
+# Before the patient modules, some of which read settings at import time.
+load_dotenv()
+
+try:
+    from ormsgpack import packb, unpackb
+except ImportError:
+    try:
+        from msgpack import packb, unpackb
+    except ImportError:
+        packb = unpackb = None
+
+from patient.clients import warm_up
 from patient.patient import Patient
-from patient.diagnosis import CONDITION_SYMPTOMS
+from patient.assets import asset_cache, choose_encoding, not_modified
+from patient.catalogue import AliasTable, Condition
+from patient.pool import PatientPool, build_patient
+from patient.profiler import profiler
+from patient.metrics import counter, gauge, histogram, render_prometheus
+from patient.scheduler import ModelOverloaded, scheduling_key
+from patient.store import SessionGone, SessionStore, store_from_env
+from patient.transcripts import setup_logging, transcript
 
-load_dotenv()
+setup_logging()
+logger = logging.getLogger(__name__)
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('conversations.log'),
-        logging.StreamHandler()
-    ]
+LIVE_SESSIONS = gauge("patbot_live_sessions", "Patient sessions held in the session store.")
+CONNECTED_SESSIONS = gauge("patbot_connected_sessions", "Patients with an open WebSocket on this worker.")
+CONNECTED_DOCTORS = gauge("patbot_connected_doctors", "Multiplexed doctor WebSockets open on this worker.")
+WS_SEND_SECONDS = histogram("patbot_ws_send_seconds", "Time to write one frame to a WebSocket.", ("frame",))
+WS_QUEUE_SECONDS = histogram(
+    "patbot_ws_queue_seconds",
+    "Time between a doctor message arriving on the socket and its turn starting.",
 )
-logger = logging.getLogger(__name__)
+EVICTED_SESSIONS = counter("patbot_evicted_sessions_total", "Patient sessions evicted, by reason.", ("reason",))
+
+SESSION_TTL = float(os.getenv("PATBOT_SESSION_TTL", "1800"))
+REAPER_INTERVAL = float(os.getenv("PATBOT_REAPER_INTERVAL", "60"))
+MAX_PATIENTS = int(os.getenv("PATBOT_MAX_PATIENTS", "10000"))
+MAX_PATIENTS_PER_DOCTOR = int(os.getenv("PATBOT_MAX_PATIENTS_PER_DOCTOR", "50"))
+WS_PING_INTERVAL = float(os.getenv("PATBOT_WS_PING_INTERVAL", "25"))
+PATIENT_POOL = int(os.getenv("PATBOT_PATIENT_POOL", "32"))
+WARMUP = os.getenv("PATBOT_WARMUP", "1") != "0"
+WARMUP_CONNECTIONS = int(os.getenv("PATBOT_WARMUP_CONNECTIONS", "2"))
+# Admin endpoints are disabled unless a token is set.
+ADMIN_TOKEN = os.getenv("PATBOT_ADMIN_TOKEN", "")
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tasks = [asyncio.create_task(manager.run_reaper(REAPER_INTERVAL))]
+    if manager.pool.size:
+        tasks.append(asyncio.create_task(manager.pool.run_refiller()))
+    if WARMUP:
+        # Not awaited: the server starts accepting connections straight away.
+        tasks.append(asyncio.create_task(warm_up(WARMUP_CONNECTIONS)))
+    yield
+    for task in tasks:
+        task.cancel()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -35,170 +87,616 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class SessionLimitError(Exception):
+    pass
+
+
+class DoctorChannel:
+    # One WebSocket carrying every patient a doctor has attached. Frames are
+    # tagged with patient_id and, after the first snapshot, only carry the
+    # parts of the patient's state that changed.
+    def __init__(self, websocket: WebSocket, doctor_id: str, binary: bool = False):
+        self.websocket = websocket
+        self.doctor_id = doctor_id
+        self.binary = binary
+        self.sent: Dict[str, tuple] = {}
+        self.tasks: Set[asyncio.Task] = set()
+        self._send_lock = asyncio.Lock()
+
+    async def send_json(self, frame: dict):
+        # Turns for different patients stream concurrently over one socket.
+        async with self._send_lock:
+            if self.binary:
+                await self.websocket.send_bytes(packb(frame))
+            else:
+                await self.websocket.send_text(json.dumps(frame))
+
+    def snapshot(self, patient_id: str, state: dict) -> dict:
+        revealed = list(state.get("revealed_symptoms", []))
+        stage, accepted = state.get("convo_stage", ""), state.get("accepted", False)
+        self.sent[patient_id] = (len(revealed), stage, accepted)
+        return {"revealed_symptoms": revealed, "stage": stage, "accepted": accepted}
+
+    def delta(self, patient_id: str, state: dict) -> dict:
+        if patient_id not in self.sent:
+            return self.snapshot(patient_id, state)
+        count, stage, accepted = self.sent[patient_id]
+        revealed = state.get("revealed_symptoms", [])
+        fields = {}
+        if len(revealed) > count:
+            fields["new_symptoms"] = list(revealed[count:])
+        if state.get("convo_stage", "") != stage:
+            fields["stage"] = state.get("convo_stage", "")
+        if state.get("accepted", False) != accepted:
+            fields["accepted"] = state.get("accepted", False)
+        self.sent[patient_id] = (len(revealed), state.get("convo_stage", ""), state.get("accepted", False))
+        return fields
+
+
 class ConnectionManager:
-    def __init__(self):
-        self.doctor_patients: Dict[str, list] = {}
-        self.patient_connections: Dict[str, WebSocket] = {}
-        self.patients: Dict[str, Patient] = {}
-        self.patient_to_doctor: Dict[str, str] = {}
-        
-    def create_patient(self, doctor_id: str, patient_id: str) -> dict:
-        condition = random.choice(list(CONDITION_SYMPTOMS.keys()))
-        symptoms = CONDITION_SYMPTOMS[condition][:random.randint(4, 6)]
-        
-        patient = Patient(condition, symptoms)
-        self.patients[patient_id] = patient
+    def __init__(self, store: SessionStore = None, session_ttl: float = SESSION_TTL,
+                 max_patients: int = MAX_PATIENTS, max_patients_per_doctor: int = MAX_PATIENTS_PER_DOCTOR,
+                 pool_size: int = PATIENT_POOL):
+        self.store = store if store is not None else store_from_env()
+        self.pool = PatientPool(pool_size)
+        self.turn_locks: "WeakValueDictionary[str, asyncio.Lock]" = WeakValueDictionary()
+        # A patient's own socket, or the doctor channel it is attached to.
+        self.patient_connections: Dict[str, Union[WebSocket, DoctorChannel]] = {}
+        self.doctor_connections: Dict[str, DoctorChannel] = {}
+        self.session_ttl = session_ttl
+        self.max_patients = max_patients
+        self.max_patients_per_doctor = max_patients_per_doctor
         
-        if doctor_id not in self.doctor_patients:
-            self.doctor_patients[doctor_id] = []
-        self.doctor_patients[doctor_id].append(patient_id)
-        self.patient_to_doctor[patient_id] = doctor_id
+    def connected(self) -> FrozenSet[str]:
+        # Taken on the event loop and handed to store work running in a
+        # worker thread, which must not read patient_connections itself.
+        return frozenset(self.patient_connections)
+
+    def new_patient(self, specialty: Optional[str] = None, difficulty: Optional[int] = None):
+        if specialty is None and difficulty is None:
+            return self.pool.take()
+        return build_patient(specialty=specialty, difficulty=difficulty)
+
+    def create_patient(self, doctor_id: str, patient_id: str, specialty: Optional[str] = None,
+                       difficulty: Optional[int] = None) -> dict:
+        details, patient = self.new_patient(specialty, difficulty)
+        return self.register_patient(doctor_id, patient_id, details, patient)
+
+    def register_patient(self, doctor_id: str, patient_id: str, details: Condition, patient: Patient,
+                         connected: Optional[FrozenSet[str]] = None) -> dict:
+        self.make_room(doctor_id, connected if connected is not None else self.connected())
+        return self.add_patient(doctor_id, patient_id, details, patient)
+
+    def add_patient(self, doctor_id: str, patient_id: str, details: Condition, patient: Patient) -> dict:
+        self.store.add(patient_id, doctor_id, patient)
+        LIVE_SESSIONS.set(self.store.count())
         
-        logger.info(f"Created patient {patient_id} with {condition} for doctor {doctor_id}")
+        transcript(patient_id, "created", doctor_id=doctor_id, condition=patient.condition,
+                   symptoms=patient.state["all_symptoms"])
         
         return {
             "patient_id": patient_id,
-            "condition": condition,
-            "total_symptoms": len(symptoms)
+            "condition": patient.condition,
+            "specialty": details.specialty,
+            "difficulty": details.difficulty,
+            "total_symptoms": len(patient.state["all_symptoms"])
         }
+
+    def create_cohort(self, doctors: Dict[str, int], conditions: Optional[Dict[str, float]] = None,
+                      specialty: Optional[str] = None, difficulty: Optional[int] = None,
+                      seed: Optional[int] = None, connected: Optional[FrozenSet[str]] = None) -> dict:
+        connected = connected if connected is not None else self.connected()
+        # A cohort is created whole or not at all: the sessions it displaces
+        # are chosen up front and only evicted once the whole plan fits.
+        victims = self.eviction_plan(doctors, connected)
+
+        # Every patient is drawn from one seeded generator, so the same
+        # request (and returned seed) reproduces the same cohort.
+        seed = seed if seed is not None else random.randrange(2 ** 32)
+        rng = random.Random(seed)
+        mix = list(conditions or {})
+        table = AliasTable([conditions[name] for name in mix]) if mix else None
+        built = []
+        for doctor_id, count in doctors.items():
+            for _ in range(count):
+                condition = mix[table.sample(rng)] if table is not None else None
+                built.append((doctor_id, build_patient(rng, specialty, difficulty, condition)))
+
+        for victim, reason in victims:
+            self.evict(victim, reason)
+
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        patients = []
+        try:
+            for i, (doctor_id, (details, patient)) in enumerate(built):
+                if not self.has_room(doctor_id):
+                    raise SessionLimitError("Another worker took the room reserved for the cohort")
+                info = self.add_patient(doctor_id, f"patient_{stamp}_{i:04d}", details, patient)
+                patients.append(dict(info, doctor_id=doctor_id))
+        except SessionLimitError:
+            # Another worker sharing the store took the room in the meantime.
+            for info in patients:
+                self.evict(info["patient_id"], "cohort_rollback")
+            LIVE_SESSIONS.set(self.store.count())
+            raise
+        return {"seed": seed, "patients": patients}
+
+    def make_room(self, doctor_id: str, connected: FrozenSet[str]):
+        for victim, reason in self.eviction_plan({doctor_id: 1}, connected):
+            self.evict(victim, reason)
+
+    def eviction_plan(self, wanted: Dict[str, int], connected: FrozenSet[str]) -> List[Tuple[str, str]]:
+        # The least recently active patients without an open socket that must
+        # go for `wanted` new patients per doctor to fit both limits; live
+        # consultations are never cut. Raises before anything is evicted.
+        plan = []
+        for doctor_id, count in wanted.items():
+            excess = len(self.store.doctor_patients(doctor_id)) + count - self.max_patients_per_doctor
+            for _ in range(excess):
+                victim = self.store.least_recent(doctor_id, exclude=connected.union(v for v, _ in plan))
+                if victim is None:
+                    raise SessionLimitError(
+                        f"Doctor {doctor_id} can have at most {self.max_patients_per_doctor} active patients")
+                plan.append((victim, "doctor_limit"))
+
+        excess = self.store.count() - len(plan) + sum(wanted.values()) - self.max_patients
+        for _ in range(excess):
+            victim = self.store.least_recent(exclude=connected.union(v for v, _ in plan))
+            if victim is None:
+                raise SessionLimitError("Server is at its patient limit")
+            plan.append((victim, "global_limit"))
+        return plan
+
+    def has_room(self, doctor_id: str) -> bool:
+        return (len(self.store.doctor_patients(doctor_id)) < self.max_patients_per_doctor
+                and self.store.count() < self.max_patients)
+
+    def evict(self, patient_id: str, reason: str):
+        self.store.remove(patient_id)
+        EVICTED_SESSIONS.inc(reason=reason)
+        transcript(patient_id, "evicted", reason=reason)
+
+    def reap(self, now: float = None, connected: Optional[FrozenSet[str]] = None) -> int:
+        connected = connected if connected is not None else self.connected()
+        cutoff = (now if now is not None else time.time()) - self.session_ttl
+        evicted = 0
+        for patient_id in self.store.idle_since(cutoff):
+            if patient_id not in connected:
+                self.evict(patient_id, "idle")
+                evicted += 1
+        LIVE_SESSIONS.set(self.store.count())
+        return evicted
+
+    async def run_reaper(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            CONNECTED_SESSIONS.set(len(self.patient_connections))
+            try:
+                await self.in_store(self.reap, None, self.connected())
+            except Exception as e:
+                logger.error("Session reaper failed: %s", e)
     
+    def turn_lock(self, patient_id: str) -> asyncio.Lock:
+        lock = self.turn_locks.get(patient_id)
+        if lock is None:
+            lock = self.turn_locks[patient_id] = asyncio.Lock()
+        return lock
+
     async def connect_patient(self, patient_id: str, websocket: WebSocket):
         await websocket.accept()
         self.patient_connections[patient_id] = websocket
-        logger.info(f"Patient {patient_id} connected")
+        await self.in_store(self.store.touch, patient_id)
+        CONNECTED_SESSIONS.set(len(self.patient_connections))
+        transcript(patient_id, "connected")
     
-    def disconnect_patient(self, patient_id: str):
+    async def connect_doctor(self, doctor_id: str, websocket: WebSocket, binary: bool) -> DoctorChannel:
+        await websocket.accept()
+        channel = self.doctor_connections[doctor_id] = DoctorChannel(websocket, doctor_id, binary)
+        CONNECTED_DOCTORS.set(len(self.doctor_connections))
+        return channel
+
+    async def attach_patient(self, patient_id: str, channel: DoctorChannel):
+        self.patient_connections[patient_id] = channel
+        await self.in_store(self.store.touch, patient_id)
+        CONNECTED_SESSIONS.set(len(self.patient_connections))
+        transcript(patient_id, "connected", doctor_id=channel.doctor_id)
+
+    async def disconnect_doctor(self, channel: DoctorChannel):
+        # Sessions outlive the doctor socket; the reaper evicts them once idle.
+        for task in channel.tasks:
+            task.cancel()
+        # Patients attached by a turn that failed before its first frame
+        # never made it into channel.sent.
+        for patient_id in [pid for pid, conn in self.patient_connections.items() if conn is channel]:
+            await self.disconnect_patient(patient_id, end_session=False)
+        if self.doctor_connections.get(channel.doctor_id) is channel:
+            del self.doctor_connections[channel.doctor_id]
+        CONNECTED_DOCTORS.set(len(self.doctor_connections))
+
+    async def disconnect_patient(self, patient_id: str, end_session: bool = True):
         if patient_id in self.patient_connections:
             del self.patient_connections[patient_id]
+        CONNECTED_SESSIONS.set(len(self.patient_connections))
         
-        if patient_id in self.patients:
-            del self.patients[patient_id]
-        
-        if patient_id in self.patient_to_doctor:
-            doctor_id = self.patient_to_doctor[patient_id]
-            if doctor_id in self.doctor_patients:
-                self.doctor_patients[doctor_id].remove(patient_id)
-            del self.patient_to_doctor[patient_id]
-        
-        logger.info(f"Patient {patient_id} disconnected and cleaned up")
+        if end_session:
+            await self.in_store(self.store.remove, patient_id)
+            LIVE_SESSIONS.set(await self.in_store(self.store.count))
+            transcript(patient_id, "disconnected", session="ended")
+        else:
+            transcript(patient_id, "disconnected", session="kept")
     
     def get_patient(self, patient_id: str) -> Patient:
-        return self.patients.get(patient_id)
+        return self.store.get(patient_id)
+
+    def save_patient(self, patient_id: str, patient: Patient):
+        self.store.save(patient_id, patient)
+
+    def owned_patient(self, doctor_id: str, patient_id: str) -> Optional[Patient]:
+        return self.get_patient(patient_id) if self.store.doctor_of(patient_id) == doctor_id else None
+
+    async def in_store(self, method: Callable, *args):
+        # Blocking stores (SQLite) are called from a worker thread so a slow
+        # disk doesn't stall every socket on the event loop.
+        if self.store.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
     
     async def send_to_patient(self, patient_id: str, message: dict):
         if patient_id in self.patient_connections:
             await self.patient_connections[patient_id].send_json(message)
     
     def get_doctor_patients(self, doctor_id: str) -> list:
-        return self.doctor_patients.get(doctor_id, [])
+        return self.store.doctor_patients(doctor_id)
 
+    def patient_summaries(self, doctor_id: str) -> list:
+        return [summary._asdict() for summary in self.store.summaries(doctor_id)]
+
+
+RESUMABLE_CLOSE_CODES = {1006, 1012}
 
 manager = ConnectionManager()
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+STATIC_DIR = Path(__file__).resolve().parent / "static"
+
+assets = asset_cache(STATIC_DIR)
+
+
+def serve_asset(request: Request, name: str) -> Response:
+    asset = assets.get(name)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    encoding = choose_encoding(request.headers.get("accept-encoding", ""), asset.bodies)
+    headers = {
+        "ETag": asset.etag if encoding == "identity" else f'{asset.etag[:-1]}-{encoding}"',
+        "Last-Modified": asset.last_modified,
+        "Cache-Control": asset.cache_control,
+        "Vary": "Accept-Encoding",
+    }
+    if not_modified(asset, request.headers.get("if-none-match"), request.headers.get("if-modified-since")):
+        return Response(status_code=304, headers=headers)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(asset.bodies[encoding], media_type=asset.media_type, headers=headers)
+
+
+@app.api_route("/", methods=["GET", "HEAD"])
+async def get(request: Request):
+    return serve_asset(request, "frontend.html")
+
 
-@app.get("/")
-async def get():
-    with open("./static/frontend.html", "r") as f:
-        html_content = f.read()
-    return HTMLResponse(html_content)
+@app.api_route("/static/{name:path}", methods=["GET", "HEAD"])
+async def static(request: Request, name: str):
+    return serve_asset(request, name)
 
 
 @app.post("/api/doctor/{doctor_id}/create-patient")
-async def create_patient_for_doctor(doctor_id: str):
+async def create_patient_for_doctor(doctor_id: str, specialty: Optional[str] = None,
+                                    difficulty: Optional[int] = None):
     patient_id = f"patient_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
-    patient_info = manager.create_patient(doctor_id, patient_id)
+    try:
+        details, patient = manager.new_patient(specialty, difficulty)
+        patient_info = await manager.in_store(manager.register_patient, doctor_id, patient_id, details, patient,
+                                              manager.connected())
+    except SessionLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except LookupError:
+        raise HTTPException(status_code=404, detail="No conditions match the requested specialty and difficulty")
     return patient_info
 
 
+class CohortRequest(BaseModel):
+    doctors: Dict[str, PositiveInt] = Field(description="Number of patients to create for each doctor")
+    conditions: Optional[Dict[str, PositiveFloat]] = Field(None, description="Condition names and relative weights")
+    specialty: Optional[str] = None
+    difficulty: Optional[int] = None
+    seed: Optional[int] = None
+
+
+@app.post("/api/cohort")
+async def create_cohort(request: CohortRequest):
+    try:
+        return await manager.in_store(
+            manager.create_cohort, request.doctors, request.conditions, request.specialty, request.difficulty,
+            request.seed, manager.connected()
+        )
+    except SessionLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
 @app.get("/api/doctor/{doctor_id}/patients")
 async def get_doctor_patients(doctor_id: str):
-    patient_ids = manager.get_doctor_patients(doctor_id)
-    patients_info = []
-    
-    for patient_id in patient_ids:
-        patient = manager.get_patient(patient_id)
-        if patient:
-            patients_info.append({
-                "patient_id": patient_id,
-                "condition": patient.condition,
-                "accepted": patient.state.get("accepted", False),
-                "revealed_symptoms": patient.state.get("revealed_symptoms", [])
+    return {"patients": await manager.in_store(manager.patient_summaries, doctor_id)}
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+def require_admin(authorization: Optional[str]):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest((authorization or "").encode(), f"Bearer {ADMIN_TOKEN}".encode()):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+class ProfileRequest(BaseModel):
+    seconds: Optional[float] = Field(None, gt=0, description="Profile every matching turn for this long")
+    turns: Optional[int] = Field(None, gt=0, description="Stop after this many matching turns")
+    patient_id: Optional[str] = None
+    doctor_id: Optional[str] = None
+
+
+@app.post("/api/admin/profile")
+async def start_profile(request: ProfileRequest, authorization: Optional[str] = Header(None)):
+    require_admin(authorization)
+    try:
+        run = profiler().start(request.seconds, request.turns, request.patient_id, request.doctor_id)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return run.status()
+
+
+@app.get("/api/admin/profile")
+async def profile_status(authorization: Optional[str] = Header(None)):
+    require_admin(authorization)
+    run = profiler().current()
+    if run is None:
+        raise HTTPException(status_code=404, detail="No profile has been taken")
+    return run.status()
+
+
+@app.delete("/api/admin/profile")
+async def stop_profile(authorization: Optional[str] = Header(None)):
+    require_admin(authorization)
+    run = await asyncio.to_thread(profiler().stop)
+    if run is None:
+        raise HTTPException(status_code=404, detail="No profile has been taken")
+    return run.status()
+
+
+async def send_frame(websocket: WebSocket, frame: dict):
+    start = time.perf_counter()
+    await websocket.send_json(frame)
+    WS_SEND_SECONDS.observe(time.perf_counter() - start, frame=frame["type"])
+
+
+def full_state(patient_id: str, state: dict) -> dict:
+    return {
+        "revealed_symptoms": state.get("revealed_symptoms", []),
+        "stage": state.get("convo_stage", ""),
+        "accepted": state.get("accepted", False),
+    }
+
+
+Send = Callable[[dict], Awaitable[None]]
+
+
+async def run_turn(send: Send, patient_id: str, patient: Patient, doctor_message: str,
+                   received_at: float, state_fields=full_state) -> Patient:
+    # One graph run at a time per patient, however many sockets send to it.
+    async with manager.turn_lock(patient_id):
+        WS_QUEUE_SECONDS.observe(time.perf_counter() - received_at)
+        # Shared stores may hold a newer state than the copy loaded at connect;
+        # no row at all means the session ended, so the stale copy mustn't run.
+        patient = await manager.in_store(manager.get_patient, patient_id)
+        if patient is None:
+            raise SessionGone(patient_id)
+        turn = patient.astream_turn(doctor_message)
+        run = profiler().claim(patient_id, partial(manager.store.doctor_of, patient_id))
+        if run is not None:
+            turn = profiler().profiled(run, turn)
+        async for delta in turn:
+            await send({
+                "type": "patient_response_delta",
+                "content": delta,
+                "patient_id": patient_id
             })
-    
-    return {"patients": patients_info}
+
+        patient_response = patient.state["messages"][-1].content
+        await manager.in_store(manager.save_patient, patient_id, patient)
+
+        current_state = patient.state
+
+        transcript(patient_id, "patient", text=patient_response, stage=current_state["convo_stage"],
+                   accepted=current_state["accepted"])
+
+        response_data = {
+            "type": "patient_response",
+            "content": patient_response,
+            **state_fields(patient_id, current_state),
+            "patient_id": patient_id
+        }
+
+        await send(response_data)
+
+        if current_state.get("accepted", False):
+            await send({
+                "type": "conversation_complete",
+                "content": "Patient has accepted treatment. Consultation complete.",
+                "patient_id": patient_id
+            })
+            transcript(patient_id, "completed")
+    return patient
+
+
+async def handle_turn(send: Send, patient_id: str, patient: Patient, doctor_message: str,
+                      received_at: float, state_fields=full_state) -> Patient:
+    transcript(patient_id, "doctor", text=doctor_message)
+    try:
+        return await run_turn(send, patient_id, patient, doctor_message, received_at, state_fields)
+    except ModelOverloaded as e:
+        await send({"type": "error", "content": str(e), "retry": True, "patient_id": patient_id})
+    except SessionGone:
+        transcript(patient_id, "error", error="session ended during the turn")
+        await send({
+            "type": "error",
+            "content": "Patient session has ended. Please create patient first.",
+            "patient_id": patient_id
+        })
+    except Exception as e:
+        logger.error("Error processing message for patient %s: %s", patient_id, e)
+        transcript(patient_id, "error", error=str(e))
+        await send({
+            "type": "error",
+            "content": f"Error processing message: {str(e)}",
+            "patient_id": patient_id
+        })
+    return patient
 
 
 @app.websocket("/ws/patient/{patient_id}")
 async def patient_websocket(websocket: WebSocket, patient_id: str):
-    await manager.connect_patient(patient_id, websocket)
-    
-    patient = manager.get_patient(patient_id)
+    # Unknown ids never reach the connection table or the transcripts.
+    patient = await manager.in_store(manager.get_patient, patient_id)
     if not patient:
-        await websocket.send_json({
+        await websocket.accept()
+        await send_frame(websocket, {
             "type": "error",
             "content": "Patient not found. Please create patient first."
         })
         await websocket.close()
         return
-    
-    await websocket.send_json({
+
+    await manager.connect_patient(patient_id, websocket)
+    scheduling_key.set(await manager.in_store(manager.store.doctor_of, patient_id) or patient_id)
+    await send_frame(websocket, {
         "type": "system",
         "content": f"Patient connected. Condition: {patient.condition}",
         "patient_id": patient_id
     })
     
     try:
+        # Clients of this legacy endpoint don't speak the app-level ping, so a
+        # dead connection is left to uvicorn's protocol pings to detect.
         while True:
             data = await websocket.receive_text()
+            received_at = time.perf_counter()
             message_data = json.loads(data)
+            if message_data.get("type") == "pong":
+                continue
             doctor_message = message_data.get("message", "")
-            
-            logger.info(f"Patient {patient_id} - Doctor says: {doctor_message}")
-            
+            patient = await handle_turn(partial(send_frame, websocket), patient_id, patient,
+                                        doctor_message, received_at)
+
+    except WebSocketDisconnect as e:
+        # Server restarts (1012) and dropped connections (1006) keep the
+        # session so the doctor can reconnect, possibly to another worker.
+        await manager.disconnect_patient(patient_id, end_session=e.code not in RESUMABLE_CLOSE_CODES)
+        transcript(patient_id, "closed", code=e.code)
+    except Exception as e:
+        logger.error("WebSocket error for patient %s: %s", patient_id, e)
+        await manager.disconnect_patient(patient_id)
+
+
+async def receive_frame(websocket: WebSocket) -> dict:
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    if message.get("bytes") is not None:
+        return unpackb(message["bytes"])
+    return json.loads(message["text"])
+
+
+@app.websocket("/ws/doctor/{doctor_id}")
+async def doctor_websocket(websocket: WebSocket, doctor_id: str, encoding: str = "json"):
+    # Client frames: {"type": "attach" | "message" | "close" | "pong", "patient_id", "message"}.
+    # Every server frame carries patient_id; patient_response frames only
+    # carry new_symptoms/stage/accepted when they changed since the last one.
+    channel = await manager.connect_doctor(doctor_id, websocket, binary=encoding == "msgpack" and packb is not None)
+    send = partial(send_frame, channel)
+    scheduling_key.set(doctor_id)
+    await send({
+        "type": "system",
+        "content": "Doctor connected",
+        "doctor_id": doctor_id,
+        "encoding": "msgpack" if channel.binary else "json",
+        "patients": await manager.in_store(manager.get_doctor_patients, doctor_id),
+    })
+
+    try:
+        awaiting_pong = False
+        while True:
             try:
-                patient_response = patient.doc_turn(doctor_message)
-                
-                current_state = patient.state
-                
-                logger.info(f"Patient {patient_id} - Patient says: {patient_response}")
-                logger.info(f"Patient {patient_id} - Stage: {current_state['convo_stage']}, Accepted: {current_state['accepted']}")
-                
-                response_data = {
-                    "type": "patient_response",
-                    "content": patient_response,
-                    "revealed_symptoms": current_state.get("revealed_symptoms", []),
-                    "stage": current_state.get("convo_stage", ""),
-                    "accepted": current_state.get("accepted", False),
-                    "patient_id": patient_id
-                }
-                
-                await websocket.send_json(response_data)
-                
-                if current_state.get("accepted", False):
-                    await websocket.send_json({
-                        "type": "conversation_complete",
-                        "content": "Patient has accepted treatment. Consultation complete.",
-                        "patient_id": patient_id
-                    })
-                    logger.info(f"Patient {patient_id} - Consultation completed")
-                    
-            except Exception as e:
-                logger.error(f"Error processing message for patient {patient_id}: {str(e)}")
-                await websocket.send_json({
+                frame = await asyncio.wait_for(receive_frame(websocket), timeout=WS_PING_INTERVAL)
+            except asyncio.TimeoutError:
+                if awaiting_pong:
+                    with suppress(Exception):
+                        await websocket.close(code=1001)
+                    await manager.disconnect_doctor(channel)
+                    return
+                await send({"type": "ping"})
+                awaiting_pong = True
+                continue
+
+            awaiting_pong = False
+            received_at = time.perf_counter()
+            kind = frame.get("type", "message")
+            if kind == "pong":
+                continue
+            patient_id = frame.get("patient_id", "")
+            patient = await manager.in_store(manager.owned_patient, doctor_id, patient_id)
+            if patient is None:
+                await send({
                     "type": "error",
-                    "content": f"Error processing message: {str(e)}",
+                    "content": "Patient not found. Please create patient first.",
                     "patient_id": patient_id
                 })
-                
+                continue
+
+            if manager.patient_connections.get(patient_id) is not channel and kind != "close":
+                await manager.attach_patient(patient_id, channel)
+            if kind == "attach":
+                await send({
+                    "type": "system",
+                    "content": f"Patient connected. Condition: {patient.condition}",
+                    **channel.snapshot(patient_id, patient.state),
+                    "patient_id": patient_id
+                })
+            elif kind == "message":
+                # Turns for different patients run side by side; run_turn
+                # serialises turns for the same patient.
+                task = asyncio.create_task(handle_turn(send, patient_id, patient, frame.get("message", ""),
+                                                       received_at, channel.delta))
+                channel.tasks.add(task)
+                task.add_done_callback(channel.tasks.discard)
+            elif kind == "close":
+                channel.sent.pop(patient_id, None)
+                await manager.disconnect_patient(patient_id)
+                await send({"type": "closed", "patient_id": patient_id})
+            else:
+                await send({"type": "error", "content": f"Unknown frame type: {kind}", "patient_id": patient_id})
+
     except WebSocketDisconnect:
-        manager.disconnect_patient(patient_id)
-        logger.info(f"Patient {patient_id} disconnected")
+        await manager.disconnect_doctor(channel)
     except Exception as e:
-        logger.error(f"WebSocket error for patient {patient_id}: {str(e)}")
-        manager.disconnect_patient(patient_id)
+        logger.error("WebSocket error for doctor %s: %s", doctor_id, e)
+        await manager.disconnect_doctor(channel)
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", 8000)), reload=True)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", 8000)), reload=True,
+                ws_ping_interval=WS_PING_INTERVAL, ws_ping_timeout=WS_PING_INTERVAL)
\ No newline at end of file
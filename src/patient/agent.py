@@ -1,24 +1,29 @@
 import os
-from typing import List
-from langchain_anthropic import ChatAnthropic
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
-from langgraph.graph import StateGraph, END
+from functools import lru_cache
+from typing import List, Optional, Tuple
+from langchain_core.messages import HumanMessage, AIMessage
 
-from .state import PatientState
-from .diagnosis import TREATMENT_OPTIONS
+from .state import PatientState, message_text
+from .cache import response_cache, response_key
+from .classifier import INTENT_CLASSIFICATIONS, known_intent, remember_intent
+from .context import context_window
+from .instrumentation import timed_node
+from .models import get_model
+from .routing import routed
+from .metrics import histogram
+from .scheduler import model_scheduler
+from .prompts import earlier_chat, stage_suffix, system_message, system_prefix
+from .matcher import doc_keyword_matcher, symptom_matcher, treatment_matcher
 
-from dotenv import load_dotenv
+PROMPT_CACHE = os.getenv("PATBOT_PROMPT_CACHE", "1") != "0"
+GRAPH_MODES = ("sequential", "speculative", "fused")
+GRAPH_MODE = os.getenv("PATBOT_GRAPH_MODE", "sequential")
 
-load_dotenv()
-
-model = ChatAnthropic(
-    model="claude-haiku-4-5-20251001",
-    api_key=os.getenv("ANTHROPIC_API_KEY")
-)
-
-helper = ChatAnthropic(
-    model="claude-haiku-4-5-20251001",
-    api_key=os.getenv("ANTHROPIC_API_KEY")
+PROMPT_TOKENS = histogram(
+    "patbot_prompt_input_tokens",
+    "Input tokens per patient reply, split into cache reads, cache writes and uncached tokens.",
+    ("kind",),
+    buckets=(0, 50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000),
 )
 
 def init_condition(condition: str, true_symptoms: List[str]) -> PatientState:
@@ -28,122 +33,174 @@ def init_condition(condition: str, true_symptoms: List[str]) -> PatientState:
         "revealed_symptoms": [],
         "all_symptoms": true_symptoms,
         "convo_stage": "greeting",
-        "accepted": False
+        "accepted": False,
+        "excerpt": "",
+        "trimmed": 0,
+        "summary": "",
+        "dropped": []
     }
 
-def intent_classifier(state: PatientState) -> dict:
-    intent = ["greeting", "symptom_inquiry", "treatment_prescription", "general_question"]
+INTENTS = ["greeting", "symptom_inquiry", "treatment_prescription", "general_question"]
+DEFAULT_STAGE = "general_question"
+
+
+def intent_prompt(doc_message: str) -> List[HumanMessage]:
+    system_prompt = (
+        f"Given the message said by the Doctor: {doc_message}, determine its intent "
+        f"based on these classifications: {', '.join(INTENTS)}. "
+        f"Do not add any other classes. Just send back the classification as a string."
+    )
+    return [HumanMessage(system_prompt)]
+
 
+def model_intent(doc_message: str, label: str) -> str:
+    # The helper model can answer with anything; only known intents are
+    # used and cached, so a bad label isn't replayed for every repeat.
+    INTENT_CLASSIFICATIONS.inc(source="llm")
+    label = label.strip().split("\n", 1)[0].strip()
+    if label in INTENTS:
+        remember_intent(doc_message, label)
+        return label
+    return DEFAULT_STAGE
+
+
+def intent_classifier(state: PatientState) -> dict:
     if isinstance(state["messages"][-1], HumanMessage):
         doc_message = state["messages"][-1].content
-        system_prompt = (
-            f"Given the message said by the Doctor: {doc_message}, determine its intent "
-            f"based on these classifications: {', '.join(intent)}. "
-            f"Do not add any other classes. Just send back the classification as a string."
-        )
-        stage = helper.invoke([HumanMessage(system_prompt)])
-        return {"convo_stage": stage.content.strip()}
+        stage = known_intent(doc_message)
+        if stage is None:
+            label = model_scheduler().invoke(routed(get_model("helper"), "conversation_stage"), intent_prompt(doc_message), "helper").content.strip()
+            stage = model_intent(doc_message, label)
+        return {"convo_stage": stage}
     
     return {}
 
-def treatment_analysis(state: PatientState) -> dict:
-    if state["convo_stage"] == "treatment_prescription":
-        treatment = state["messages"][-1].content.lower()
-        condition = state["patient_condition"]
 
-        if condition not in TREATMENT_OPTIONS:
-            return {"accepted": False}
-        
-        options = TREATMENT_OPTIONS[condition]
+async def aintent_classifier(state: PatientState) -> dict:
+    if isinstance(state["messages"][-1], HumanMessage):
+        doc_message = state["messages"][-1].content
+        stage = known_intent(doc_message)
+        if stage is None:
+            label = (await model_scheduler().ainvoke(routed(get_model("helper"), "conversation_stage"), intent_prompt(doc_message), "helper")).content.strip()
+            stage = model_intent(doc_message, label)
+        return {"convo_stage": stage}
+
+    return {}
 
-        has_accepted = any(keyword in treatment for keyword in options["accepted"])
-        has_rejected = any(keyword in treatment for keyword in options["rejected"])
 
-        if has_accepted:
-            return {"accepted": True}
-        elif has_rejected:
+def treatment_analysis(state: PatientState) -> dict:
+    if state["convo_stage"] == "treatment_prescription":
+        matcher = treatment_matcher(state["patient_condition"])
+        if matcher is None:
             return {"accepted": False}
 
+        # Negated mentions ("no antibiotics", "avoid ibuprofen") are not
+        # prescriptions; a prescribed rejected treatment vetoes the rest.
+        hits = {hit.label for hit in matcher.scan(state["messages"][-1].content) if not hit.negated}
+        return {"accepted": "accepted" in hits and "rejected" not in hits}
+
     return {"accepted": False}
 
 
+def disclosure_order(state: PatientState, doc_message: str) -> Tuple[List[str], List[str]]:
+    # Symptoms the doctor asks about by name come first.
+    revealed = set(state["revealed_symptoms"])
+    remaining = [item for item in state["all_symptoms"] if item not in revealed]
+    matcher = symptom_matcher(state["patient_condition"])
+    named = {hit.label for hit in matcher.scan(doc_message)} if matcher is not None else set()
+    asked = [item for item in remaining if item in named]
+    return asked, asked + [item for item in remaining if item not in asked]
+
+
 def disclosed_symptoms(state: PatientState) -> dict:
-    doc_keywords = ["symptoms", "feeling", "experiencing", "what's wrong", "how are you"]
-    
     if isinstance(state["messages"][-1], HumanMessage):
-        doc_message = state["messages"][-1].content.lower()
-        revealed = state["revealed_symptoms"]
-        diagnosed = state["all_symptoms"]
-        remaining = [item for item in diagnosed if item not in revealed]
-        
-        if len(revealed) == len(diagnosed):
+        doc_message = state["messages"][-1].content
+        if len(state["revealed_symptoms"]) == len(state["all_symptoms"]):
             return {}
-        
-        exists = any(s in doc_message for s in doc_keywords)
-        if exists:
-            if len(remaining) >= 2:
-                return {"revealed_symptoms": remaining[0:2]}
-            return {"revealed_symptoms": remaining}
+
+        asked, ordered = disclosure_order(state, doc_message)
+        # A symptom asked about by name is all that comes out; a general
+        # question about symptoms reveals the next two.
+        if asked:
+            return {"revealed_symptoms": asked}
+        if doc_keyword_matcher().search(doc_message):
+            return {"revealed_symptoms": ordered[0:2]}
     
     return {}
 
 
-def res_patient(state: PatientState) -> dict:
-    condition = state["patient_condition"]
+def patient_prompt(state: PatientState) -> Tuple[list, dict]:
     symptoms = state["revealed_symptoms"]
-    stage = state["convo_stage"]
+    suffix = stage_suffix(state["convo_stage"], state["accepted"], symptoms, state["messages"][-1].content)
+
+    window, context_update = context_window().apply(state)
+    excerpt = context_update.get("excerpt", state.get("excerpt", ""))
+    summary = state.get("summary", "")
+    if (summary or excerpt) and len(window) < len(state["messages"]):
+        suffix += earlier_chat(summary, excerpt)
+        if symptoms:
+            suffix += f"\nSymptoms you have already mentioned: {', '.join(symptoms)}."
 
-    if stage == "greeting":
-        system_prompt = (
-            f"You are chatting online as a patient. Do not reveal or name your underlying condition: {condition}."
-            f" The doctor said: {state['messages'][-1].content}. "
-            "If the doctor greets you or engages in casual, non-medical small talk, respond like a real person in a chat with their doctor."
-            " Keep it brief, natural, and avoid stage directions (no asterisks or actions)."
-            " Mention how you feel without listing specific symptoms yet."
-        )
-
-    elif stage == "general_question":
-        system_prompt = (
-            f"You are chatting online as a patient. Do not reveal or name your underlying condition: {condition}."
-            f" The doctor asked: {state['messages'][-1].content}. "
-            "Respond naturally as a real patient would in a chat with their doctor."
-            " Keep it concise, avoid stage directions, and stay on-topic."
-        )
-
-    elif stage == "treatment_prescription":
-        if state["accepted"]:
-            system_prompt = (
-                f"You are chatting online as a patient. Do not reveal or name your underlying condition: {condition}."
-                f" The doctor prescribed: {state['messages'][-1].content}. "
-                "Acknowledge and accept the treatment politely, keep it brief like a chat, and say goodbye."
-                " Avoid stage directions or emotive actions."
-            )
-        else:
-            system_prompt = (
-                f"You are chatting online as a patient. Do not reveal or name your underlying condition: {condition}."
-                f" The doctor prescribed: {state['messages'][-1].content}. "
-                "Politely decline and ask for an alternative in a concise chat response."
-                " Avoid stage directions or emotive actions."
-            )
-
-    elif stage == "symptom_inquiry":
-        if len(symptoms) == 0:
-            system_prompt = (
-                f"You are chatting online as a patient. Do not reveal or name your underlying condition: {condition}."
-                " Respond naturally to the doctor's small talk or symptom inquiries in a concise chat style."
-                " Avoid stage directions or dramatized actions."
-            )
-        else:
-            system_prompt = (
-                f"You are chatting online as a patient. Do not reveal or name your underlying condition: {condition}."
-                f" You can mention these symptoms only: {', '.join(symptoms)}."
-                " Share them naturally in a concise chat reply and avoid stage directions."
-            )
-
-    messages = [SystemMessage(content=system_prompt)] + state["messages"]
-    response = model.invoke(messages)
-    
-    return {"messages": [AIMessage(content=response.content)]}
+    system = system_message(system_prefix(state["patient_condition"]), suffix, cache=PROMPT_CACHE)
+    return [system] + window, context_update
+
+
+def record_usage(response) -> None:
+    usage = getattr(response, "usage_metadata", None)
+    if not usage:
+        return
+    details = usage.get("input_token_details") or {}
+    cache_read = details.get("cache_read") or 0
+    cache_creation = details.get("cache_creation") or 0
+    PROMPT_TOKENS.observe(cache_read, kind="cache_read")
+    PROMPT_TOKENS.observe(cache_creation, kind="cache_creation")
+    PROMPT_TOKENS.observe(usage["input_tokens"] - cache_read - cache_creation, kind="uncached")
+
+
+def cached_reply(state: PatientState) -> Optional[str]:
+    cache = response_cache()
+    return cache.get(response_key(state)) if cache is not None else None
+
+
+def cache_reply(state: PatientState, reply: str):
+    cache = response_cache()
+    if cache is not None and reply:
+        cache.add(response_key(state), reply)
+
+
+def res_patient(state: PatientState) -> dict:
+    prompt, context_update = patient_prompt(state)
+    reply = cached_reply(state)
+    if reply is None:
+        model = routed(get_model("patient"), "generate_response", state["convo_stage"])
+        response = model_scheduler().invoke(model, prompt, "patient")
+        record_usage(response)
+        reply = message_text(response)
+        cache_reply(state, reply)
+    
+    return {"messages": [AIMessage(content=reply)], **context_update}
+
+
+async def ares_patient(state: PatientState) -> dict:
+    # Streams so that graph.astream(stream_mode="messages") can forward
+    # tokens to the doctor while the reply is still being generated.
+    from langgraph.config import get_stream_writer
+
+    prompt, context_update = patient_prompt(state)
+    reply = cached_reply(state)
+    if reply is not None:
+        get_stream_writer()({"delta": reply})
+        return {"messages": [AIMessage(content=reply)], **context_update}
+
+    response = None
+    model = routed(get_model("patient"), "generate_response", state["convo_stage"])
+    async for chunk in model_scheduler().astream(model, prompt, "patient"):
+        response = chunk if response is None else response + chunk
+    record_usage(response)
+    reply = message_text(response) if response else ""
+    cache_reply(state, reply)
+
+    return {"messages": [AIMessage(content=reply)], **context_update}
 
 
 def node_router(state: PatientState) -> str:
@@ -159,27 +216,63 @@ def node_router(state: PatientState) -> str:
             return "generate_response"
 
 
-def create_graph():
+def create_graph(mode: Optional[str] = None):
+    # PATBOT_GRAPH_MODE: "sequential" classifies, then replies; "speculative"
+    # drafts the reply for the predicted stage while classifying; "fused"
+    # gets the stage, reply and disclosures from one structured call.
+    # langgraph is imported here rather than at module level to keep it
+    # out of the server's import time.
+    from langgraph.graph import StateGraph, END
+
+    mode = mode or GRAPH_MODE
+    if mode not in GRAPH_MODES:
+        raise ValueError(f"Unknown PATBOT_GRAPH_MODE: {mode}")
     workflow = StateGraph(PatientState)
 
-    workflow.add_node("analyze_symptoms", disclosed_symptoms)
-    workflow.add_node("generate_response", res_patient)
-    workflow.add_node("evaluate_treatment", treatment_analysis)
-    workflow.add_node("conversation_stage", intent_classifier)
-    
-    workflow.set_entry_point("conversation_stage")
-    workflow.add_conditional_edges("conversation_stage", node_router, {
+    if mode == "fused":
+        from .fused import afused_turn, fused_turn
+
+        workflow.add_node("fused_turn", timed_node("fused_turn", fused_turn, afused_turn))
+        workflow.set_entry_point("fused_turn")
+        workflow.add_edge("fused_turn", END)
+        return workflow.compile()
+
+    workflow.add_node("analyze_symptoms", timed_node("analyze_symptoms", disclosed_symptoms))
+    workflow.add_node("generate_response", timed_node("generate_response", res_patient, ares_patient))
+    workflow.add_node("evaluate_treatment", timed_node("evaluate_treatment", treatment_analysis))
+    routes = {
         "analyze_symptoms": "analyze_symptoms",
         "evaluate_treatment": "evaluate_treatment",
         "generate_response": "generate_response"
-    })
+    }
+
+    if mode == "speculative":
+        from .speculative import aspeculative_stage, speculation_router, speculative_stage
+
+        workflow.add_node("conversation_stage", timed_node("conversation_stage", speculative_stage, aspeculative_stage))
+        workflow.add_conditional_edges("conversation_stage", speculation_router, {**routes, "end": END})
+    else:
+        workflow.add_node("conversation_stage", timed_node("conversation_stage", intent_classifier, aintent_classifier))
+        workflow.add_conditional_edges("conversation_stage", node_router, routes)
+
+    workflow.set_entry_point("conversation_stage")
     workflow.add_edge("analyze_symptoms", "generate_response")
     workflow.add_edge("evaluate_treatment", "generate_response")
     workflow.add_edge("generate_response", END)
     
     return workflow.compile()
 
+
+@lru_cache(maxsize=None)
+def shared_graph():
+    # The compiled graph holds no per-patient data, so one instance serves
+    # every patient in the process; each Patient keeps only its state dict.
+    return create_graph()
+
 if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
     initial_state = init_condition(
         condition="common cold",
         true_symptoms=["runny nose", "sore throat", "mild fever", "fatigue"]
@@ -0,0 +1,139 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml")
+MIN_COMPRESS_BYTES = 256
+
+
+class Asset(NamedTuple):
+    media_type: str
+    mtime: float
+    etag: str
+    last_modified: str
+    cache_control: str
+    # encoding ("identity", "gzip", "br") -> body
+    bodies: Dict[str, bytes]
+
+
+def _compressible(media_type: str, body: bytes) -> bool:
+    return len(body) >= MIN_COMPRESS_BYTES and media_type.startswith(COMPRESSIBLE)
+
+
+def load_asset(path: Path, cache_control: str) -> Asset:
+    body = path.read_bytes()
+    mtime = path.stat().st_mtime
+    media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    if media_type.startswith("text/"):
+        media_type += "; charset=utf-8"
+    bodies = {"identity": body}
+    if _compressible(media_type, body):
+        bodies["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+        if brotli is not None:
+            bodies["br"] = brotli.compress(body, quality=11)
+        # Don't keep an encoding that didn't make the file smaller.
+        bodies = {k: v for k, v in bodies.items() if k == "identity" or len(v) < len(body)}
+    return Asset(
+        media_type=media_type,
+        mtime=mtime,
+        etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+        last_modified=formatdate(mtime, usegmt=True),
+        cache_control=cache_control,
+        bodies=bodies,
+    )
+
+
+def choose_encoding(accept_encoding: str, available) -> str:
+    offered = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip().lower()] = q
+    for encoding in ("br", "gzip"):
+        if encoding in available and offered.get(encoding, offered.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
+
+
+def not_modified(asset: Asset, if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or asset.etag in tags or any(t.startswith(asset.etag[:-1] + "-") for t in tags)
+    if if_modified_since:
+        try:
+            return int(asset.mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+class AssetCache:
+    # Every file under `directory` read and pre-compressed once. With
+    # reload=True the directory is re-stat'ed on each lookup so edits to the
+    # frontend show up without restarting the server.
+    def __init__(self, directory: Path, reload: bool = False, html_cache: str = "no-cache",
+                 max_age: int = 604800):
+        self.directory = Path(directory)
+        self.reload = reload
+        self.html_cache = html_cache
+        self.max_age = max_age
+        self.assets: Dict[str, Asset] = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def _cache_control(self, name: str) -> str:
+        if name.endswith(".html"):
+            return self.html_cache
+        return f"public, max-age={self.max_age}"
+
+    def _files(self) -> Dict[str, Path]:
+        return {
+            path.relative_to(self.directory).as_posix(): path
+            for path in self.directory.rglob("*")
+            if path.is_file()
+        }
+
+    def load(self):
+        with self._lock:
+            self.assets = {name: load_asset(path, self._cache_control(name)) for name, path in self._files().items()}
+
+    def _refresh(self, name: str) -> Optional[Asset]:
+        path = (self.directory / name).resolve()
+        if self.directory.resolve() not in path.parents or not path.is_file():
+            with self._lock:
+                self.assets.pop(name, None)
+            return None
+        asset = self.assets.get(name)
+        if asset is None or asset.mtime != path.stat().st_mtime:
+            asset = load_asset(path, self._cache_control(name))
+            with self._lock:
+                self.assets[name] = asset
+        return asset
+
+    def get(self, name: str) -> Optional[Asset]:
+        if self.reload:
+            return self._refresh(name)
+        return self.assets.get(name)
+
+
+def asset_cache(directory: Path) -> AssetCache:
+    return AssetCache(
+        directory,
+        reload=os.getenv("PATBOT_STATIC_RELOAD", "0") == "1",
+        max_age=int(os.getenv("PATBOT_STATIC_MAX_AGE", "604800")),
+    )
@@ -0,0 +1,124 @@
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Hashable, List, Optional
+
+from .metrics import counter
+
+CACHE_LOOKUPS = counter(
+    "patbot_cache_lookups_total",
+    "Response and intent cache lookups, by cache and result (hit/miss).",
+    ("cache", "result"),
+)
+CACHE_EVICTIONS = counter(
+    "patbot_cache_evictions_total",
+    "Entries dropped from the response and intent caches, by cache and reason (size/expired).",
+    ("cache", "reason"),
+)
+
+_PUNCTUATION = re.compile(r"[^\w\s']+")
+_SPACE = re.compile(r"\s+")
+
+
+def normalize(message: str) -> str:
+    return _SPACE.sub(" ", _PUNCTUATION.sub(" ", message.lower())).strip()
+
+
+class LRUCache:
+    # Bounded by entry count, least recently used evicted first; entries
+    # older than `ttl` seconds are treated as missing.
+    def __init__(self, name: str, max_entries: int, ttl: float):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if self.ttl and time.monotonic() - stored_at > self.ttl:
+            del self._entries[key]
+            CACHE_EVICTIONS.inc(cache=self.name, reason="expired")
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            value = self._lookup(key)
+        CACHE_LOOKUPS.inc(cache=self.name, result="miss" if value is None else "hit")
+        return value
+
+    def _store(self, key: Hashable, value: Any):
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            CACHE_EVICTIONS.inc(cache=self.name, reason="size")
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._store(key, value)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ResponseCache(LRUCache):
+    # Keeps up to `variants` replies per key. Until a key has them all every
+    # lookup misses so the model adds another; after that a random one is served.
+    def __init__(self, max_entries: int, ttl: float, variants: int = 3, rng=random):
+        super().__init__("response", max_entries, ttl)
+        self.variants = variants
+        self.rng = rng
+
+    def get(self, key: Hashable) -> Optional[str]:
+        with self._lock:
+            replies = self._lookup(key)
+            reply = self.rng.choice(replies) if replies and len(replies) >= self.variants else None
+        CACHE_LOOKUPS.inc(cache=self.name, result="miss" if reply is None else "hit")
+        return reply
+
+    def add(self, key: Hashable, reply: str):
+        with self._lock:
+            replies: List[str] = list(self._lookup(key) or [])
+            if reply not in replies:
+                replies.append(reply)
+            self._store(key, replies[-self.variants:])
+
+
+def response_key(state: dict) -> tuple:
+    return (
+        normalize(state["messages"][-1].content),
+        state["patient_condition"],
+        state["convo_stage"],
+        state["accepted"],
+        frozenset(state["revealed_symptoms"]),
+    )
+
+
+@lru_cache(maxsize=None)
+def response_cache() -> Optional[ResponseCache]:
+    # Opt-in: cached replies ignore earlier turns, so patients may repeat themselves.
+    if os.getenv("PATBOT_RESPONSE_CACHE", "0") == "0":
+        return None
+    return ResponseCache(
+        int(os.getenv("PATBOT_RESPONSE_CACHE_SIZE", "10000")),
+        float(os.getenv("PATBOT_RESPONSE_CACHE_TTL", "3600")),
+        int(os.getenv("PATBOT_RESPONSE_CACHE_VARIANTS", "3")),
+    )
+
+
+@lru_cache(maxsize=None)
+def intent_cache() -> Optional[LRUCache]:
+    size = int(os.getenv("PATBOT_INTENT_CACHE_SIZE", "10000"))
+    if size <= 0:
+        return None
+    return LRUCache("intent", size, float(os.getenv("PATBOT_INTENT_CACHE_TTL", "86400")))
@@ -0,0 +1,262 @@
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .diagnosis import CONDITION_DETAILS, CONDITION_SYMPTOMS, TERM_SYNONYMS, TREATMENT_OPTIONS
+
+
+class Condition(NamedTuple):
+    name: str
+    specialty: str
+    difficulty: int
+    weight: float
+    symptoms: List[str]
+    accepted: List[str]
+    rejected: List[str]
+    synonyms: Dict[str, List[str]]
+
+
+class AliasTable:
+    # Vose's alias method: O(n) to build, O(1) per weighted draw.
+    def __init__(self, weights: List[float]):
+        n = len(weights)
+        total = sum(weights)
+        if not n or total <= 0:
+            raise LookupError("No conditions to sample from")
+        scaled = [w * n / total for w in weights]
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+
+    def sample(self, rng=random) -> int:
+        i = int(rng.random() * len(self.prob))
+        return i if rng.random() < self.prob[i] else self.alias[i]
+
+
+class Catalogue(ABC):
+    # Subclasses provide the candidate keys and weights for a filter and load
+    # one condition by key; sampling tables are built per filter on demand.
+    def __init__(self):
+        self._tables: Dict[tuple, Tuple[list, AliasTable]] = {}
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _candidates(self, specialty: Optional[str], difficulty: Optional[int]) -> Tuple[list, List[float]]:
+        ...
+
+    @abstractmethod
+    def _load(self, key) -> Condition:
+        ...
+
+    @abstractmethod
+    def get(self, name: str) -> Optional[Condition]:
+        ...
+
+    @abstractmethod
+    def specialties(self) -> List[str]:
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    def _table(self, specialty: Optional[str], difficulty: Optional[int]) -> Tuple[list, AliasTable]:
+        key = (specialty, difficulty)
+        table = self._tables.get(key)
+        if table is None:
+            keys, weights = self._candidates(specialty, difficulty)
+            table = (keys, AliasTable(weights))
+            with self._lock:
+                self._tables[key] = table
+        return table
+
+    def sample(self, rng=random, specialty: Optional[str] = None, difficulty: Optional[int] = None) -> Condition:
+        keys, table = self._table(specialty, difficulty)
+        return self._load(keys[table.sample(rng)])
+
+
+class DictCatalogue(Catalogue):
+    def __init__(self, conditions: Iterable[Condition]):
+        super().__init__()
+        self.conditions = {condition.name: condition for condition in conditions}
+
+    def _candidates(self, specialty, difficulty):
+        keys = [
+            name for name, c in self.conditions.items()
+            if (specialty is None or c.specialty == specialty) and (difficulty is None or c.difficulty == difficulty)
+        ]
+        return keys, [self.conditions[name].weight for name in keys]
+
+    def _load(self, key) -> Condition:
+        return self.conditions[key]
+
+    def get(self, name: str) -> Optional[Condition]:
+        return self.conditions.get(name)
+
+    def specialties(self) -> List[str]:
+        return sorted({c.specialty for c in self.conditions.values()})
+
+    def __len__(self) -> int:
+        return len(self.conditions)
+
+
+class SQLiteCatalogue(Catalogue):
+    # Read-only; nothing is read until first use. Only ids and weights are
+    # loaded to build a sampling table, and conditions are fetched by
+    # primary key and kept in a bounded LRU cache.
+    def __init__(self, path: str, cache_size: int = 4096):
+        super().__init__()
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._by_id = lru_cache(maxsize=cache_size)(self._fetch)
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        with self._db_lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            return self._conn.execute(sql, params).fetchall()
+
+    def _candidates(self, specialty, difficulty):
+        clauses, params = [], []
+        if specialty is not None:
+            clauses.append("specialty = ?")
+            params.append(specialty)
+        if difficulty is not None:
+            clauses.append("difficulty = ?")
+            params.append(difficulty)
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        rows = self._execute(f"SELECT id, weight FROM conditions{where}", tuple(params))
+        return [row[0] for row in rows], [row[1] for row in rows]
+
+    def _fetch(self, condition_id: int) -> Optional[Condition]:
+        rows = self._execute(
+            "SELECT name, specialty, difficulty, weight FROM conditions WHERE id = ?", (condition_id,)
+        )
+        if not rows:
+            return None
+        terms = {"symptom": [], "accepted": [], "rejected": []}
+        synonyms = {}
+        for kind, term, alternatives in self._execute(
+            "SELECT kind, term, synonyms FROM terms WHERE condition_id = ? ORDER BY kind, position", (condition_id,)
+        ):
+            terms[kind].append(term)
+            if alternatives:
+                synonyms[term] = alternatives.split("|")
+        return Condition(*rows[0], terms["symptom"], terms["accepted"], terms["rejected"], synonyms)
+
+    def _load(self, key) -> Condition:
+        return self._by_id(key)
+
+    def get(self, name: str) -> Optional[Condition]:
+        rows = self._execute("SELECT id FROM conditions WHERE name = ?", (name,))
+        return self._by_id(rows[0][0]) if rows else None
+
+    def specialties(self) -> List[str]:
+        return [row[0] for row in self._execute("SELECT DISTINCT specialty FROM conditions ORDER BY specialty")]
+
+    def __len__(self) -> int:
+        return self._execute("SELECT COUNT(*) FROM conditions")[0][0]
+
+
+def build_catalogue(path: str, conditions: Iterable[Condition]):
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executescript(
+            "DROP TABLE IF EXISTS terms;"
+            "DROP TABLE IF EXISTS conditions;"
+            "CREATE TABLE conditions ("
+            " id INTEGER PRIMARY KEY,"
+            " name TEXT NOT NULL UNIQUE,"
+            " specialty TEXT NOT NULL,"
+            " difficulty INTEGER NOT NULL,"
+            " weight REAL NOT NULL);"
+            "CREATE TABLE terms ("
+            " condition_id INTEGER NOT NULL REFERENCES conditions (id),"
+            " kind TEXT NOT NULL,"
+            " position INTEGER NOT NULL,"
+            " term TEXT NOT NULL,"
+            " synonyms TEXT NOT NULL);"
+        )
+        for condition in conditions:
+            condition_id = conn.execute(
+                "INSERT INTO conditions (name, specialty, difficulty, weight) VALUES (?, ?, ?, ?)",
+                (condition.name, condition.specialty, condition.difficulty, condition.weight),
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO terms VALUES (?, ?, ?, ?, ?)",
+                [
+                    (condition_id, kind, position, term, "|".join(condition.synonyms.get(term, [])))
+                    for kind, terms in (("symptom", condition.symptoms), ("accepted", condition.accepted),
+                                        ("rejected", condition.rejected))
+                    for position, term in enumerate(terms)
+                ],
+            )
+        conn.executescript(
+            "CREATE INDEX conditions_specialty ON conditions (specialty, difficulty);"
+            "CREATE INDEX conditions_difficulty ON conditions (difficulty);"
+            "CREATE INDEX terms_condition ON terms (condition_id);"
+        )
+    conn.execute("VACUUM")
+    conn.close()
+
+
+def builtin_conditions() -> List[Condition]:
+    conditions = []
+    for name, symptoms in CONDITION_SYMPTOMS.items():
+        details = CONDITION_DETAILS.get(name, {})
+        options = TREATMENT_OPTIONS.get(name, {"accepted": [], "rejected": []})
+        terms = symptoms + options["accepted"] + options["rejected"]
+        conditions.append(Condition(
+            name,
+            details.get("specialty", "general practice"),
+            details.get("difficulty", 1),
+            details.get("weight", 1.0),
+            symptoms,
+            options["accepted"],
+            options["rejected"],
+            {term: TERM_SYNONYMS[term] for term in terms if term in TERM_SYNONYMS},
+        ))
+    return conditions
+
+
+def load_conditions(path: str) -> List[Condition]:
+    # JSON lines with name, specialty, difficulty, weight, symptoms,
+    # accepted, rejected and an optional synonyms object.
+    with open(path) as f:
+        return [
+            Condition(row["name"], row.get("specialty", "general practice"), row.get("difficulty", 1),
+                      row.get("weight", 1.0), row["symptoms"], row.get("accepted", []),
+                      row.get("rejected", []), row.get("synonyms", {}))
+            for row in map(json.loads, filter(str.strip, f))
+        ]
+
+
+@lru_cache(maxsize=None)
+def catalogue() -> Catalogue:
+    # PATBOT_CATALOGUE points at a SQLite catalogue built with
+    # `python -m patient.catalogue <conditions.jsonl> <catalogue.db>`;
+    # without it the built-in conditions from diagnosis.py are used.
+    path = os.getenv("PATBOT_CATALOGUE")
+    if path:
+        return SQLiteCatalogue(path)
+    return DictCatalogue(builtin_conditions())
+
+
+if __name__ == "__main__":
+    source, target = sys.argv[1:3]
+    build_catalogue(target, load_conditions(source))
+    print(f"Wrote {len(SQLiteCatalogue(target))} conditions to {target}")
@@ -0,0 +1,204 @@
+import json
+import math
+import os
+import re
+from collections import Counter as TermCounter
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .diagnosis import CONDITION_SYMPTOMS, DOC_KEYWORDS, TREATMENT_OPTIONS
+from .cache import intent_cache, normalize
+from .matcher import KeywordMatcher
+from .metrics import counter
+
+INTENT_CLASSIFICATIONS = counter(
+    "patbot_intent_classifications_total",
+    "Doctor messages classified, by the tier that produced the label.",
+    ("source",),
+)
+
+GREETING_TERMS = [
+    "hello", "hi", "hey", "good morning", "good afternoon", "good evening",
+    "nice to meet you", "welcome", "greetings",
+]
+
+SYMPTOM_TERMS = DOC_KEYWORDS + [
+    "symptom", "feel", "hurt", "hurts", "pain", "ache", "how long", "since when",
+    "any other", "anything else bothering", "what brings you", "what seems to be",
+    "where does it", "how bad", "describe",
+]
+
+TREATMENT_TERMS = [
+    "prescribe", "prescribing", "prescription", "i recommend", "i suggest",
+    "i'd recommend", "i would recommend", "i'm going to give you", "you should take",
+    "start you on", "try taking", "i advise", "take", "keep taking", "you need",
+]
+
+# Treatment nouns get their own label: "rest" or "paracetamol" alone is as
+# likely history taking ("Did you get enough rest?") as a prescription.
+TREATMENT_OPTION = "treatment_option"
+_QUESTION = re.compile(
+    r"\?\s*$|^\s*(?:did|do|does|have|has|had|are|is|was|were|what|how|when|why|which|any|can|could)\b",
+    re.IGNORECASE,
+)
+
+GENERAL_TERMS = [
+    "allergic", "allergies", "medical history", "do you smoke", "do you drink",
+    "how old", "your age", "occupation", "family history", "have you taken",
+    "are you taking", "do you take", "currently taking", "travel",
+]
+
+
+def _rule_terms() -> Dict[str, str]:
+    terms = {}
+    for term in GENERAL_TERMS:
+        terms[term] = "general_question"
+    for term in GREETING_TERMS:
+        terms[term] = "greeting"
+    for symptoms in CONDITION_SYMPTOMS.values():
+        for term in symptoms:
+            terms[term.lower()] = "symptom_inquiry"
+    for term in SYMPTOM_TERMS:
+        terms[term] = "symptom_inquiry"
+    for options in TREATMENT_OPTIONS.values():
+        for term in options["accepted"] + options["rejected"]:
+            terms[term.lower()] = TREATMENT_OPTION
+    for term in TREATMENT_TERMS:
+        terms[term] = "treatment_prescription"
+    return terms
+
+
+class RuleClassifier:
+    # Labels a message only when every rule that fires agrees; mixed or
+    # missing signals return None so the caller can escalate. A prescription
+    # needs a cue ("prescribe", "take", "I recommend") with a treatment, in
+    # a statement; questions about treatments are left to the model.
+    def __init__(self, terms: Optional[Dict[str, str]] = None):
+        self.matcher = KeywordMatcher(terms if terms is not None else _rule_terms())
+        self.terms = self.matcher.terms
+
+    def labels(self, message: str) -> set:
+        return self.matcher.labels(message)
+
+    def classify(self, message: str) -> Optional[str]:
+        labels = self.labels(message)
+        cue = "treatment_prescription" in labels
+        labels.discard("treatment_prescription")
+        if TREATMENT_OPTION in labels:
+            if cue and len(labels) == 1 and not _QUESTION.search(message):
+                return "treatment_prescription"
+            return None
+        if len(labels) == 1:
+            return labels.pop()
+        return None
+
+
+def _tokens(message: str) -> List[str]:
+    words = re.findall(r"[a-z']+", message.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class NaiveBayesClassifier:
+    # Small multinomial naive Bayes over unigrams and bigrams, trained from a
+    # labelled corpus; used for messages the rules abstain on.
+    def __init__(self, min_confidence: float = 0.9):
+        self.min_confidence = min_confidence
+        self.priors: Dict[str, float] = {}
+        self.counts: Dict[str, TermCounter] = {}
+        self.totals: Dict[str, int] = {}
+        self.vocabulary: set = set()
+
+    def fit(self, examples: Iterable[Tuple[str, str]]) -> "NaiveBayesClassifier":
+        docs: Dict[str, int] = {}
+        for text, label in examples:
+            docs[label] = docs.get(label, 0) + 1
+            tokens = _tokens(text)
+            self.counts.setdefault(label, TermCounter()).update(tokens)
+            self.vocabulary.update(tokens)
+        n = sum(docs.values())
+        self.priors = {label: math.log(count / n) for label, count in docs.items()}
+        self.totals = {label: sum(c.values()) for label, c in self.counts.items()}
+        return self
+
+    def predict_proba(self, message: str) -> Dict[str, float]:
+        tokens = _tokens(message)
+        v = len(self.vocabulary)
+        scores = {}
+        for label, prior in self.priors.items():
+            counts, total = self.counts[label], self.totals[label]
+            scores[label] = prior + sum(math.log((counts[t] + 1) / (total + v)) for t in tokens)
+        top = max(scores.values())
+        exp = {label: math.exp(score - top) for label, score in scores.items()}
+        norm = sum(exp.values())
+        return {label: value / norm for label, value in exp.items()}
+
+    def classify(self, message: str) -> Optional[str]:
+        if not self.priors:
+            return None
+        proba = self.predict_proba(message)
+        label = max(proba, key=proba.get)
+        return label if proba[label] >= self.min_confidence else None
+
+
+def load_corpus(path: str) -> List[Tuple[str, str]]:
+    with open(path) as f:
+        return [(row["text"], row["label"]) for row in map(json.loads, filter(str.strip, f))]
+
+
+class TieredClassifier:
+    def __init__(self, rules: Optional[RuleClassifier] = None,
+                 local: Optional[NaiveBayesClassifier] = None):
+        self.rules = rules
+        self.local = local
+
+    def classify(self, message: str) -> Optional[str]:
+        if self.rules is not None:
+            label = self.rules.classify(message)
+            if label is not None:
+                INTENT_CLASSIFICATIONS.inc(source="rules")
+                return label
+        if self.local is not None:
+            label = self.local.classify(message)
+            if label is not None:
+                INTENT_CLASSIFICATIONS.inc(source="local")
+                return label
+        return None
+
+
+@lru_cache(maxsize=None)
+def default_classifier() -> TieredClassifier:
+    rules = RuleClassifier() if os.getenv("PATBOT_INTENT_RULES", "1") != "0" else None
+    local = None
+    corpus = os.getenv("PATBOT_INTENT_MODEL")
+    if corpus:
+        min_confidence = float(os.getenv("PATBOT_INTENT_MIN_CONFIDENCE", "0.9"))
+        local = NaiveBayesClassifier(min_confidence).fit(load_corpus(corpus))
+    return TieredClassifier(rules, local)
+
+
+def fast_intent(message: str) -> Optional[str]:
+    return default_classifier().classify(message)
+
+
+def known_intent(message: str) -> Optional[str]:
+    # Local tiers first, then labels the LLM already gave the same message.
+    label = fast_intent(message)
+    cache = intent_cache()
+    if label is None and cache is not None:
+        label = cache.get(normalize(message))
+        if label is not None:
+            INTENT_CLASSIFICATIONS.inc(source="cache")
+    return label
+
+
+def remember_intent(message: str, label: str):
+    cache = intent_cache()
+    if cache is not None:
+        cache.put(normalize(message), label)
+
+
+def fast_path_hit_rate() -> float:
+    total = INTENT_CLASSIFICATIONS.total()
+    if not total:
+        return 0.0
+    return 1 - INTENT_CLASSIFICATIONS.value(source="llm") / total
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import os
+import time
+from functools import cached_property, lru_cache
+from typing import Optional, Tuple
+
+from .metrics import histogram
+
+logger = logging.getLogger(__name__)
+
+WARMUP_SECONDS = histogram(
+    "patbot_warmup_seconds",
+    "Time spent warming up at startup, by step.",
+    ("step",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+
+def http_limits():
+    import httpx
+
+    # The httpx default keeps idle connections for 5s, shorter than a doctor
+    # takes to type, so most turns would pay a fresh TLS handshake.
+    return httpx.Limits(
+        max_connections=int(os.getenv("PATBOT_HTTP_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("PATBOT_HTTP_KEEPALIVE", "20")),
+        keepalive_expiry=float(os.getenv("PATBOT_HTTP_KEEPALIVE_EXPIRY", "300")),
+    )
+
+
+def http_client_params(base_url: Optional[str], proxy: Optional[str]) -> dict:
+    params = {
+        "base_url": base_url or os.getenv("ANTHROPIC_BASE_URL") or "https://api.anthropic.com",
+        "limits": http_limits(),
+    }
+    if proxy:
+        params["proxy"] = proxy
+    return params
+
+
+# One pool per API endpoint and proxy, as langchain_anthropic keys its own
+# default clients, but with the keep-alive limits above.
+@lru_cache(maxsize=None)
+def async_http_client(base_url: Optional[str] = None, proxy: Optional[str] = None):
+    import anthropic
+
+    return anthropic.DefaultAsyncHttpxClient(**http_client_params(base_url, proxy))
+
+
+@lru_cache(maxsize=None)
+def sync_http_client(base_url: Optional[str] = None, proxy: Optional[str] = None):
+    import anthropic
+
+    return anthropic.DefaultHttpxClient(**http_client_params(base_url, proxy))
+
+
+def pool_key(model) -> Tuple[Optional[str], Optional[str]]:
+    return model.anthropic_api_url, model.anthropic_proxy
+
+
+@lru_cache(maxsize=None)
+def pooled_chat_anthropic():
+    # ChatAnthropic has no http_client setting of its own, so the SDK
+    # clients are built here with the shared pool as their http_client.
+    # _client_params and the cached client properties are private, which is
+    # why requirements.txt pins langchain-anthropic to the 1.7 series.
+    import anthropic
+    from langchain_anthropic import ChatAnthropic
+
+    class PooledChatAnthropic(ChatAnthropic):
+        @cached_property
+        def _client(self) -> anthropic.Client:
+            return anthropic.Client(**self._client_params, http_client=sync_http_client(*pool_key(self)))
+
+        @cached_property
+        def _async_client(self) -> anthropic.AsyncClient:
+            return anthropic.AsyncClient(**self._client_params, http_client=async_http_client(*pool_key(self)))
+
+    return PooledChatAnthropic
+
+
+def _build():
+    from .agent import shared_graph
+    from .models import ROLES, get_model
+
+    start = time.perf_counter()
+    for role in ROLES:
+        get_model(role)
+    WARMUP_SECONDS.observe(time.perf_counter() - start, step="models")
+    start = time.perf_counter()
+    shared_graph()
+    WARMUP_SECONDS.observe(time.perf_counter() - start, step="graph")
+
+
+async def warm_up(connections: int = 0):
+    # Imports and builds the model clients and graph off the event loop,
+    # then opens `connections` keep-alive connections to the API so the
+    # first turn after a cold start skips the TLS handshake.
+    try:
+        await asyncio.to_thread(_build)
+        if connections and os.getenv("PATBOT_MODEL_PROVIDER", "anthropic") == "anthropic":
+            from .models import get_model
+
+            start = time.perf_counter()
+            client = async_http_client(*pool_key(get_model("patient")))
+            await asyncio.gather(*(client.head("/") for _ in range(connections)))
+            WARMUP_SECONDS.observe(time.perf_counter() - start, step="connect")
+    except Exception as e:
+        logger.warning("Warm-up failed: %s", e)
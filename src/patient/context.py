@@ -0,0 +1,129 @@
+import logging
+import os
+from functools import lru_cache
+from typing import List, Tuple
+
+from langchain_core.messages import BaseMessage, HumanMessage
+
+from .models import get_model
+from .prompts import summary_prompt
+from .routing import routed
+from .scheduler import model_scheduler
+from .state import message_text
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English chat text.
+    return len(text) // 4 + 1
+
+
+def _excerpt_line(message: BaseMessage, max_chars: int = 160) -> str:
+    speaker = "Doctor" if isinstance(message, HumanMessage) else "You"
+    text = " ".join(str(message.content).split())
+    if len(text) > max_chars:
+        text = text[:max_chars - 3] + "..."
+    return f"{speaker}: {text}"
+
+
+class ContextWindow:
+    # Keeps the prompt bounded: the last `recent_turns` exchanges (capped at
+    # `max_tokens`) are sent verbatim. Messages that fall out of the window
+    # are kept as an excerpt, one shortened line each, holding the newest
+    # `excerpt_tokens` worth. Lines pushed out of the excerpt are folded by
+    # the helper model into a running summary of at most `summary_tokens`;
+    # with summary_tokens=0 they are dropped instead.
+    def __init__(self, recent_turns: int = 8, max_tokens: int = 2000, excerpt_tokens: int = 300,
+                 summary_tokens: int = 150):
+        self.recent_turns = recent_turns
+        self.max_tokens = max_tokens
+        self.excerpt_tokens = excerpt_tokens
+        self.summary_tokens = summary_tokens
+
+    @classmethod
+    def from_env(cls) -> "ContextWindow":
+        return cls(
+            recent_turns=int(os.getenv("PATBOT_CONTEXT_TURNS", "8")),
+            max_tokens=int(os.getenv("PATBOT_CONTEXT_TOKENS", "2000")),
+            excerpt_tokens=int(os.getenv("PATBOT_EXCERPT_TOKENS", "300")),
+            summary_tokens=int(os.getenv("PATBOT_SUMMARY_TOKENS", "150")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.recent_turns > 0
+
+    def window_start(self, messages: List[BaseMessage]) -> int:
+        # The latest doctor message plus the previous `recent_turns` exchanges.
+        start = max(0, len(messages) - 2 * self.recent_turns - 1)
+        used = sum(estimate_tokens(str(m.content)) for m in messages[start:])
+        # Always keep the latest message, drop older ones past the budget.
+        while used > self.max_tokens and start < len(messages) - 1:
+            used -= estimate_tokens(str(messages[start].content))
+            start += 1
+        # Anthropic expects the conversation to open with a user turn.
+        while start < len(messages) - 1 and not isinstance(messages[start], HumanMessage):
+            start += 1
+        return start
+
+    def clip(self, excerpt: str, messages: List[BaseMessage]) -> Tuple[str, List[str]]:
+        # The new excerpt, and the oldest lines that no longer fit in it.
+        lines = excerpt.splitlines() if excerpt else []
+        lines += [_excerpt_line(m) for m in messages]
+        cut = 0
+        while cut < len(lines) - 1 and estimate_tokens("\n".join(lines[cut:])) > self.excerpt_tokens:
+            cut += 1
+        return "\n".join(lines[cut:]), lines[:cut]
+
+    def apply(self, state: dict) -> Tuple[List[BaseMessage], dict]:
+        messages = state["messages"]
+        if not self.enabled:
+            return messages, {}
+
+        start = self.window_start(messages)
+        trimmed = state.get("trimmed", 0)
+        if start <= trimmed:
+            return messages[start:], {}
+
+        excerpt, dropped = self.clip(state.get("excerpt", ""), messages[trimmed:start])
+        return messages[start:], {"excerpt": excerpt, "trimmed": start, "dropped": dropped}
+
+    def cap(self, summary: str) -> str:
+        # The route's max_tokens bounds the reply too, but the summary goes
+        # into every prompt, so it is held to the budget here as well.
+        words = summary.split()
+        while words and estimate_tokens(" ".join(words)) > self.summary_tokens:
+            words.pop()
+        return " ".join(words)
+
+    def _summary_call(self, summary: str, dropped: List[str]):
+        # About three words per four tokens.
+        prompt = summary_prompt(summary, dropped, words=max(1, self.summary_tokens * 3 // 4))
+        return routed(get_model("helper"), "summarise_history"), prompt
+
+    def fold(self, summary: str, dropped: List[str]) -> str:
+        if not dropped or self.summary_tokens <= 0:
+            return summary
+        model, prompt = self._summary_call(summary, dropped)
+        try:
+            return self.cap(message_text(model_scheduler().invoke(model, prompt, "helper")).strip())
+        except Exception as e:
+            # The reply has already gone out; losing these lines beats failing the turn.
+            logger.warning("Could not summarise %d earlier lines: %s", len(dropped), e)
+            return summary
+
+    async def afold(self, summary: str, dropped: List[str]) -> str:
+        if not dropped or self.summary_tokens <= 0:
+            return summary
+        model, prompt = self._summary_call(summary, dropped)
+        try:
+            return self.cap(message_text(await model_scheduler().ainvoke(model, prompt, "helper")).strip())
+        except Exception as e:
+            logger.warning("Could not summarise %d earlier lines: %s", len(dropped), e)
+            return summary
+
+
+@lru_cache(maxsize=None)
+def context_window() -> ContextWindow:
+    return ContextWindow.from_env()
@@ -102,4 +102,27 @@ CONDITION_SYMPTOMS = {
     "migraine": ["severe headache", "nausea", "sensitivity to light", "sensitivity to sound", "visual disturbances"],
     "bacterial pneumonia": ["cough with phlegm", "fever", "chest pain", "difficulty breathing", "fatigue", "chills"],
     "gastric acidity": ["heartburn", "chest discomfort", "bitter taste", "bloating", "nausea", "burping"]
-}
\ No newline at end of file
+}
+
+# Specialty, difficulty (1 easiest to 5 hardest) and relative sampling weight
+# of the built-in conditions; larger catalogues live in SQLite (see catalogue.py).
+CONDITION_DETAILS = {
+    "common cold": {"specialty": "general practice", "difficulty": 1, "weight": 3.0},
+    "fever": {"specialty": "general practice", "difficulty": 1, "weight": 2.0},
+    "dengue": {"specialty": "infectious disease", "difficulty": 3, "weight": 1.0},
+    "migraine": {"specialty": "neurology", "difficulty": 2, "weight": 1.5},
+    "bacterial pneumonia": {"specialty": "pulmonology", "difficulty": 3, "weight": 1.0},
+    "gastric acidity": {"specialty": "gastroenterology", "difficulty": 2, "weight": 1.5}
+}
+
+TERM_SYNONYMS = {
+    "paracetamol": ["acetaminophen", "tylenol"],
+    "ibuprofen": ["advil", "nurofen"],
+    "fluids": ["water"],
+    "runny nose": ["running nose", "nasal discharge"],
+    "high temperature": ["temperature"],
+    "heartburn": ["acid reflux"],
+    "difficulty breathing": ["shortness of breath", "breathlessness"]
+}
+
+DOC_KEYWORDS = ["symptoms", "feeling", "experiencing", "what's wrong", "how are you"]
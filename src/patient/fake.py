@@ -0,0 +1,185 @@
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import Field
+
+from .state import message_text
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+
+def load_script(path: str, role: str) -> Dict[str, str]:
+    # Maps doctor messages to recorded replies from a consultations JSONL file
+    # (see bench/data/consultations.jsonl): the patient reply for the
+    # "patient" role, the labelled stage for the "helper" role.
+    key = "stage" if role == "helper" else "patient"
+    script = {}
+    with open(path) as f:
+        for consultation in map(json.loads, filter(str.strip, f)):
+            for turn in consultation["turns"]:
+                script[turn["doctor"]] = turn[key]
+    return script
+
+
+class FakeChatModel(BaseChatModel):
+    # Offline stand-in for ChatAnthropic. Replies come from `script` (keyed
+    # by the doctor message found in the prompt) or else cycle through
+    # `responses`; delays are drawn from a configurable distribution.
+    responses: List[str] = ["I'm not feeling too well, doctor."]
+    script: Dict[str, str] = Field(default_factory=dict)
+    latency: float = 0.0
+    latency_distribution: str = "fixed"
+    latency_spread: float = 0.0
+    token_latency: float = 0.0
+    input_token_latency: float = 0.0
+    seed: Optional[int] = None
+    calls: int = 0
+    total_delay: float = 0.0
+    last_input_tokens: int = 0
+    cached_prefixes: set = Field(default_factory=set)
+    rng: Any = None
+
+    @classmethod
+    def from_env(cls, role: str) -> "FakeChatModel":
+        # PATBOT_FAKE_LATENCY is "<distribution>:<mean seconds>[,<spread>]",
+        # e.g. "lognormal:0.6,0.4"; PATBOT_FAKE_SCRIPT names a recording.
+        distribution, _, params = os.getenv("PATBOT_FAKE_LATENCY", "fixed:0").partition(":")
+        mean, _, spread = params.partition(",")
+        script_path = os.getenv("PATBOT_FAKE_SCRIPT")
+        return cls(
+            responses=["general_question"] if role == "helper" else ["I'm not feeling too well, doctor."],
+            script=load_script(script_path, role) if script_path else {},
+            latency=float(mean or 0),
+            latency_distribution=distribution,
+            latency_spread=float(spread or 0),
+            token_latency=float(os.getenv("PATBOT_FAKE_TOKEN_LATENCY", "0")) if role != "helper" else 0.0,
+        )
+
+    @property
+    def _llm_type(self) -> str:
+        return "patbot-fake"
+
+    def sample_latency(self) -> float:
+        if self.rng is None:
+            self.rng = random.Random(self.seed)
+        mean, spread = self.latency, self.latency_spread
+        if self.latency_distribution == "fixed" or mean <= 0:
+            return mean
+        if self.latency_distribution == "uniform":
+            return max(0.0, self.rng.uniform(mean - spread, mean + spread))
+        if self.latency_distribution == "exponential":
+            return self.rng.expovariate(1 / mean)
+        if self.latency_distribution == "lognormal":
+            # `spread` is the sigma of the underlying normal; keeps the mean at `mean`.
+            return self.rng.lognormvariate(math.log(mean) - spread ** 2 / 2, spread)
+        raise ValueError(f"Unknown latency distribution: {self.latency_distribution}")
+
+    def _prefill_delay(self, messages: List[BaseMessage]) -> float:
+        # Approximates prompt processing time growing with prompt length.
+        self.last_input_tokens = sum(len(message_text(m)) // 4 + 1 for m in messages)
+        delay = self.sample_latency() + self.input_token_latency * self.last_input_tokens
+        self.total_delay += delay
+        return delay
+
+    def _usage(self, messages: List[BaseMessage], content: str) -> dict:
+        # Mirrors Anthropic prompt caching: system blocks up to the last
+        # cache_control marker are written on first sight and read after.
+        cacheable, blocks = 0, []
+        if messages and isinstance(messages[0], SystemMessage) and isinstance(messages[0].content, list):
+            for i, block in enumerate(messages[0].content):
+                if isinstance(block, dict) and block.get("cache_control"):
+                    blocks = messages[0].content[:i + 1]
+            cacheable = sum(len(b.get("text", "")) // 4 + 1 for b in blocks)
+        key = repr(blocks)
+        cache_read = cacheable if key in self.cached_prefixes else 0
+        if cacheable:
+            self.cached_prefixes.add(key)
+        output_tokens = len(content) // 4 + 1
+        return {
+            "input_tokens": self.last_input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": self.last_input_tokens + output_tokens,
+            "input_token_details": {"cache_read": cache_read, "cache_creation": cacheable - cache_read},
+        }
+
+    def _scripted(self, messages: List[BaseMessage]) -> Optional[str]:
+        if not self.script or not messages:
+            return None
+        last = message_text(messages[-1])
+        if last in self.script:
+            return self.script[last]
+        # The intent prompt embeds the doctor message in a longer instruction.
+        matches = [key for key in self.script if key in last]
+        return self.script[max(matches, key=len)] if matches else None
+
+    def _next_content(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                      max_tokens: Optional[int] = None) -> str:
+        content = self._scripted(messages)
+        if content is None:
+            content = self.responses[self.calls % len(self.responses)]
+        self.calls += 1
+        # Generation settings bound by the routing table, as the API applies them.
+        for sequence in stop or ():
+            content = content.split(sequence, 1)[0]
+        if max_tokens is not None:
+            content = content[:max_tokens * 4]
+        return content
+
+    def _next_result(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                     max_tokens: Optional[int] = None) -> ChatResult:
+        content = self._next_content(messages, stop, max_tokens)
+        message = AIMessage(content=content, usage_metadata=self._usage(messages, content))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _chunks(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                max_tokens: Optional[int] = None) -> List[AIMessageChunk]:
+        content = self._next_content(messages, stop, max_tokens)
+        tokens = re.findall(r"\S+\s*", content) or [""]
+        chunks = [AIMessageChunk(content=token) for token in tokens[:-1]]
+        chunks.append(AIMessageChunk(content=tokens[-1], usage_metadata=self._usage(messages, content)))
+        return chunks
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        delay = self._prefill_delay(messages)
+        if delay:
+            time.sleep(delay)
+        return self._next_result(messages, stop, kwargs.get("max_tokens"))
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        delay = self._prefill_delay(messages)
+        if delay:
+            await asyncio.sleep(delay)
+        return self._next_result(messages, stop, kwargs.get("max_tokens"))
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        delay = self._prefill_delay(messages)
+        if delay:
+            time.sleep(delay)
+        for i, chunk in enumerate(self._chunks(messages, stop, kwargs.get("max_tokens"))):
+            if i and self.token_latency:
+                self.total_delay += self.token_latency
+                time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        delay = self._prefill_delay(messages)
+        if delay:
+            await asyncio.sleep(delay)
+        for i, chunk in enumerate(self._chunks(messages, stop, kwargs.get("max_tokens"))):
+            if i and self.token_latency:
+                self.total_delay += self.token_latency
+                await asyncio.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=chunk)
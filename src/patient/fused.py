@@ -0,0 +1,156 @@
+import json
+import re
+from typing import Optional, Tuple
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.config import get_stream_writer
+from langgraph.constants import TAG_NOSTREAM
+
+from .agent import DEFAULT_STAGE, INTENTS, PROMPT_CACHE, disclosure_order, record_usage, treatment_analysis
+from .classifier import INTENT_CLASSIFICATIONS, known_intent, remember_intent
+from .context import context_window
+from .metrics import counter
+from .models import get_model
+from .prompts import earlier_chat, fused_suffix, system_message, system_prefix
+from .routing import routed
+from .scheduler import model_scheduler
+from .state import PatientState, message_text
+
+FUSED_TURNS = counter(
+    "patbot_fused_turns_total",
+    "Single-call turns, by whether the model's JSON answer parsed.",
+    ("result",),
+)
+
+
+_REPLY_FIELD = re.compile(r'"reply"\s*:\s*"')
+_PARTIAL_ESCAPE = re.compile(r'\\(u[0-9a-fA-F]{0,3})?$')
+
+
+def reply_prefix(text: str) -> Tuple[str, bool]:
+    # The decoded "reply" string as far as it has streamed, and whether its
+    # closing quote has arrived.
+    match = _REPLY_FIELD.search(text)
+    if match is None:
+        return "", False
+    raw, closed, i = text[match.end():], False, 0
+    while i < len(raw):
+        if raw[i] == "\\":
+            i += 2
+            continue
+        if raw[i] == '"':
+            raw, closed = raw[:i], True
+            break
+        i += 1
+    if not closed:
+        raw = _PARTIAL_ESCAPE.sub("", raw)
+    try:
+        return json.loads(f'"{raw}"', strict=False), closed
+    except ValueError:
+        return "", closed
+
+
+class ReplyStream:
+    # Feeds streamed JSON text and returns the newly decoded part of the
+    # reply, so the doctor still sees the patient typing.
+    def __init__(self):
+        self.text = ""
+        self.sent = 0
+
+    def feed(self, chunk: str) -> str:
+        self.text += chunk
+        reply, _ = reply_prefix(self.text)
+        new = reply[self.sent:]
+        self.sent = max(self.sent, len(reply))
+        return new
+
+
+def parse_answer(text: str) -> Optional[dict]:
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end <= start:
+        return None
+    try:
+        answer = json.loads(text[start:end + 1], strict=False)
+    except ValueError:
+        return None
+    if not isinstance(answer, dict) or not isinstance(answer.get("reply"), str):
+        return None
+    return answer
+
+
+def fused_prompt(state: PatientState, accepted: bool, candidates: list) -> Tuple[list, dict]:
+    suffix = fused_suffix(accepted, state["revealed_symptoms"], candidates, state["messages"][-1].content)
+    window, context_update = context_window().apply(state)
+    excerpt = context_update.get("excerpt", state.get("excerpt", ""))
+    summary = state.get("summary", "")
+    if (summary or excerpt) and len(window) < len(state["messages"]):
+        suffix += earlier_chat(summary, excerpt)
+    system = system_message(system_prefix(state["patient_condition"]), suffix, cache=PROMPT_CACHE)
+    return [system] + window, context_update
+
+
+def prepare(state: PatientState) -> Tuple[list, dict, bool, list]:
+    # The deterministic checks run before the call: whether the message
+    # would be an accepted prescription, and which symptoms may come out.
+    accepted = treatment_analysis({**state, "convo_stage": "treatment_prescription"})["accepted"]
+    _, ordered = disclosure_order(state, state["messages"][-1].content)
+    candidates = ordered[:2]
+    prompt, context_update = fused_prompt(state, accepted, candidates)
+    return prompt, context_update, accepted, candidates
+
+
+def answer_updates(state: PatientState, text: str, accepted: bool, candidates: list) -> dict:
+    doc_message = state["messages"][-1].content
+    answer = parse_answer(text)
+    if answer is None:
+        FUSED_TURNS.inc(result="fallback")
+        reply, _ = reply_prefix(text)
+        answer = {"intent": known_intent(doc_message), "reply": reply or text.strip(), "disclosed": []}
+    else:
+        FUSED_TURNS.inc(result="parsed")
+
+    stage = answer.get("intent")
+    if stage in INTENTS:
+        INTENT_CLASSIFICATIONS.inc(source="fused")
+        remember_intent(doc_message, stage)
+    else:
+        stage = DEFAULT_STAGE
+    disclosed = answer.get("disclosed") or []
+    revealed = [item for item in candidates if item in disclosed]
+    return {
+        "convo_stage": stage,
+        "accepted": accepted and stage == "treatment_prescription",
+        "revealed_symptoms": revealed,
+        "messages": [AIMessage(content=answer["reply"])],
+    }
+
+
+def fused_turn(state: PatientState) -> dict:
+    if not isinstance(state["messages"][-1], HumanMessage):
+        return {}
+    prompt, context_update, accepted, candidates = prepare(state)
+    response = model_scheduler().invoke(routed(get_model("patient"), "fused_turn"), prompt, "patient")
+    record_usage(response)
+    return {**answer_updates(state, message_text(response), accepted, candidates), **context_update}
+
+
+async def afused_turn(state: PatientState) -> dict:
+    if not isinstance(state["messages"][-1], HumanMessage):
+        return {}
+    prompt, context_update, accepted, candidates = prepare(state)
+    write = get_stream_writer()
+    stream = ReplyStream()
+    response = None
+    # Raw JSON tokens stay off the messages stream; the reply is written out as it decodes.
+    model = routed(get_model("patient"), "fused_turn")
+    async for chunk in model_scheduler().astream(model, prompt, "patient", {"tags": [TAG_NOSTREAM]}):
+        response = chunk if response is None else response + chunk
+        delta = stream.feed(message_text(chunk))
+        if delta:
+            write({"delta": delta})
+    record_usage(response)
+    updates = answer_updates(state, message_text(response) if response else "", accepted, candidates)
+    rest = updates["messages"][0].content[stream.sent:]
+    if rest:
+        write({"delta": rest})
+    return {**updates, **context_update}
@@ -0,0 +1,97 @@
+import time
+from typing import Any, Callable, Dict, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import RunnableLambda
+
+from .metrics import counter, histogram
+from .profiler import mark_node, profiled_turn
+
+NODE_SECONDS = histogram(
+    "patbot_node_seconds",
+    "Wall time spent in each patient graph node.",
+    ("node", "stage", "condition"),
+)
+LLM_CALL_SECONDS = histogram(
+    "patbot_llm_call_seconds",
+    "Latency of each chat model call, by the graph node that made it.",
+    ("node",),
+)
+LLM_TOKENS = counter(
+    "patbot_llm_tokens_total",
+    "Chat model tokens, by graph node and direction (input/output).",
+    ("node", "direction"),
+)
+TURN_TOKENS = histogram(
+    "patbot_turn_tokens",
+    "Chat model tokens consumed by one patient turn, by direction.",
+    ("direction", "stage", "condition"),
+    buckets=(0, 50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000),
+)
+
+
+def _observe(node: str, state: dict, result: Optional[dict], start: float):
+    stage = (result or {}).get("convo_stage") or state.get("convo_stage", "")
+    NODE_SECONDS.observe(
+        time.perf_counter() - start, node=node, stage=stage, condition=state.get("patient_condition", "")
+    )
+
+
+def timed_node(node: str, func: Callable, afunc: Optional[Callable] = None) -> RunnableLambda:
+    # `profile` is read by the sampler to attribute stacks to this node.
+    def run(state: dict) -> dict:
+        start = time.perf_counter()
+        profile = profiled_turn.get()
+        result = None
+        try:
+            result = func(state)
+            return result
+        finally:
+            _observe(node, state, result, start)
+
+    async def arun(state: dict) -> dict:
+        start = time.perf_counter()
+        profile = profiled_turn.get()
+        result = None
+        try:
+            result = await afunc(state) if afunc is not None else func(state)
+            return result
+        finally:
+            _observe(node, state, result, start)
+
+    mark_node(run, arun)
+    return RunnableLambda(run, afunc=arun, name=node)
+
+
+class TurnUsage(BaseCallbackHandler):
+    # Passed as a callback for one graph run: times every chat model call
+    # and adds up the token usage Anthropic reports for the turn.
+    run_inline = True
+
+    def __init__(self):
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self._calls: Dict[Any, tuple] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        self._calls[run_id] = ((metadata or {}).get("langgraph_node", ""), time.perf_counter())
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        node, start = self._calls.pop(run_id, ("", time.perf_counter()))
+        LLM_CALL_SECONDS.observe(time.perf_counter() - start, node=node)
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if not usage:
+                    continue
+                self.input_tokens += usage.get("input_tokens", 0)
+                self.output_tokens += usage.get("output_tokens", 0)
+                LLM_TOKENS.inc(usage.get("input_tokens", 0), node=node, direction="input")
+                LLM_TOKENS.inc(usage.get("output_tokens", 0), node=node, direction="output")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._calls.pop(run_id, None)
+
+    def record(self, stage: str, condition: str):
+        TURN_TOKENS.observe(self.input_tokens, direction="input", stage=stage, condition=condition)
+        TURN_TOKENS.observe(self.output_tokens, direction="output", stage=stage, condition=condition)
@@ -0,0 +1,121 @@
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from .catalogue import catalogue
+from .diagnosis import DOC_KEYWORDS
+
+NEGATIONS = {
+    "no", "not", "don't", "dont", "do not", "never", "avoid", "without", "stop",
+    "won't", "wont", "wouldn't", "can't", "cant", "cannot", "shouldn't", "mustn't",
+    "needn't", "isn't", "aren't", "doesn't", "didn't", "instead of", "rather than",
+    "skip", "none", "no need", "unnecessary",
+}
+# Cues that negate the keyword before them: "rest won't help", "antibiotics
+# are not needed".
+TRAILING_NEGATIONS = {
+    "not", "never", "won't", "wont", "wouldn't", "can't", "cant", "cannot", "shouldn't",
+    "isn't", "aren't", "doesn't", "don't", "unnecessary", "unneeded",
+}
+
+# A negation cue only applies to keywords in the same clause, within a few words.
+NEGATION_WINDOW = 3
+_CLAUSE_BREAK = re.compile(r"[.;:!?,]|\bbut\b|\bjust\b|\bonly\b|\band\b")
+_WORD = re.compile(r"[a-z']+")
+
+
+class Hit(NamedTuple):
+    term: str
+    label: str
+    start: int
+    negated: bool
+
+
+def _trie(terms: Iterable[str]) -> dict:
+    root: dict = {}
+    for term in terms:
+        node = root
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[""] = True
+    return root
+
+
+def _trie_pattern(node: dict) -> str:
+    # Factors shared prefixes so the regex engine follows one branch per
+    # character instead of retrying every keyword at every position.
+    branches = [re.escape(ch) + _trie_pattern(child) for ch, child in sorted(node.items()) if ch]
+    if not branches:
+        return ""
+    optional = "" in node
+    if len(branches) == 1 and not optional:
+        return branches[0]
+    return "(?:" + "|".join(branches) + ")" + ("?" if optional else "")
+
+
+def _negated(text: str, start: int, end: int) -> bool:
+    clause = _CLAUSE_BREAK.split(text[max(0, start - 60):start])[-1]
+    words = _WORD.findall(clause)[-NEGATION_WINDOW - 1:]
+    if any(word in NEGATIONS for word in words[-NEGATION_WINDOW:]):
+        return True
+    if any(f"{a} {b}" in NEGATIONS for a, b in zip(words, words[1:])):
+        return True
+    after = _WORD.findall(_CLAUSE_BREAK.split(text[end:end + 60])[0])[:NEGATION_WINDOW]
+    return any(word in TRAILING_NEGATIONS for word in after)
+
+
+class KeywordMatcher:
+    # Finds every keyword in one pass over the text with a single compiled,
+    # prefix-factored, word-boundary pattern. Plural "s"/"es" endings match too.
+    def __init__(self, terms: Dict[str, str]):
+        self.terms = {term.lower(): label for term, label in terms.items()}
+        body = _trie_pattern(_trie(self.terms)) if self.terms else "(?!)"
+        self.pattern = re.compile(rf"(?<![\w'])(?P<term>{body})(?:e?s)?(?![\w'])", re.IGNORECASE)
+
+    def scan(self, text: str) -> List[Hit]:
+        lowered = text.lower()
+        return [
+            Hit(m.group("term").lower(), self.terms[m.group("term").lower()], m.start(),
+                _negated(lowered, m.start(), m.end()))
+            for m in self.pattern.finditer(text)
+        ]
+
+    def labels(self, text: str) -> set:
+        return {self.terms[m.group("term").lower()] for m in self.pattern.finditer(text)}
+
+    def search(self, text: str) -> bool:
+        return self.pattern.search(text) is not None
+
+
+def _with_synonyms(terms: List[str], label, synonyms: Dict[str, List[str]]) -> Dict[str, str]:
+    out = {}
+    for term in terms:
+        value = label if label is not None else term
+        out[term] = value
+        out.update({synonym: value for synonym in synonyms.get(term, [])})
+    return out
+
+
+@lru_cache(maxsize=1024)
+def treatment_matcher(condition: str) -> Optional[KeywordMatcher]:
+    details = catalogue().get(condition)
+    if details is None:
+        return None
+    terms = _with_synonyms(details.rejected, "rejected", details.synonyms)
+    # A keyword listed under both keeps the old precedence: accepted wins.
+    terms.update(_with_synonyms(details.accepted, "accepted", details.synonyms))
+    return KeywordMatcher(terms)
+
+
+@lru_cache(maxsize=1024)
+def symptom_matcher(condition: str) -> Optional[KeywordMatcher]:
+    # Labels each hit with the canonical symptom, so synonyms resolve to it.
+    details = catalogue().get(condition)
+    if details is None:
+        return None
+    return KeywordMatcher(_with_synonyms(details.symptoms, None, details.synonyms))
+
+
+@lru_cache(maxsize=None)
+def doc_keyword_matcher() -> KeywordMatcher:
+    return KeywordMatcher({keyword: "symptom_inquiry" for keyword in DOC_KEYWORDS})
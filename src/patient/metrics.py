@@ -0,0 +1,151 @@
+import bisect
+import threading
+from typing import Dict, List, Tuple
+
+REGISTRY: list = []
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def total(self) -> float:
+        return sum(self._values.values())
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def samples(self) -> List[Tuple[str, tuple, float]]:
+        with self._lock:
+            return [
+                (self.name, tuple(zip(self.labelnames, key)), value)
+                for key, value in sorted(self._values.items())
+            ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Counter):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # Per-bucket (non-cumulative) counts, then sum and count.
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels) -> int:
+        series = self._values.get(self._key(labels))
+        return series[-1] if series else 0
+
+    def sum(self, **labels) -> float:
+        series = self._values.get(self._key(labels))
+        return series[-2] if series else 0.0
+
+    def total(self) -> float:
+        return sum(series[-1] for series in self._values.values())
+
+    def quantile(self, q: float, **labels) -> float:
+        # Upper bound of the bucket holding the q-th observation.
+        series = self._values.get(self._key(labels))
+        if not series or not series[-1]:
+            return 0.0
+        rank, seen = q * series[-1], 0
+        for bound, n in zip(self.buckets + (float("inf"),), series):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def samples(self) -> List[Tuple[str, tuple, float]]:
+        out = []
+        with self._lock:
+            for key, series in sorted(self._values.items()):
+                labels = tuple(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, n in zip(self.buckets + (float("inf"),), series):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    out.append((f"{self.name}_bucket", labels + (("le", le),), cumulative))
+                out.append((f"{self.name}_sum", labels, series[-2]))
+                out.append((f"{self.name}_count", labels, series[-1]))
+        return out
+
+
+def _register(cls, name: str, documentation: str, labelnames: Tuple[str, ...], **kwargs):
+    for metric in REGISTRY:
+        if metric.name == name:
+            return metric
+    metric = cls(name, documentation, labelnames, **kwargs)
+    REGISTRY.append(metric)
+    return metric
+
+
+def counter(name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+    return _register(Counter, name, documentation, labelnames)
+
+
+def gauge(name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+    return _register(Gauge, name, documentation, labelnames)
+
+
+def histogram(name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+              buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def render_prometheus() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{_format_labels(labels)} {value:g}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,73 @@
+import os
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+from langchain_core.language_models.chat_models import BaseChatModel
+
+ROLES = ("patient", "helper")
+
+ANTHROPIC_MODEL = "claude-haiku-4-5-20251001"
+
+
+def anthropic_model() -> BaseChatModel:
+    from .clients import pooled_chat_anthropic
+
+    # Every call goes through the ModelScheduler, which does the retrying;
+    # SDK retries on top would multiply the attempts and hold the slot.
+    return pooled_chat_anthropic()(
+        model=ANTHROPIC_MODEL,
+        api_key=os.getenv("ANTHROPIC_API_KEY"),
+        max_retries=0,
+    )
+
+
+def fake_model(role: str) -> BaseChatModel:
+    from .fake import FakeChatModel
+
+    return FakeChatModel.from_env(role)
+
+
+def default_factory(role: str) -> Callable[[], BaseChatModel]:
+    # PATBOT_MODEL_PROVIDER picks the backend: "anthropic" (default) or
+    # "fake" for offline benchmarking with patient.fake.FakeChatModel.
+    provider = os.getenv("PATBOT_MODEL_PROVIDER", "anthropic")
+    if provider == "anthropic":
+        return anthropic_model
+    if provider == "fake":
+        return lambda: fake_model(role)
+    raise ValueError(f"Unknown PATBOT_MODEL_PROVIDER: {provider}")
+
+
+FACTORIES: Dict[str, Callable[[], BaseChatModel]] = {}
+MODELS: Dict[str, BaseChatModel] = {}
+
+
+def get_model(role: str) -> BaseChatModel:
+    model = MODELS.get(role)
+    if model is None:
+        factory = FACTORIES.get(role) or default_factory(role)
+        model = MODELS[role] = factory()
+    return model
+
+
+def set_model(role: str, model: BaseChatModel):
+    MODELS[role] = model
+
+
+def set_factory(role: str, factory: Callable[[], BaseChatModel]):
+    FACTORIES[role] = factory
+    MODELS.pop(role, None)
+
+
+@contextmanager
+def use_models(**models: BaseChatModel):
+    previous = {role: MODELS.get(role) for role in models}
+    MODELS.update(models)
+    try:
+        yield
+    finally:
+        for role, model in previous.items():
+            if model is None:
+                MODELS.pop(role, None)
+            else:
+                MODELS[role] = model
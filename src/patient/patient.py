@@ -1,15 +1,168 @@
-from typing import List
-from langchain_core.messages import HumanMessage
-from .agent import init_condition, create_graph
+import time
+from typing import AsyncIterator, List
+from langchain_core.messages import AIMessageChunk, HumanMessage
+from .agent import shared_graph
+from .context import context_window
+from .instrumentation import TurnUsage
+from .metrics import histogram
+from .state import PatientState, SymptomSet, TurnLog, message_text
+
+TURN_TTFT = histogram(
+    "patbot_turn_ttft_seconds",
+    "Time from receiving a doctor message to the first streamed patient token.",
+    ("stage", "condition"),
+)
+TURN_SECONDS = histogram(
+    "patbot_turn_seconds",
+    "Time from receiving a doctor message to the complete patient reply.",
+    ("stage", "condition"),
+)
+
+class StateView(dict):
+    # patient.state as a dict, for callers that read or poke at single
+    # fields. Writes go through to the patient; "messages" is the live log.
+    def __init__(self, patient: "Patient"):
+        super().__init__(
+            messages=patient.log,
+            patient_condition=patient.condition,
+            revealed_symptoms=list(patient.symptoms.order),
+            all_symptoms=list(patient.symptoms.names),
+            convo_stage=patient.stage,
+            accepted=patient.accepted,
+            excerpt=patient.excerpt,
+            trimmed=patient.trimmed,
+            summary=patient.summary,
+        )
+        self.patient = patient
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        patient = self.patient
+        if key == "messages":
+            if value is not patient.log:
+                patient.log = TurnLog(value)
+        elif key == "revealed_symptoms":
+            patient.symptoms = SymptomSet(patient.symptoms.names, value)
+        elif key == "all_symptoms":
+            patient.symptoms = SymptomSet(value, patient.symptoms.order)
+        elif key == "convo_stage":
+            patient.stage = value
+        elif key == "accepted":
+            patient.accepted = value
+        elif key == "excerpt":
+            patient.excerpt = value
+        elif key == "trimmed":
+            patient.trimmed = value
+        elif key == "summary":
+            patient.summary = value
+
 
 class Patient:
+    # Holds the whole conversation in compact form. Each turn hands the
+    # graph only the messages the context window hasn't trimmed into the
+    # excerpt yet, and appends what comes back.
+    __slots__ = ("condition", "symptoms", "log", "stage", "accepted", "excerpt", "trimmed", "summary")
+
     def __init__(self, condition: str, true_symptoms: List[str]):
         self.condition = condition
-        self.state = init_condition(condition, true_symptoms)
-        self.graph = create_graph()
-    
+        self.symptoms = SymptomSet(true_symptoms)
+        self.log = TurnLog()
+        self.stage = "greeting"
+        self.accepted = False
+        self.excerpt = ""
+        self.trimmed = 0
+        self.summary = ""
+
+    @classmethod
+    def restore(cls, state: dict) -> "Patient":
+        patient = cls(state["patient_condition"], state["all_symptoms"])
+        patient.symptoms = SymptomSet(state["all_symptoms"], state["revealed_symptoms"])
+        patient.log = TurnLog(state["messages"])
+        patient.stage = state["convo_stage"]
+        patient.accepted = state["accepted"]
+        patient.excerpt = state.get("excerpt", "")
+        patient.trimmed = state.get("trimmed", 0)
+        patient.summary = state.get("summary", "")
+        return patient
+
+    @property
+    def state(self) -> StateView:
+        return StateView(self)
+
+    def snapshot(self) -> PatientState:
+        return {**StateView(self), "messages": list(self.log)}
+
+    @property
+    def graph(self):
+        return shared_graph()
+
+    def _input(self, message: str) -> PatientState:
+        self.log.append(HumanMessage(content=message))
+        return {
+            "messages": self.log[self.trimmed:],
+            "patient_condition": self.condition,
+            "revealed_symptoms": list(self.symptoms.order),
+            "all_symptoms": list(self.symptoms.names),
+            "convo_stage": self.stage,
+            "accepted": self.accepted,
+            "excerpt": self.excerpt,
+            "trimmed": 0,
+            "summary": self.summary,
+            "dropped": [],
+        }
+
+    def _apply(self, state: PatientState, result: PatientState):
+        self.log += result["messages"][len(state["messages"]):]
+        for name in result["revealed_symptoms"][len(state["revealed_symptoms"]):]:
+            self.symptoms.add(name)
+        self.stage = result["convo_stage"]
+        self.accepted = result["accepted"]
+        self.excerpt = result.get("excerpt", "")
+        self.trimmed += result.get("trimmed", 0)
+
     def doc_turn(self, message: str):
-        self.state["messages"].append(HumanMessage(content=message))
-        result = self.graph.invoke(self.state)
-        self.state = result
-        return result['messages'][-1].content
+        state = self._input(message)
+        result = self.graph.invoke(state)
+        self._apply(state, result)
+        self.summary = context_window().fold(self.summary, result.get("dropped", []))
+        return self.log.texts[-1]
+
+    async def astream_turn(self, message: str) -> AsyncIterator[str]:
+        start = time.perf_counter()
+        ttft = None
+        usage = TurnUsage()
+        state = self._input(message)
+        result = state
+
+        async for mode, chunk in self.graph.astream(state, {"callbacks": [usage]},
+                                                    stream_mode=["messages", "values", "custom"]):
+            if mode == "values":
+                result = chunk
+                continue
+            if mode == "custom":
+                # Speculative drafts are released through the stream writer once confirmed.
+                text = chunk.get("delta", "")
+            else:
+                token, metadata = chunk
+                if not isinstance(token, AIMessageChunk) or metadata.get("langgraph_node") != "generate_response":
+                    continue
+                text = message_text(token)
+            if text:
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                yield text
+
+        self._apply(state, result)
+        # After the last delta, so folding history into the summary never
+        # holds up the reply.
+        self.summary = await context_window().afold(self.summary, result.get("dropped", []))
+        stage = self.stage
+        if ttft is not None:
+            TURN_TTFT.observe(ttft, stage=stage, condition=self.condition)
+        TURN_SECONDS.observe(time.perf_counter() - start, stage=stage, condition=self.condition)
+        usage.record(stage, self.condition)
+
+    async def adoc_turn(self, message: str):
+        async for _ in self.astream_turn(message):
+            pass
+        return self.log.texts[-1]
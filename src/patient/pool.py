@@ -0,0 +1,66 @@
+import asyncio
+import random
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+from .catalogue import Condition, catalogue
+from .matcher import symptom_matcher, treatment_matcher
+from .metrics import counter, gauge
+from .patient import Patient
+
+POOL_TAKES = counter("patbot_patient_pool_takes_total", "Patients handed out by the pre-warmed pool.", ("result",))
+POOL_SIZE = gauge("patbot_patient_pool_size", "Ready patients waiting in the pre-warmed pool.")
+
+
+def build_patient(rng=random, specialty: Optional[str] = None,
+                  difficulty: Optional[int] = None, condition: Optional[str] = None) -> Tuple[Condition, Patient]:
+    details = catalogue().get(condition) if condition is not None else None
+    if details is None:
+        if condition is not None:
+            raise LookupError(f"Unknown condition: {condition}")
+        details = catalogue().sample(rng, specialty=specialty, difficulty=difficulty)
+    symptoms = details.symptoms[:rng.randint(4, 6)]
+    return details, Patient(details.name, symptoms)
+
+
+class PatientPool:
+    # Keeps `size` unfiltered patients ready so creation is a deque pop.
+    # Taking below the low-water mark wakes the background refiller, which
+    # also builds each condition's keyword matchers off the request path.
+    def __init__(self, size: int):
+        self.size = size
+        self.low_water = size // 2
+        self.ready: Deque[Tuple[Condition, Patient]] = deque()
+        self._wanted = asyncio.Event()
+
+    def take(self) -> Tuple[Condition, Patient]:
+        if self.ready:
+            POOL_TAKES.inc(result="hit")
+            entry = self.ready.popleft()
+        else:
+            POOL_TAKES.inc(result="miss")
+            entry = build_patient()
+        if len(self.ready) < self.low_water:
+            self._wanted.set()
+        POOL_SIZE.set(len(self.ready))
+        return entry
+
+    def fill(self, limit: Optional[int] = None) -> int:
+        added = 0
+        while len(self.ready) < self.size and (limit is None or added < limit):
+            details, patient = build_patient()
+            treatment_matcher(details.name)
+            symptom_matcher(details.name)
+            self.ready.append((details, patient))
+            added += 1
+        POOL_SIZE.set(len(self.ready))
+        return added
+
+    async def run_refiller(self, batch: int = 16):
+        self._wanted = asyncio.Event()
+        while True:
+            # Small batches keep the event loop responsive while refilling.
+            while self.fill(batch):
+                await asyncio.sleep(0)
+            self._wanted.clear()
+            await self._wanted.wait()
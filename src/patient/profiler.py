@@ -0,0 +1,276 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import suppress
+from contextvars import ContextVar
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, Optional
+
+from .metrics import counter
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SAMPLES = counter("patbot_profile_samples_total", "Stack samples taken by the profiler, by graph node.", ("node",))
+
+# The profile a turn's samples go to; graph nodes run in tasks and threads
+# that inherit it from the turn.
+profiled_turn: ContextVar[Optional["ProfileRun"]] = ContextVar("patbot_profiled_turn", default=None)
+
+# Code objects whose frames mark a graph node ("node" and "profile" locals)
+# or a whole turn ("run" local).
+NODE_CODES = set()
+TURN_CODES = set()
+
+MAX_DEPTH = 128
+DEFAULT_SECONDS = 60.0
+MAX_SECONDS = 600.0
+
+# Reported with every run: the sampler's cost isn't limited to profiled turns.
+OVERHEAD = (
+    "The interpreter switch interval is lowered for the whole process while a run "
+    "is active, so every turn on this worker is slower, profiled or not "
+    "(+2.7% to +6% in bench/profiler_overhead.py)."
+)
+
+
+def mark_node(*funcs: Callable):
+    NODE_CODES.update(func.__code__ for func in funcs)
+
+
+@lru_cache(maxsize=16384)
+def frame_name(code) -> str:
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class ProfileRun:
+    # One profiling window: turns matching patient_id/doctor_id (None for
+    # any) are sampled until `seconds` pass or `turns` turns have finished.
+    def __init__(self, run_id: str, seconds: Optional[float] = None, turns: Optional[int] = None,
+                 patient_id: Optional[str] = None, doctor_id: Optional[str] = None):
+        self.id = run_id
+        self.started = time.time()
+        self.deadline = time.monotonic() + seconds if seconds else None
+        self.turns_left = turns
+        self.patient_id = patient_id
+        self.doctor_id = doctor_id
+        self.active = 0
+        self.turns = 0
+        self.samples = 0
+        self.stopped = False
+        self.stacks: Dict[str, Counter] = {}
+        self.output: Optional[Path] = None
+        self.switch_interval: Optional[float] = None
+
+    def matches(self, patient_id: str, doctor_of: Callable[[], Optional[str]]) -> bool:
+        if self.patient_id is not None and self.patient_id != patient_id:
+            return False
+        return self.doctor_id is None or self.doctor_id == doctor_of()
+
+    def done(self) -> bool:
+        if self.stopped or (self.deadline is not None and time.monotonic() >= self.deadline):
+            return True
+        return self.turns_left == 0 and not self.active
+
+    def add(self, node: str, stack: str):
+        self.stacks.setdefault(node, Counter())[stack] += 1
+        self.samples += 1
+
+    def status(self) -> dict:
+        return {
+            "id": self.id,
+            "started": self.started,
+            "patient_id": self.patient_id,
+            "doctor_id": self.doctor_id,
+            "turns": self.turns,
+            "turns_left": self.turns_left,
+            "samples": self.samples,
+            "done": self.done(),
+            "output": str(self.output) if self.output else None,
+            "switch_interval": self.switch_interval,
+            "overhead": OVERHEAD,
+        }
+
+
+def collapsed(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def speedscope(run: ProfileRun, interval: float) -> dict:
+    frames, index = [], {}
+    profiles = []
+    for node, stacks in sorted(run.stacks.items()):
+        samples, weights = [], []
+        for stack, count in stacks.items():
+            sample = []
+            for name in stack.split(";"):
+                if name not in index:
+                    index[name] = len(frames)
+                    frames.append({"name": name})
+                sample.append(index[name])
+            samples.append(sample)
+            weights.append(count * interval * 1000)
+        profiles.append({
+            "type": "sampled",
+            "name": node,
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        })
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": f"patbot {run.id}",
+        "exporter": "patbot",
+        "shared": {"frames": frames},
+        "profiles": profiles,
+    }
+
+
+class Profiler:
+    # Sampling profiler for live turns. A daemon thread wakes every
+    # `interval` seconds while a run is active, walks the stacks of all
+    # threads and keeps those inside a profiled turn, keyed by the graph
+    # node they are in ("turn" for time outside nodes: LangGraph's own
+    # scheduling, streaming, callbacks). Only code holding the GIL shows
+    # up, so time spent waiting on the model isn't counted. With no run
+    # active nothing is sampled and turns aren't wrapped.
+    def __init__(self, directory: str = "profiles", interval: float = 0.005, max_seconds: float = MAX_SECONDS):
+        self.directory = Path(directory)
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.run: Optional[ProfileRun] = None
+        self.last: Optional[ProfileRun] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, seconds: Optional[float] = None, turns: Optional[int] = None,
+              patient_id: Optional[str] = None, doctor_id: Optional[str] = None) -> ProfileRun:
+        with self._lock:
+            if self.run is not None:
+                raise RuntimeError(f"Profile {self.run.id} is already running")
+            if seconds is None and turns is None:
+                seconds = DEFAULT_SECONDS
+            # Runs slow down the whole process, so even a turn-count run that
+            # never sees a matching turn ends after max_seconds.
+            seconds = min(seconds or self.max_seconds, self.max_seconds)
+            run_id = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            self.run = ProfileRun(run_id, seconds, turns, patient_id, doctor_id)
+            self._thread = threading.Thread(target=self._sample, args=(self.run,), daemon=True,
+                                            name="patbot-profiler")
+            self._thread.start()
+            return self.run
+
+    def stop(self) -> Optional[ProfileRun]:
+        run, thread = self.run, self._thread
+        if run is None:
+            return self.last
+        run.stopped = True
+        thread.join()
+        return run
+
+    def current(self) -> Optional[ProfileRun]:
+        return self.run or self.last
+
+    def claim(self, patient_id: str, doctor_of: Callable[[], Optional[str]]) -> Optional[ProfileRun]:
+        # The active run if it wants this turn; counts the turn against it.
+        run = self.run
+        if run is None or run.done() or not run.matches(patient_id, doctor_of):
+            return None
+        with self._lock:
+            if run.turns_left is not None:
+                if run.turns_left <= 0:
+                    return None
+                run.turns_left -= 1
+            run.active += 1
+            run.turns += 1
+        return run
+
+    async def profiled(self, run: ProfileRun, turn: AsyncIterator[str]) -> AsyncIterator[str]:
+        token = profiled_turn.set(run)
+        try:
+            async for delta in turn:
+                yield delta
+        finally:
+            # An abandoned generator is finalized outside the turn's context.
+            with suppress(ValueError):
+                profiled_turn.reset(token)
+            with self._lock:
+                run.active -= 1
+
+    def _sample(self, run: ProfileRun):
+        own = threading.get_ident()
+        # The sampler only runs when it gets the GIL. At the default 5ms
+        # switch interval a busy event loop keeps it until the next select(),
+        # so nearly every sample would land on an idle loop.
+        switch = sys.getswitchinterval()
+        run.switch_interval = min(switch, self.interval / 10)
+        sys.setswitchinterval(run.switch_interval)
+        try:
+            self._loop(run, own)
+        finally:
+            sys.setswitchinterval(switch)
+        self._finish(run)
+
+    def _loop(self, run: ProfileRun, own: int):
+        while not run.done():
+            time.sleep(self.interval)
+            if not run.active:
+                continue
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own:
+                    self._record(run, frame)
+
+    def _record(self, run: ProfileRun, frame):
+        codes = []
+        node = None
+        while frame is not None and len(codes) < MAX_DEPTH:
+            code = frame.f_code
+            codes.append(code)
+            if code in NODE_CODES:
+                if frame.f_locals.get("profile") is not run:
+                    return
+                node = frame.f_locals.get("node")
+                break
+            if code in TURN_CODES:
+                if frame.f_locals.get("run") is not run:
+                    return
+                node = "turn"
+                break
+            frame = frame.f_back
+        if node is None:
+            return
+        run.add(node, ";".join(frame_name(code) for code in reversed(codes)))
+        PROFILE_SAMPLES.inc(node=node)
+
+    def _finish(self, run: ProfileRun):
+        try:
+            output = self.directory / run.id
+            output.mkdir(parents=True, exist_ok=True)
+            for node, stacks in run.stacks.items():
+                (output / f"{node}.collapsed").write_text(collapsed(stacks))
+            (output / "profile.speedscope.json").write_text(json.dumps(speedscope(run, self.interval)))
+            run.output = output
+            logger.info("Profile %s: %d samples over %d turns written to %s", run.id, run.samples, run.turns, output)
+        except OSError as e:
+            logger.warning("Could not write profile %s: %s", run.id, e)
+        with self._lock:
+            self.run, self.last = None, run
+
+
+TURN_CODES.add(Profiler.profiled.__code__)
+
+
+@lru_cache(maxsize=None)
+def profiler() -> Profiler:
+    return Profiler(
+        directory=os.getenv("PATBOT_PROFILE_DIR", "profiles"),
+        interval=float(os.getenv("PATBOT_PROFILE_INTERVAL", "0.005")),
+        max_seconds=float(os.getenv("PATBOT_PROFILE_MAX_SECONDS", str(MAX_SECONDS))),
+    )
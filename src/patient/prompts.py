@@ -0,0 +1,124 @@
+from typing import List
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+# Everything that is identical across turns for a given condition goes into
+# the prefix, which is marked for Anthropic prompt caching. Per-turn text
+# (stage instructions, the doctor's message, earlier-chat summary) follows
+# in a separate, uncached block.
+PERSONA = (
+    "You are chatting online as a patient. Do not reveal or name your underlying condition: {condition}."
+)
+
+RULES = (
+    " Respond like a real person in a chat with their doctor."
+    " Keep replies brief and natural, and avoid stage directions or dramatized actions (no asterisks)."
+)
+
+STAGE_INSTRUCTIONS = {
+    "greeting": (
+        "The doctor said: {message}. "
+        "If the doctor greets you or engages in casual, non-medical small talk, reply in kind."
+        " Mention how you feel without listing specific symptoms yet."
+    ),
+    "general_question": (
+        "The doctor asked: {message}. "
+        "Answer as a real patient would and stay on-topic."
+    ),
+    "treatment_accepted": (
+        "The doctor prescribed: {message}. "
+        "Acknowledge and accept the treatment politely, keep it brief like a chat, and say goodbye."
+    ),
+    "treatment_rejected": (
+        "The doctor prescribed: {message}. "
+        "Politely decline and ask for an alternative in a concise chat response."
+    ),
+    "symptom_inquiry": (
+        "Respond naturally to the doctor's small talk or symptom inquiries in a concise chat style."
+    ),
+    "symptom_disclosure": (
+        "You can mention these symptoms only: {symptoms}."
+        " Share them naturally in a concise chat reply."
+    ),
+}
+
+
+def stage_key(stage: str, accepted: bool, symptoms: list) -> str:
+    if stage == "treatment_prescription":
+        return "treatment_accepted" if accepted else "treatment_rejected"
+    if stage == "symptom_inquiry" and symptoms:
+        return "symptom_disclosure"
+    return stage if stage in STAGE_INSTRUCTIONS else "general_question"
+
+
+def system_prefix(condition: str) -> str:
+    return PERSONA.format(condition=condition) + RULES
+
+
+def stage_suffix(stage: str, accepted: bool, symptoms: list, message: str) -> str:
+    template = STAGE_INSTRUCTIONS[stage_key(stage, accepted, symptoms)]
+    return template.format(message=message, symptoms=", ".join(symptoms))
+
+
+def system_message(prefix: str, suffix: str, cache: bool = True) -> SystemMessage:
+    head = {"type": "text", "text": prefix}
+    if cache:
+        head["cache_control"] = {"type": "ephemeral"}
+    return SystemMessage(content=[head, {"type": "text", "text": suffix}])
+
+
+FUSED_INSTRUCTIONS = (
+    "First decide the intent of the doctor's latest message: greeting (greetings and small talk),"
+    " symptom_inquiry (asking what is wrong or about symptoms), treatment_prescription (prescribing"
+    " or recommending a treatment) or general_question (anything else). Then reply as the patient:\n"
+    "- greeting: {greeting}\n"
+    "- symptom_inquiry: {symptom_inquiry}\n"
+    "- treatment_prescription: {treatment}\n"
+    "- general_question: {general_question}\n"
+    "Answer with only a JSON object, no other text:"
+    ' {{"intent": "<intent>", "disclosed": [<symptoms from the list above that you mention>],'
+    ' "reply": "<your reply>"}}'
+)
+
+
+def fused_suffix(accepted: bool, revealed: list, candidates: list, message: str) -> str:
+    # One prompt covering every stage, for a single call that returns the
+    # intent, the reply and the disclosed symptoms together.
+    if candidates:
+        inquiry = STAGE_INSTRUCTIONS["symptom_disclosure"].format(symptoms=", ".join(revealed + candidates))
+    else:
+        inquiry = STAGE_INSTRUCTIONS["symptom_inquiry"]
+    treatment = "treatment_accepted" if accepted else "treatment_rejected"
+    return FUSED_INSTRUCTIONS.format(
+        greeting=STAGE_INSTRUCTIONS["greeting"].format(message=message),
+        symptom_inquiry=inquiry,
+        treatment=STAGE_INSTRUCTIONS[treatment].format(message=message),
+        general_question=STAGE_INSTRUCTIONS["general_question"].format(message=message),
+    )
+
+
+def earlier_chat(summary: str, excerpt: str) -> str:
+    # What the context window no longer sends verbatim: a summary of the
+    # oldest part of the chat, then shortened lines from the part after it.
+    parts = []
+    if summary:
+        parts.append(f"Earlier in this chat (summary):\n{summary}")
+    if excerpt:
+        parts.append(f"{'Then' if summary else 'Earlier in this chat'} (shortened):\n{excerpt}")
+    return "\n\n" + "\n\n".join(parts) if parts else ""
+
+
+SUMMARY_INSTRUCTIONS = (
+    "You keep short notes on a chat between a doctor and a patient, written from the patient's side."
+    " Fold the new lines into the notes. Keep what the doctor asked or advised, which symptoms and"
+    " details the patient has already shared, and any treatment that was offered or declined."
+    " Use plain sentences, at most {words} words, and answer with the notes only."
+)
+
+
+def summary_prompt(summary: str, lines: List[str], words: int) -> list:
+    notes = summary or "(none yet)"
+    return [
+        SystemMessage(SUMMARY_INSTRUCTIONS.format(words=words)),
+        HumanMessage(f"Notes so far:\n{notes}\n\nNew lines:\n" + "\n".join(lines)),
+    ]
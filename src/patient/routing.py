@@ -0,0 +1,138 @@
+import json
+import os
+import time
+from functools import lru_cache
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.runnables import Runnable
+from langchain_core.runnables.config import ensure_config, merge_configs
+
+from .metrics import counter, histogram
+
+ROUTE_SECONDS = histogram("patbot_route_seconds", "Latency of each chat model call, by route.", ("route",))
+ROUTE_TOKENS = counter(
+    "patbot_route_tokens_total",
+    "Chat model tokens, by route and direction (input/output).",
+    ("route", "direction"),
+)
+
+# Keys are "<node>:<stage>", "<node>", "*:<stage>" or "*", most specific
+# first. Stages are the convo_stage a reply is written for; the intent
+# classifier and the fused turn run before the stage is known. The API
+# rejects whitespace-only stop sequences, so the intent label is bounded by
+# max_tokens and trimmed to its first line instead.
+DEFAULT_ROUTES: Dict[str, Dict[str, Any]] = {
+    "conversation_stage": {"max_tokens": 16, "temperature": 0.0},
+    "generate_response:greeting": {"max_tokens": 150},
+    "generate_response": {"max_tokens": 300},
+    "fused_turn": {"max_tokens": 400},
+    "summarise_history": {"max_tokens": 250, "temperature": 0.0},
+}
+FIELDS = ("model", "max_tokens", "temperature", "stop")
+
+
+class Route(NamedTuple):
+    name: str
+    model: Optional[str] = None
+    max_tokens: Optional[int] = None
+    temperature: Optional[float] = None
+    stop: Optional[Tuple[str, ...]] = None
+
+    def kwargs(self) -> Dict[str, Any]:
+        kwargs = {field: getattr(self, field) for field in FIELDS if getattr(self, field) is not None}
+        if self.stop is not None:
+            kwargs["stop"] = list(self.stop)
+        return kwargs
+
+
+class RouteUsage(BaseCallbackHandler):
+    # Attached to every call made on a route: its latency and token usage.
+    run_inline = True
+
+    def __init__(self, route: str):
+        self.route = route
+        self._calls: Dict[Any, float] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._calls[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start = self._calls.pop(run_id, None)
+        if start is not None:
+            ROUTE_SECONDS.observe(time.perf_counter() - start, route=self.route)
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    ROUTE_TOKENS.inc(usage.get("input_tokens", 0), route=self.route, direction="input")
+                    ROUTE_TOKENS.inc(usage.get("output_tokens", 0), route=self.route, direction="output")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._calls.pop(run_id, None)
+
+
+class RoutingTable:
+    # Picks the model name and generation settings for each model call by
+    # the graph node making it and the conversation stage, so a one-word
+    # intent label and a full reply aren't generated with the same limits.
+    def __init__(self, routes: Dict[str, Dict[str, Any]]):
+        self.routes: Dict[str, Route] = {}
+        for name, settings in routes.items():
+            unknown = set(settings) - set(FIELDS)
+            if unknown:
+                raise ValueError(f"Unknown settings for route {name}: {', '.join(sorted(unknown))}")
+            stop = settings.get("stop")
+            if stop is not None and any(not sequence.strip() for sequence in stop):
+                raise ValueError(f"Route {name} has a whitespace-only stop sequence, which the API rejects")
+            self.routes[name] = Route(name, **{**settings, "stop": tuple(stop) if stop is not None else None})
+        self.usage = {name: RouteUsage(name) for name in [*self.routes, "default"]}
+        self._resolved: Dict[Tuple[str, str], Route] = {}
+
+    @classmethod
+    def from_env(cls) -> "RoutingTable":
+        # PATBOT_ROUTES is a JSON object, or the path of a JSON file, whose
+        # entries are merged over DEFAULT_ROUTES field by field (a null
+        # field drops the default); PATBOT_ROUTE_DEFAULTS=0 starts empty.
+        spec = os.getenv("PATBOT_ROUTES", "").strip()
+        overrides = {}
+        if spec:
+            if spec.startswith("{"):
+                overrides = json.loads(spec)
+            else:
+                with open(spec) as f:
+                    overrides = json.load(f)
+        routes = dict(DEFAULT_ROUTES) if os.getenv("PATBOT_ROUTE_DEFAULTS", "1") != "0" else {}
+        for name, settings in overrides.items():
+            merged = {**routes.get(name, {}), **settings}
+            routes[name] = {field: value for field, value in merged.items() if value is not None}
+        return cls(routes)
+
+    def route(self, node: str, stage: str = "") -> Route:
+        key = (node, stage)
+        route = self._resolved.get(key)
+        if route is None:
+            candidates = [f"{node}:{stage}", node, f"*:{stage}", "*"] if stage else [node, "*"]
+            route = next((self.routes[name] for name in candidates if name in self.routes), Route("default"))
+            # Stages come from the classifier's output; don't let odd ones grow the cache.
+            if len(self._resolved) < 1024:
+                self._resolved[key] = route
+        return route
+
+    def bind(self, model: BaseChatModel, node: str, stage: str = "") -> Runnable:
+        # A config bound to a runnable replaces the one inherited from the
+        # graph node, so the route's handler is added to the node's own
+        # callbacks rather than bound on its own.
+        route = self.route(node, stage)
+        config = merge_configs(ensure_config(), {"callbacks": [self.usage[route.name]]})
+        return model.bind(**route.kwargs()).with_config(config)
+
+
+@lru_cache(maxsize=None)
+def routing_table() -> RoutingTable:
+    return RoutingTable.from_env()
+
+
+def routed(model: BaseChatModel, node: str, stage: str = "") -> Runnable:
+    return routing_table().bind(model, node, stage)
@@ -0,0 +1,233 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import AsyncIterator, Callable, Deque, Dict, Optional
+
+from .metrics import counter, gauge, histogram
+
+MODEL_QUEUE_SECONDS = histogram(
+    "patbot_model_queue_seconds",
+    "Time a model call waited for a concurrency slot and a rate-limit token.",
+    ("role",),
+)
+MODEL_IN_FLIGHT = gauge("patbot_model_in_flight", "Model calls currently holding a concurrency slot.")
+MODEL_RETRIES = counter("patbot_model_retries_total", "Model calls retried after a transient error.", ("role",))
+MODEL_REJECTED = counter("patbot_model_rejected_total", "Model calls refused because the queue was full.")
+
+# The doctor a model call is made for; calls are queued fairly across keys.
+scheduling_key: ContextVar[str] = ContextVar("patbot_scheduling_key", default="")
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+RETRYABLE_ERRORS = {"APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError", "OverloadedError"}
+
+
+class ModelOverloaded(Exception):
+    pass
+
+
+def is_retryable(error: BaseException) -> bool:
+    if getattr(error, "status_code", None) in RETRYABLE_STATUS:
+        return True
+    return any(cls.__name__ in RETRYABLE_ERRORS for cls in type(error).__mro__)
+
+
+class TokenBucket:
+    # `rate` calls per second with bursts of up to `burst`. Tokens are
+    # reserved up front, so concurrent callers get staggered start times.
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class _Waiter:
+    # A queued call; `wake` hands it the slot from whichever thread releases it.
+    __slots__ = ("wake", "granted")
+
+    def __init__(self, wake: Callable[[], None]):
+        self.wake = wake
+        self.granted = False
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class ModelScheduler:
+    # Shared gate in front of every chat model call: at most `limit` calls in
+    # flight, waiting calls served round-robin by scheduling_key so one busy
+    # doctor cannot starve the rest, a token bucket for the provider's rate
+    # limit, and retries with full-jitter exponential backoff. Calls from the
+    # sync graph path (worker threads) and the event loop share the same
+    # slots and queue.
+    def __init__(self, limit: int = 32, rate: float = 0.0, burst: float = 0.0, retries: int = 3,
+                 backoff: float = 0.5, max_backoff: float = 8.0, max_queue: int = 1000):
+        self.limit = limit
+        self.bucket = TokenBucket(rate, burst or max(1.0, rate))
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_queue = max_queue
+        self.active = 0
+        self.queued = 0
+        self.waiting: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _enqueue(self, key: str, wake: Callable[[], None]) -> Optional[_Waiter]:
+        # None when a slot is free; the caller then holds it.
+        with self._lock:
+            if self.active < self.limit and not self.queued:
+                self.active += 1
+                return None
+            if self.queued >= self.max_queue:
+                MODEL_REJECTED.inc()
+                raise ModelOverloaded("Too many model calls are waiting; try again shortly")
+            waiter = _Waiter(wake)
+            self.waiting.setdefault(key, deque()).append(waiter)
+            self.queued += 1
+            return waiter
+
+    async def _acquire(self, key: str):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = self._enqueue(key, lambda: loop.call_soon_threadsafe(_resolve, future))
+        if waiter is None:
+            return
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    queue = self.waiting[key]
+                    queue.remove(waiter)
+                    self.queued -= 1
+                    if not queue:
+                        del self.waiting[key]
+            if granted:
+                self._release()
+            raise
+
+    def _acquire_sync(self, key: str):
+        woken = threading.Event()
+        if self._enqueue(key, woken.set) is not None:
+            woken.wait()
+
+    def _release(self):
+        # Hands the slot straight to the next key in turn.
+        with self._lock:
+            if not self.waiting:
+                self.active -= 1
+                return
+            key, queue = next(iter(self.waiting.items()))
+            waiter = queue.popleft()
+            self.queued -= 1
+            if queue:
+                self.waiting.move_to_end(key)
+            else:
+                del self.waiting[key]
+            waiter.granted = True
+        waiter.wake()
+
+    @asynccontextmanager
+    async def slot(self, role: str):
+        start = time.perf_counter()
+        await self._acquire(scheduling_key.get())
+        try:
+            delay = self.bucket.reserve()
+            if delay:
+                await asyncio.sleep(delay)
+            MODEL_QUEUE_SECONDS.observe(time.perf_counter() - start, role=role)
+            MODEL_IN_FLIGHT.set(self.active)
+            yield
+        finally:
+            self._release()
+            MODEL_IN_FLIGHT.set(self.active)
+
+    @contextmanager
+    def sync_slot(self, role: str):
+        start = time.perf_counter()
+        self._acquire_sync(scheduling_key.get())
+        try:
+            delay = self.bucket.reserve()
+            if delay:
+                time.sleep(delay)
+            MODEL_QUEUE_SECONDS.observe(time.perf_counter() - start, role=role)
+            MODEL_IN_FLIGHT.set(self.active)
+            yield
+        finally:
+            self._release()
+            MODEL_IN_FLIGHT.set(self.active)
+
+    def _delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    async def ainvoke(self, model, prompt, role: str, config: Dict = None):
+        for attempt in range(self.retries + 1):
+            try:
+                async with self.slot(role):
+                    return await model.ainvoke(prompt, config)
+            except Exception as e:
+                if attempt == self.retries or not is_retryable(e):
+                    raise
+                MODEL_RETRIES.inc(role=role)
+            await asyncio.sleep(self._delay(attempt))
+
+    async def astream(self, model, prompt, role: str, config: Dict = None) -> AsyncIterator:
+        # Only retried before the first chunk; a half-streamed reply can't be taken back.
+        for attempt in range(self.retries + 1):
+            started = False
+            try:
+                async with self.slot(role):
+                    async for chunk in model.astream(prompt, config):
+                        started = True
+                        yield chunk
+                return
+            except Exception as e:
+                if started or attempt == self.retries or not is_retryable(e):
+                    raise
+                MODEL_RETRIES.inc(role=role)
+            await asyncio.sleep(self._delay(attempt))
+
+    def invoke(self, model, prompt, role: str, config: Dict = None):
+        for attempt in range(self.retries + 1):
+            try:
+                with self.sync_slot(role):
+                    return model.invoke(prompt, config)
+            except Exception as e:
+                if attempt == self.retries or not is_retryable(e):
+                    raise
+                MODEL_RETRIES.inc(role=role)
+            time.sleep(self._delay(attempt))
+
+
+@lru_cache(maxsize=None)
+def model_scheduler() -> ModelScheduler:
+    rate = float(os.getenv("PATBOT_MODEL_RATE", "0"))
+    return ModelScheduler(
+        limit=int(os.getenv("PATBOT_MODEL_CONCURRENCY", "32")),
+        rate=rate,
+        burst=float(os.getenv("PATBOT_MODEL_BURST", "0")),
+        retries=int(os.getenv("PATBOT_MODEL_RETRIES", "3")),
+        backoff=float(os.getenv("PATBOT_MODEL_BACKOFF", "0.5")),
+        max_queue=int(os.getenv("PATBOT_MODEL_QUEUE", "1000")),
+    )
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+from collections import Counter as TermCounter
+from typing import Dict
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.config import get_stream_writer
+from langgraph.constants import TAG_NOSTREAM
+
+from .agent import (
+    DEFAULT_STAGE, disclosed_symptoms, intent_classifier, intent_prompt, model_intent, node_router,
+    patient_prompt, record_usage, treatment_analysis,
+)
+from .classifier import default_classifier, known_intent
+from .metrics import counter
+from .models import get_model
+from .routing import routed
+from .scheduler import model_scheduler
+from .state import PatientState, message_text
+
+logger = logging.getLogger(__name__)
+
+SPECULATIONS = counter(
+    "patbot_speculations_total",
+    "Patient replies drafted before the stage was known, by whether the predicted stage was right.",
+    ("result",),
+)
+
+
+class StagePredictor:
+    # Guesses the stage of the next doctor message: the local classifier's
+    # best label when one is configured, otherwise the most frequent stage
+    # seen after the current one.
+    def __init__(self):
+        self.transitions: Dict[str, TermCounter] = {}
+
+    def predict(self, previous: str, message: str) -> str:
+        local = default_classifier().local
+        if local is not None and local.priors:
+            proba = local.predict_proba(message)
+            return max(proba, key=proba.get)
+        seen = self.transitions.get(previous)
+        return seen.most_common(1)[0][0] if seen else DEFAULT_STAGE
+
+    def observe(self, previous: str, stage: str):
+        self.transitions.setdefault(previous, TermCounter())[stage] += 1
+
+
+predictor = StagePredictor()
+
+
+def stage_updates(state: PatientState) -> dict:
+    if state["convo_stage"] == "treatment_prescription":
+        return treatment_analysis(state)
+    if state["convo_stage"] == "symptom_inquiry":
+        return disclosed_symptoms(state)
+    return {}
+
+
+def with_updates(state: PatientState, updates: dict) -> PatientState:
+    # revealed_symptoms is an additive channel; mirror the graph's reducer.
+    merged = {**state, **updates}
+    merged["revealed_symptoms"] = state["revealed_symptoms"] + updates.get("revealed_symptoms", [])
+    return merged
+
+
+async def classify(doc_message: str) -> str:
+    stage = known_intent(doc_message)
+    if stage is None:
+        label = (await model_scheduler().ainvoke(routed(get_model("helper"), "conversation_stage"), intent_prompt(doc_message), "helper")).content.strip()
+        stage = model_intent(doc_message, label)
+    return stage
+
+
+async def draft(prompt: list, stage: str, chunks: asyncio.Queue):
+    # Tagged nostream so no token reaches the doctor before the guess is confirmed.
+    try:
+        model = routed(get_model("patient"), "generate_response", stage)
+        async for chunk in model_scheduler().astream(model, prompt, "patient", {"tags": [TAG_NOSTREAM]}):
+            await chunks.put(chunk)
+    finally:
+        await chunks.put(None)
+
+
+def speculative_stage(state: PatientState) -> dict:
+    # Speculation needs concurrency; the sync path classifies as usual.
+    return intent_classifier(state)
+
+
+async def aspeculative_stage(state: PatientState) -> dict:
+    if not isinstance(state["messages"][-1], HumanMessage):
+        return {}
+    doc_message = state["messages"][-1].content
+    previous = state["convo_stage"]
+    guess = predictor.predict(previous, doc_message)
+
+    guessed = {**state, "convo_stage": guess}
+    updates = stage_updates(guessed)
+    prompt, context_update = patient_prompt(with_updates(guessed, updates))
+    chunks: asyncio.Queue = asyncio.Queue()
+    drafting = asyncio.create_task(draft(prompt, guess, chunks))
+
+    try:
+        stage = await classify(doc_message)
+    except BaseException:
+        drafting.cancel()
+        raise
+    predictor.observe(previous, stage)
+
+    if stage != guess:
+        SPECULATIONS.inc(result="miss")
+        drafting.cancel()
+        # The draft is thrown away, so an error it hit before being cancelled
+        # mustn't fail the turn; the regenerated reply stands on its own.
+        await asyncio.wait({drafting})
+        if not drafting.cancelled() and drafting.exception() is not None:
+            logger.warning("Discarded speculative draft failed: %s", drafting.exception())
+        return {"convo_stage": stage}
+
+    SPECULATIONS.inc(result="hit")
+    write = get_stream_writer()
+    response = None
+    while (chunk := await chunks.get()) is not None:
+        response = chunk if response is None else response + chunk
+        text = message_text(chunk)
+        if text:
+            write({"delta": text})
+    await drafting
+    record_usage(response)
+    content = message_text(response) if response else ""
+    return {"convo_stage": stage, **updates, "messages": [AIMessage(content=content)], **context_update}
+
+
+def speculation_router(state: PatientState) -> str:
+    # A confirmed draft already answered the doctor.
+    if isinstance(state["messages"][-1], AIMessage):
+        return "end"
+    return node_router(state)
+
+
+def speculation_hit_rate() -> float:
+    total = SPECULATIONS.total()
+    if not total:
+        return 0.0
+    return SPECULATIONS.value(result="hit") / total
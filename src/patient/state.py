@@ -1,5 +1,6 @@
-from typing import TypedDict, Annotated, List
-from langchain_core.messages import BaseMessage
+from functools import lru_cache
+from typing import TypedDict, Annotated, Dict, Iterable, Iterator, List, Tuple
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
 import operator
 
 class PatientState(TypedDict):
@@ -8,4 +9,91 @@ class PatientState(TypedDict):
     revealed_symptoms: Annotated[List[str], operator.add]
     all_symptoms: List[str]
     convo_stage: str
-    accepted: bool
\ No newline at end of file
+    accepted: bool
+    excerpt: str
+    trimmed: int
+    summary: str
+    # Excerpt lines the context window pushed out this turn, for the
+    # summary to absorb once the reply is out.
+    dropped: List[str]
+
+
+def message_text(message: BaseMessage) -> str:
+    # Anthropic replies and streamed chunks may carry a list of content blocks.
+    if isinstance(message.content, str):
+        return message.content
+    return "".join(b.get("text", "") if isinstance(b, dict) else str(b) for b in message.content)
+
+
+class TurnLog:
+    # Append-only conversation history kept as plain strings plus one byte
+    # per message for the speaker. LangChain message objects are only built
+    # for the slice a turn hands to the graph.
+    __slots__ = ("texts", "doctor")
+
+    def __init__(self, messages: Iterable[BaseMessage] = ()):
+        self.texts: List[str] = []
+        self.doctor = bytearray()
+        self.extend(messages)
+
+    def append(self, message: BaseMessage):
+        self.texts.append(message_text(message))
+        self.doctor.append(isinstance(message, HumanMessage))
+
+    def extend(self, messages: Iterable[BaseMessage]):
+        for message in messages:
+            self.append(message)
+
+    def __iadd__(self, messages: Iterable[BaseMessage]) -> "TurnLog":
+        self.extend(messages)
+        return self
+
+    def _message(self, i: int) -> BaseMessage:
+        return HumanMessage(content=self.texts[i]) if self.doctor[i] else AIMessage(content=self.texts[i])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._message(i) for i in range(*index.indices(len(self.texts)))]
+        return self._message(index)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __iter__(self) -> Iterator[BaseMessage]:
+        return (self._message(i) for i in range(len(self.texts)))
+
+    def __eq__(self, other) -> bool:
+        return list(self) == list(other)
+
+
+@lru_cache(maxsize=1024)
+def _bits(names: Tuple[str, ...]) -> Dict[str, int]:
+    return {name: 1 << i for i, name in enumerate(names)}
+
+
+class SymptomSet:
+    # A patient's symptoms with the revealed ones as a bitmask, plus the
+    # order they came out in for display and per-turn deltas.
+    __slots__ = ("names", "mask", "order")
+
+    def __init__(self, names: Iterable[str], revealed: Iterable[str] = ()):
+        self.names = tuple(names)
+        self.mask = 0
+        self.order: List[str] = []
+        for name in revealed:
+            self.add(name)
+
+    def add(self, name: str):
+        bit = _bits(self.names).get(name, 0)
+        if bit and not self.mask & bit:
+            self.mask |= bit
+            self.order.append(name)
+
+    def __contains__(self, name: str) -> bool:
+        return bool(self.mask & _bits(self.names).get(name, 0))
+
+    def remaining(self) -> List[str]:
+        return [name for i, name in enumerate(self.names) if not self.mask >> i & 1]
+
+    def __len__(self) -> int:
+        return len(self.order)
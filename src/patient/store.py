@@ -0,0 +1,282 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from .patient import Patient
+
+
+class SessionGone(LookupError):
+    # Raised by save() when the session was removed while a turn was running.
+    pass
+
+
+class SessionSummary(NamedTuple):
+    patient_id: str
+    condition: str
+    accepted: bool
+    revealed_symptoms: List[str]
+
+
+class SessionStore(ABC):
+    # Stores that do disk or network I/O set this so the server calls them
+    # from a worker thread instead of the event loop.
+    blocking = False
+
+    @abstractmethod
+    def add(self, patient_id: str, doctor_id: str, patient: Patient):
+        ...
+
+    @abstractmethod
+    def get(self, patient_id: str) -> Optional[Patient]:
+        ...
+
+    @abstractmethod
+    def save(self, patient_id: str, patient: Patient):
+        ...
+
+    @abstractmethod
+    def remove(self, patient_id: str):
+        ...
+
+    @abstractmethod
+    def doctor_of(self, patient_id: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def doctor_patients(self, doctor_id: str) -> List[str]:
+        ...
+
+    @abstractmethod
+    def summaries(self, doctor_id: str) -> List[SessionSummary]:
+        # A doctor's patients in creation order, without loading their state.
+        ...
+
+    @abstractmethod
+    def touch(self, patient_id: str):
+        ...
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    @abstractmethod
+    def idle_since(self, cutoff: float) -> List[str]:
+        ...
+
+    @abstractmethod
+    def least_recent(self, doctor_id: Optional[str] = None, exclude: Iterable[str] = ()) -> Optional[str]:
+        ...
+
+
+class InMemoryStore(SessionStore):
+    def __init__(self):
+        self.patients: Dict[str, Patient] = {}
+        self.doctor_patients_map: Dict[str, list] = {}
+        self.patient_to_doctor: Dict[str, str] = {}
+        # Least recently active first.
+        self.last_seen: "OrderedDict[str, float]" = OrderedDict()
+
+    def add(self, patient_id: str, doctor_id: str, patient: Patient):
+        self.patients[patient_id] = patient
+        self.last_seen[patient_id] = time.time()
+        self.doctor_patients_map.setdefault(doctor_id, []).append(patient_id)
+        self.patient_to_doctor[patient_id] = doctor_id
+
+    def get(self, patient_id: str) -> Optional[Patient]:
+        return self.patients.get(patient_id)
+
+    def save(self, patient_id: str, patient: Patient):
+        # Patients are held by reference; their state is already current.
+        if patient_id not in self.patients:
+            raise SessionGone(patient_id)
+        self.touch(patient_id)
+
+    def remove(self, patient_id: str):
+        self.patients.pop(patient_id, None)
+        self.last_seen.pop(patient_id, None)
+        doctor_id = self.patient_to_doctor.pop(patient_id, None)
+        if doctor_id in self.doctor_patients_map:
+            self.doctor_patients_map[doctor_id].remove(patient_id)
+            if not self.doctor_patients_map[doctor_id]:
+                del self.doctor_patients_map[doctor_id]
+
+    def doctor_of(self, patient_id: str) -> Optional[str]:
+        return self.patient_to_doctor.get(patient_id)
+
+    def doctor_patients(self, doctor_id: str) -> List[str]:
+        return list(self.doctor_patients_map.get(doctor_id, []))
+
+    def summaries(self, doctor_id: str) -> List[SessionSummary]:
+        summaries = []
+        for patient_id in self.doctor_patients_map.get(doctor_id, []):
+            state = self.patients[patient_id].state
+            summaries.append(SessionSummary(patient_id, state["patient_condition"], state.get("accepted", False),
+                                            list(state.get("revealed_symptoms", []))))
+        return summaries
+
+    def touch(self, patient_id: str):
+        if patient_id in self.last_seen:
+            self.last_seen[patient_id] = time.time()
+            self.last_seen.move_to_end(patient_id)
+
+    def count(self) -> int:
+        return len(self.patients)
+
+    def idle_since(self, cutoff: float) -> List[str]:
+        idle = []
+        for patient_id, seen in self.last_seen.items():
+            if seen >= cutoff:
+                break
+            idle.append(patient_id)
+        return idle
+
+    def least_recent(self, doctor_id: Optional[str] = None, exclude: Iterable[str] = ()) -> Optional[str]:
+        exclude = set(exclude)
+        for patient_id in self.last_seen:
+            if patient_id in exclude:
+                continue
+            if doctor_id is None or self.patient_to_doctor.get(patient_id) == doctor_id:
+                return patient_id
+        return None
+
+
+class SQLiteStore(SessionStore):
+    # Durable store shared by every worker that opens the same file. Each row
+    # holds the latest PatientState, encoded with LangGraph's checkpoint
+    # serializer, so any process can resume the consultation.
+    blocking = True
+
+    def __init__(self, path: str):
+        from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+        self.path = path
+        self.serde = JsonPlusSerializer()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " patient_id TEXT PRIMARY KEY,"
+            " doctor_id TEXT NOT NULL,"
+            " condition TEXT NOT NULL,"
+            " state_type TEXT NOT NULL,"
+            " state BLOB NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " accepted INTEGER NOT NULL DEFAULT 0,"
+            " revealed TEXT NOT NULL DEFAULT '[]')"
+        )
+        # Files written before the summary columns existed.
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(sessions)")}
+        if "accepted" not in columns:
+            self._conn.execute("ALTER TABLE sessions ADD COLUMN accepted INTEGER NOT NULL DEFAULT 0")
+        if "revealed" not in columns:
+            self._conn.execute("ALTER TABLE sessions ADD COLUMN revealed TEXT NOT NULL DEFAULT '[]'")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_doctor ON sessions (doctor_id, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated_at)")
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _update(self, sql: str, params: tuple = ()) -> int:
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount
+
+    @staticmethod
+    def _summary(patient: Patient) -> tuple:
+        # Kept next to the state so listing a doctor's patients reads no blobs.
+        state = patient.state
+        return int(state.get("accepted", False)), json.dumps(list(state.get("revealed_symptoms", [])))
+
+    def add(self, patient_id: str, doctor_id: str, patient: Patient):
+        state_type, state = self.serde.dumps_typed(patient.snapshot())
+        now = time.time()
+        self._execute(
+            "INSERT OR REPLACE INTO sessions (patient_id, doctor_id, condition, state_type, state,"
+            " created_at, updated_at, accepted, revealed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (patient_id, doctor_id, patient.condition, state_type, state, now, now, *self._summary(patient)),
+        )
+
+    def get(self, patient_id: str) -> Optional[Patient]:
+        rows = self._execute("SELECT state_type, state FROM sessions WHERE patient_id = ?", (patient_id,))
+        if not rows:
+            return None
+        return Patient.restore(self.serde.loads_typed((rows[0][0], rows[0][1])))
+
+    def save(self, patient_id: str, patient: Patient):
+        state_type, state = self.serde.dumps_typed(patient.snapshot())
+        updated = self._update(
+            "UPDATE sessions SET state_type = ?, state = ?, updated_at = ?, accepted = ?, revealed = ?"
+            " WHERE patient_id = ?",
+            (state_type, state, time.time(), *self._summary(patient), patient_id),
+        )
+        # Ended or evicted, possibly by another worker, while the turn ran.
+        if not updated:
+            raise SessionGone(patient_id)
+
+    def remove(self, patient_id: str):
+        self._execute("DELETE FROM sessions WHERE patient_id = ?", (patient_id,))
+
+    def doctor_of(self, patient_id: str) -> Optional[str]:
+        rows = self._execute("SELECT doctor_id FROM sessions WHERE patient_id = ?", (patient_id,))
+        return rows[0][0] if rows else None
+
+    def doctor_patients(self, doctor_id: str) -> List[str]:
+        rows = self._execute(
+            "SELECT patient_id FROM sessions WHERE doctor_id = ? ORDER BY created_at", (doctor_id,)
+        )
+        return [row[0] for row in rows]
+
+    def summaries(self, doctor_id: str) -> List[SessionSummary]:
+        rows = self._execute(
+            "SELECT patient_id, condition, accepted, revealed FROM sessions"
+            " WHERE doctor_id = ? ORDER BY created_at", (doctor_id,)
+        )
+        return [SessionSummary(pid, condition, bool(accepted), json.loads(revealed))
+                for pid, condition, accepted, revealed in rows]
+
+    def touch(self, patient_id: str):
+        self._execute("UPDATE sessions SET updated_at = ? WHERE patient_id = ?", (time.time(), patient_id))
+
+    def count(self) -> int:
+        return self._execute("SELECT COUNT(*) FROM sessions")[0][0]
+
+    def idle_since(self, cutoff: float) -> List[str]:
+        rows = self._execute("SELECT patient_id FROM sessions WHERE updated_at < ? ORDER BY updated_at", (cutoff,))
+        return [row[0] for row in rows]
+
+    def least_recent(self, doctor_id: Optional[str] = None, exclude: Iterable[str] = ()) -> Optional[str]:
+        exclude = list(exclude)
+        sql = "SELECT patient_id FROM sessions"
+        clauses, params = [], []
+        if doctor_id is not None:
+            clauses.append("doctor_id = ?")
+            params.append(doctor_id)
+        if exclude:
+            clauses.append(f"patient_id NOT IN ({', '.join('?' * len(exclude))})")
+            params += exclude
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        rows = self._execute(sql + " ORDER BY updated_at LIMIT 1", tuple(params))
+        return rows[0][0] if rows else None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def store_from_env() -> SessionStore:
+    # PATBOT_SESSION_STORE is "memory" (default) or "sqlite:<path>".
+    spec = os.getenv("PATBOT_SESSION_STORE", "memory")
+    if spec.startswith("sqlite:"):
+        return SQLiteStore(spec[len("sqlite:"):])
+    if spec != "memory":
+        raise ValueError(f"Unknown PATBOT_SESSION_STORE: {spec}")
+    return InMemoryStore()
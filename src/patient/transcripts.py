@@ -0,0 +1,160 @@
+import atexit
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import IO
+
+TRANSCRIPT_LOGGER = "patbot.transcript"
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+
+def _compress(source: str, target: str):
+    with open(source, "rb") as f_in, gzip.open(target, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+class TranscriptHandler(logging.Handler):
+    # Appends one JSON object per line to <directory>/<patient_id>.jsonl for
+    # records logged with a patient_id. A file is rotated to
+    # <patient_id>.<unix time>.jsonl[.gz] once it passes max_bytes or max_age.
+    def __init__(self, directory: str, max_bytes: int = 1 << 20, max_age: float = 86400,
+                 compress: bool = True, max_open: int = 128):
+        super().__init__()
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compress = compress
+        self.max_open = max_open
+        self._files: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def _path(self, patient_id: str) -> Path:
+        return self.directory / f"{Path(patient_id).name}.jsonl"
+
+    def _open(self, patient_id: str) -> IO[str]:
+        entry = self._files.get(patient_id)
+        if entry is not None:
+            self._files.move_to_end(patient_id)
+            return entry[0]
+        while len(self._files) >= self.max_open:
+            _, (stale, _) = self._files.popitem(last=False)
+            stale.close()
+        path = self._path(patient_id)
+        opened_at = path.stat().st_mtime if path.exists() else time.time()
+        f = open(path, "a", encoding="utf-8")
+        self._files[patient_id] = (f, opened_at)
+        return f
+
+    def _rotate(self, patient_id: str):
+        f, _ = self._files.pop(patient_id)
+        f.close()
+        path = self._path(patient_id)
+        stamp = int(time.time() * 1000)
+        # Two rotations within a millisecond would otherwise overwrite the first.
+        while True:
+            target = path.with_name(f"{path.stem}.{stamp}.jsonl")
+            if not target.exists() and not Path(f"{target}.gz").exists():
+                break
+            stamp += 1
+        os.replace(path, target)
+        if self.compress:
+            _compress(str(target), f"{target}.gz")
+
+    def emit(self, record: logging.LogRecord):
+        patient_id = getattr(record, "patient_id", None)
+        if patient_id is None:
+            return
+        try:
+            line = {
+                "ts": record.created,
+                "patient_id": patient_id,
+                "event": getattr(record, "event", record.getMessage()),
+                **getattr(record, "fields", {}),
+            }
+            f = self._open(patient_id)
+            f.write(json.dumps(line, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            _, opened_at = self._files[patient_id]
+            if f.tell() >= self.max_bytes or time.time() - opened_at >= self.max_age:
+                self._rotate(patient_id)
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        for f, _ in self._files.values():
+            f.close()
+        self._files.clear()
+        super().close()
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    # The stock QueueHandler formats the message on the calling thread;
+    # leave that to the listener and only capture traceback text here.
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def rotating_file_handler(path: str, max_bytes: int, backups: int, compress: bool) -> logging.Handler:
+    handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+    if compress:
+        handler.namer = lambda name: f"{name}.gz"
+        handler.rotator = _compress
+    return handler
+
+
+@lru_cache(maxsize=None)
+def setup_logging() -> logging.handlers.QueueListener:
+    # Request handlers only enqueue records; a listener thread does the
+    # formatting and file I/O, so logging never blocks the event loop.
+    compress = os.getenv("PATBOT_LOG_COMPRESS", "1") != "0"
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler()]
+    log_file = os.getenv("PATBOT_LOG_FILE", "conversations.log")
+    if log_file:
+        handlers.append(rotating_file_handler(
+            log_file,
+            int(os.getenv("PATBOT_LOG_MAX_BYTES", str(10 << 20))),
+            int(os.getenv("PATBOT_LOG_BACKUPS", "5")),
+            compress,
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    transcript_dir = os.getenv("PATBOT_TRANSCRIPT_DIR", "transcripts")
+    if transcript_dir:
+        handlers.append(TranscriptHandler(
+            transcript_dir,
+            int(os.getenv("PATBOT_TRANSCRIPT_MAX_BYTES", str(1 << 20))),
+            float(os.getenv("PATBOT_TRANSCRIPT_MAX_AGE", "86400")),
+            compress,
+        ))
+
+    records: queue.Queue = queue.Queue(-1)
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.addHandler(DeferredQueueHandler(records))
+    listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+_transcript = logging.getLogger(TRANSCRIPT_LOGGER)
+
+
+def transcript(patient_id: str, event: str, **fields):
+    # Message formatting is deferred to the listener thread.
+    _transcript.info("Patient %s - %s %s", patient_id, event, fields,
+                     extra={"patient_id": patient_id, "event": event, "fields": fields})
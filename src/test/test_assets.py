@@ -0,0 +1,65 @@
+import gzip
+import os
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from fastapi.testclient import TestClient
+
+from main import app
+from patient.assets import AssetCache, choose_encoding
+
+
+def test_frontend_is_compressed_and_revalidated():
+    client = TestClient(app)
+
+    page = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert page.status_code == 200
+    assert page.headers["content-encoding"] == "gzip"
+    assert page.headers["cache-control"] == "no-cache"
+    assert "<html" in page.text.lower()
+
+    etag = page.headers["etag"]
+    again = client.get("/", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+
+    since = client.get("/", headers={"If-Modified-Since": page.headers["last-modified"]})
+    assert since.status_code == 304
+
+
+def test_static_files_get_long_lived_cache_headers():
+    client = TestClient(app)
+
+    icon = client.get("/static/favicon.jpg", headers={"Accept-Encoding": "gzip, br"})
+    assert icon.status_code == 200
+    assert icon.headers["content-type"] == "image/jpeg"
+    assert "content-encoding" not in icon.headers
+    assert "max-age=" in icon.headers["cache-control"]
+
+    assert client.get("/static/missing.js").status_code == 404
+    assert client.get("/static/../main.py").status_code == 404
+
+
+def test_reload_picks_up_edits(tmp_path):
+    page = tmp_path / "frontend.html"
+    page.write_text("<html>" + "a" * 500 + "</html>")
+    assets = AssetCache(tmp_path, reload=True)
+    first = assets.get("frontend.html")
+    assert gzip.decompress(first.bodies["gzip"]) == page.read_bytes()
+
+    page.write_text("<html>" + "b" * 500 + "</html>")
+    os.utime(page, (first.mtime + 5, first.mtime + 5))
+    assert assets.get("frontend.html").etag != first.etag
+    assert assets.get("../frontend.html") is None
+
+
+def test_choose_encoding():
+    available = {"identity": b"", "gzip": b"", "br": b""}
+    assert choose_encoding("gzip, deflate, br", available) == "br"
+    assert choose_encoding("br;q=0, gzip", available) == "gzip"
+    assert choose_encoding("", available) == "identity"
+    assert choose_encoding("br", {"identity": b"", "gzip": b""}) == "identity"
@@ -0,0 +1,64 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from patient import models
+from patient.fake import FakeChatModel
+from patient.patient import Patient
+
+
+def test_adoc_turn(monkeypatch):
+    monkeypatch.setitem(models.MODELS, "helper", FakeChatModel(responses=["greeting", "symptom_inquiry"]))
+    monkeypatch.setitem(models.MODELS, "patient", FakeChatModel(responses=["Hi doctor.", "I have a runny nose."]))
+
+    patient = Patient("common cold", ["runny nose", "sore throat", "mild cough", "congestion"])
+
+    reply = asyncio.run(patient.adoc_turn("Hello"))
+    assert reply == "Hi doctor."
+    assert patient.state["convo_stage"] == "greeting"
+
+    reply = asyncio.run(patient.adoc_turn("How are you feeling?"))
+    assert reply == "I have a runny nose."
+    assert patient.state["convo_stage"] == "symptom_inquiry"
+    assert patient.state["revealed_symptoms"] == ["runny nose", "sore throat"]
+    assert len(patient.state["messages"]) == 4
+
+
+def test_adoc_turn_does_not_block_event_loop(monkeypatch):
+    monkeypatch.setitem(models.MODELS, "helper", FakeChatModel(responses=["general_question"], latency=0.2))
+    monkeypatch.setitem(models.MODELS, "patient", FakeChatModel(responses=["Okay."], latency=0.2))
+
+    patients = [Patient("fever", ["chills", "sweating"]) for _ in range(20)]
+
+    async def run():
+        await asyncio.gather(*(p.adoc_turn("Did you sleep well?") for p in patients))
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    elapsed = time.perf_counter() - start
+
+    # 20 turns of two 0.2s model calls each would take 8s if run back to back.
+    assert elapsed < 2
+    assert all(p.state["messages"][-1].content == "Okay." for p in patients)
+    assert all(len(p.state["messages"]) == 2 for p in patients)
+    assert all(p.graph is patients[0].graph for p in patients)
+
+
+def test_astream_turn_yields_tokens_before_final_state(monkeypatch):
+    monkeypatch.setitem(models.MODELS, "helper", FakeChatModel(responses=["general_question"]))
+    monkeypatch.setitem(models.MODELS, "patient", FakeChatModel(responses=["I slept badly last night."]))
+
+    patient = Patient("migraine", ["nausea"])
+
+    async def run():
+        return [delta async for delta in patient.astream_turn("Did you sleep well?")]
+
+    deltas = asyncio.run(run())
+    assert deltas == ["I ", "slept ", "badly ", "last ", "night."]
+    assert patient.state["messages"][-1].content == "I slept badly last night."
+    assert len(patient.state["messages"]) == 2
@@ -0,0 +1,60 @@
+import asyncio
+import random
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from patient import agent, classifier, models
+from patient.cache import CACHE_LOOKUPS, LRUCache, ResponseCache, normalize
+from patient.fake import FakeChatModel
+from patient.patient import Patient
+
+
+def test_lru_cache_evicts_by_size_and_age(monkeypatch):
+    cache = LRUCache("test", max_entries=2, ttl=10)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    now = [1000.0]
+    monkeypatch.setattr("patient.cache.time.monotonic", lambda: now[0])
+    cache.put("d", 4)
+    now[0] += 11
+    assert cache.get("d") is None
+
+
+def test_response_cache_collects_variants_before_serving():
+    cache = ResponseCache(max_entries=10, ttl=0, variants=2, rng=random.Random(0))
+    key = (normalize("Hello!"), "fever", "greeting", False, frozenset())
+    assert normalize("  HELLO, doctor!! ") == "hello doctor"
+
+    cache.add(key, "Hi doctor.")
+    assert cache.get(key) is None
+    cache.add(key, "Hello.")
+    assert {cache.get(key) for _ in range(20)} == {"Hi doctor.", "Hello."}
+
+
+def test_repeated_utterances_skip_the_models(monkeypatch):
+    responses, intents = ResponseCache(max_entries=100, ttl=0, variants=1), LRUCache("intent", 100, 0)
+    monkeypatch.setattr(agent, "response_cache", lambda: responses)
+    monkeypatch.setattr(classifier, "intent_cache", lambda: intents)
+    monkeypatch.setattr(classifier, "fast_intent", lambda message: None)
+    helper = FakeChatModel(responses=["general_question"])
+    model = FakeChatModel(responses=["I'm a teacher."])
+    monkeypatch.setitem(models.MODELS, "helper", helper)
+    monkeypatch.setitem(models.MODELS, "patient", model)
+    hits = CACHE_LOOKUPS.value(cache="response", result="hit")
+
+    for _ in range(3):
+        patient = Patient("fever", ["chills", "sweating"])
+        assert asyncio.run(patient.adoc_turn("What do you do for a living?")) == "I'm a teacher."
+
+    assert helper.calls == 1
+    assert model.calls == 1
+    assert CACHE_LOOKUPS.value(cache="response", result="hit") == hits + 2
@@ -0,0 +1,58 @@
+import random
+import sys
+from collections import Counter
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from fastapi.testclient import TestClient
+
+import main
+from patient.catalogue import AliasTable, SQLiteCatalogue, build_catalogue, builtin_conditions
+from patient.store import InMemoryStore
+
+
+def test_alias_table_follows_weights():
+    rng = random.Random(3)
+    table = AliasTable([1.0, 3.0, 0.0, 6.0])
+    counts = Counter(table.sample(rng) for _ in range(20000))
+
+    assert counts[2] == 0
+    assert abs(counts[1] / 20000 - 0.3) < 0.02
+    assert abs(counts[3] / 20000 - 0.6) < 0.02
+
+
+def test_sqlite_catalogue_round_trip_and_filters(tmp_path):
+    path = str(tmp_path / "catalogue.db")
+    build_catalogue(path, builtin_conditions())
+    catalogue = SQLiteCatalogue(path)
+    assert catalogue._conn is None
+
+    migraine = catalogue.get("migraine")
+    assert migraine.specialty == "neurology"
+    assert migraine.symptoms[0] == "severe headache"
+    assert "rest in a dark room" in migraine.accepted
+    assert catalogue.get("unknown") is None
+    assert len(catalogue) == 6
+
+    rng = random.Random(0)
+    assert {catalogue.sample(rng, difficulty=3).name for _ in range(50)} == {"dengue", "bacterial pneumonia"}
+    assert catalogue.sample(rng, specialty="neurology").name == "migraine"
+
+    cold = catalogue.get("common cold")
+    assert cold.synonyms["paracetamol"] == ["acetaminophen", "tylenol"]
+
+
+def test_create_patient_filters_by_specialty(monkeypatch):
+    monkeypatch.setattr(main, "manager", main.ConnectionManager(InMemoryStore()))
+    client = TestClient(main.app)
+
+    res = client.post("/api/doctor/doc_1/create-patient", params={"specialty": "pulmonology"})
+    assert res.status_code == 200
+    assert res.json()["condition"] == "bacterial pneumonia"
+    assert res.json()["difficulty"] == 3
+
+    res = client.post("/api/doctor/doc_1/create-patient", params={"specialty": "dermatology"})
+    assert res.status_code == 404
@@ -0,0 +1,92 @@
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from langchain_core.messages import HumanMessage
+
+from patient import agent, classifier, models
+from patient.cache import LRUCache, normalize
+from patient.classifier import INTENT_CLASSIFICATIONS, NaiveBayesClassifier, RuleClassifier, fast_path_hit_rate
+from patient.fake import FakeChatModel
+
+
+def test_rule_classifier():
+    rules = RuleClassifier()
+
+    assert rules.classify("Hello") == "greeting"
+    assert rules.classify("How are you feeling?") == "symptom_inquiry"
+    assert rules.classify("I prescribe antibiotics") == "treatment_prescription"
+    assert rules.classify("Take ibuprofen twice a day") == "treatment_prescription"
+    assert rules.classify("Are you allergic to penicillin?") == "general_question"
+
+    # Conflicting or missing signals are left to the model.
+    assert rules.classify("Hello, how are you feeling today?") is None
+    assert rules.classify("Do you take ibuprofen?") is None
+    assert rules.classify("I'm interested in your diet") is None
+
+    # A treatment without a prescribing cue, or asked about, is history taking
+    # as often as a prescription.
+    for question in ("What about rest and fluids?", "Did you get enough rest?", "Have you been drinking fluids?",
+                     "Have you tried paracetamol?", "Did the antibiotics help last time?"):
+        assert rules.classify(question) is None, question
+
+
+def test_treatment_history_questions_do_not_end_the_consultation(monkeypatch):
+    monkeypatch.setitem(models.MODELS, "helper", FakeChatModel(responses=["general_question"]))
+    monkeypatch.setattr(classifier, "intent_cache", lambda: None)
+
+    for question in ("Did you get enough rest?", "Have you been drinking fluids?", "Have you tried paracetamol?"):
+        state = agent.init_condition("common cold", ["runny nose"])
+        state["messages"].append(HumanMessage(question))
+        state.update(agent.intent_classifier(state))
+        assert state["convo_stage"] == "general_question"
+        assert agent.treatment_analysis(state) == {"accepted": False}
+
+
+def test_naive_bayes_abstains_below_confidence():
+    nb = NaiveBayesClassifier(min_confidence=0.8).fit([
+        ("do you smoke", "general_question"),
+        ("how old are you", "general_question"),
+        ("hello there", "greeting"),
+        ("hi there", "greeting"),
+    ])
+
+    assert nb.classify("do you smoke at all") == "general_question"
+    assert nb.classify("good afternoon") is None
+
+
+def test_intent_classifier_escalates_only_ambiguous_messages(monkeypatch):
+    helper = FakeChatModel(responses=["greeting"])
+    monkeypatch.setitem(models.MODELS, "helper", helper)
+    INTENT_CLASSIFICATIONS.reset()
+
+    state = agent.init_condition("fever", ["chills"])
+    state["messages"].append(HumanMessage("I prescribe paracetamol"))
+    assert agent.intent_classifier(state) == {"convo_stage": "treatment_prescription"}
+    assert helper.calls == 0
+
+    state["messages"].append(HumanMessage("Hello, how are you feeling today?"))
+    assert agent.intent_classifier(state) == {"convo_stage": "greeting"}
+    assert helper.calls == 1
+
+    assert INTENT_CLASSIFICATIONS.value(source="rules") == 1
+    assert INTENT_CLASSIFICATIONS.value(source="llm") == 1
+    assert fast_path_hit_rate() == 0.5
+
+
+def test_unknown_model_labels_fall_back_and_are_not_cached(monkeypatch):
+    intents = LRUCache("intent", 100, 0)
+    monkeypatch.setattr(classifier, "intent_cache", lambda: intents)
+    helper = FakeChatModel(responses=["The intent is greeting."])
+    monkeypatch.setitem(models.MODELS, "helper", helper)
+
+    state = agent.init_condition("fever", ["chills"])
+    state["messages"].append(HumanMessage("Hello, how are you feeling today?"))
+    for _ in range(2):
+        assert agent.intent_classifier(state) == {"convo_stage": agent.DEFAULT_STAGE}
+
+    assert helper.calls == 2
+    assert intents.get(normalize("Hello, how are you feeling today?")) is None
@@ -0,0 +1,50 @@
+import asyncio
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from patient import agent, clients, models
+from patient.fake import FakeChatModel
+
+
+def test_anthropic_clients_share_one_pool(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    monkeypatch.delenv("ANTHROPIC_PROXY", raising=False)
+    patient, helper = models.anthropic_model(), models.anthropic_model()
+
+    assert patient is not helper
+    # Retries are left to the ModelScheduler.
+    assert patient.max_retries == 0
+    pool = clients.async_http_client(patient.anthropic_api_url, None)
+    assert patient._async_client._client is helper._async_client._client is pool
+    assert patient._client._client is clients.sync_http_client(patient.anthropic_api_url, None)
+    assert clients.http_limits().keepalive_expiry == 300
+
+
+def test_anthropic_proxy_gets_its_own_pool(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    monkeypatch.setenv("ANTHROPIC_PROXY", "http://proxy.local:3128")
+    proxied = models.anthropic_model()
+
+    pool = proxied._async_client._client
+    assert pool is clients.async_http_client(proxied.anthropic_api_url, "http://proxy.local:3128")
+    assert pool is not clients.async_http_client(proxied.anthropic_api_url, None)
+    assert proxied._client._client is clients.sync_http_client(proxied.anthropic_api_url, "http://proxy.local:3128")
+
+
+def test_warm_up_builds_models_and_graph(monkeypatch):
+    monkeypatch.setenv("PATBOT_MODEL_PROVIDER", "fake")
+    built = []
+    monkeypatch.setattr(models, "FACTORIES", {role: lambda role=role: built.append(role) or FakeChatModel()
+                                              for role in models.ROLES})
+    monkeypatch.setattr(models, "MODELS", {})
+    agent.shared_graph.cache_clear()
+
+    asyncio.run(clients.warm_up(connections=2))
+
+    assert built == list(models.ROLES)
+    assert agent.shared_graph.cache_info().currsize == 1
+    assert clients.WARMUP_SECONDS.count(step="graph") >= 1
@@ -0,0 +1,102 @@
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from fastapi.testclient import TestClient
+
+import main
+from patient.pool import POOL_TAKES, PatientPool
+from patient.store import InMemoryStore
+
+
+def cohort(client: TestClient, **body) -> list:
+    res = client.post("/api/cohort", json=body)
+    assert res.status_code == 200, res.text
+    return res.json()["patients"]
+
+
+def test_seeded_cohort_is_reproducible(monkeypatch):
+    monkeypatch.setattr(main, "manager", main.ConnectionManager(InMemoryStore(), pool_size=0))
+    client = TestClient(main.app)
+
+    body = {"doctors": {"doc_1": 3, "doc_2": 2}, "seed": 42}
+    first = cohort(client, **body)
+    second = cohort(client, **body)
+
+    assert [p["doctor_id"] for p in first] == ["doc_1"] * 3 + ["doc_2"] * 2
+    assert [(p["condition"], p["total_symptoms"]) for p in first] == \
+        [(p["condition"], p["total_symptoms"]) for p in second]
+    assert len({p["patient_id"] for p in first + second}) == 10
+    assert len(main.manager.get_doctor_patients("doc_1")) == 6
+
+
+def test_cohort_condition_mix_and_limits(monkeypatch):
+    monkeypatch.setattr(main, "manager", main.ConnectionManager(InMemoryStore(), max_patients_per_doctor=4,
+                                                                 pool_size=0))
+    client = TestClient(main.app)
+
+    patients = cohort(client, doctors={"doc_1": 4}, conditions={"migraine": 1})
+    assert {p["condition"] for p in patients} == {"migraine"}
+    for weight in (0, -1):
+        body = {"doctors": {"doc_1": 1}, "conditions": {"migraine": 1, "dengue": weight}}
+        assert client.post("/api/cohort", json=body).status_code == 422
+
+    assert client.post("/api/cohort", json={"doctors": {"doc_1": 5}}).status_code == 429
+    for count in (0, -2):
+        assert client.post("/api/cohort", json={"doctors": {"doc_1": count}}).status_code == 422
+    assert client.post("/api/cohort", json={"doctors": {"doc_1": 1}, "conditions": {"flu": 1}}).status_code == 404
+
+
+def test_cohort_is_created_whole_or_not_at_all(monkeypatch):
+    manager = main.ConnectionManager(InMemoryStore(), max_patients=6, pool_size=0)
+    monkeypatch.setattr(main, "manager", manager)
+    client = TestClient(main.app)
+
+    live = cohort(client, doctors={"doc_1": 2})
+    for patient in live:
+        manager.patient_connections[patient["patient_id"]] = object()
+    idle = [p["patient_id"] for p in cohort(client, doctors={"doc_3": 2})]
+    # Not enough idle sessions to make room: none of them is evicted.
+    assert client.post("/api/cohort", json={"doctors": {"doc_2": 5}}).status_code == 429
+    assert manager.store.count() == 4
+    assert manager.get_doctor_patients("doc_3") == idle
+
+    # Room taken by another worker between the plan and the last patient.
+    has_room = manager.has_room
+    calls = []
+
+    def crowded(doctor_id):
+        calls.append(doctor_id)
+        return len(calls) < 3 and has_room(doctor_id)
+
+    monkeypatch.setattr(manager, "has_room", crowded)
+    assert client.post("/api/cohort", json={"doctors": {"doc_2": 4}}).status_code == 429
+    assert manager.store.count() == 2
+    assert manager.get_doctor_patients("doc_2") == []
+
+
+def test_cohort_evicts_only_what_it_needs():
+    manager = main.ConnectionManager(InMemoryStore(), max_patients=5, max_patients_per_doctor=3, pool_size=0)
+    manager.create_cohort({"doc_1": 3, "doc_2": 2})
+    evicted = main.EVICTED_SESSIONS.value(reason="doctor_limit"), main.EVICTED_SESSIONS.value(reason="global_limit")
+
+    manager.create_cohort({"doc_1": 1, "doc_3": 1})
+    assert len(manager.get_doctor_patients("doc_1")) == 2
+    assert manager.store.count() == 5
+    assert main.EVICTED_SESSIONS.value(reason="doctor_limit") == evicted[0] + 1
+    assert main.EVICTED_SESSIONS.value(reason="global_limit") == evicted[1] + 1
+
+
+def test_pool_serves_prebuilt_patients():
+    pool = PatientPool(4)
+    assert pool.fill() == 4
+
+    hits = POOL_TAKES.value(result="hit")
+    for _ in range(5):
+        details, patient = pool.take()
+        assert patient.condition == details.name
+    assert POOL_TAKES.value(result="hit") == hits + 4
+    assert pool._wanted.is_set()
@@ -0,0 +1,140 @@
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from patient import agent, models
+from patient import patient as patient_module
+from patient.context import ContextWindow, estimate_tokens
+from patient.fake import FakeChatModel
+from patient.patient import Patient
+
+
+def consultation(turns: int) -> dict:
+    state = agent.init_condition("fever", ["chills", "sweating", "headache"])
+    for i in range(turns):
+        state["messages"].append(HumanMessage(f"Question number {i}?"))
+        state["messages"].append(AIMessage(f"Answer number {i}."))
+    state["messages"].append(HumanMessage("Anything else?"))
+    return state
+
+
+def test_window_keeps_recent_turns_and_excerpts_the_rest():
+    window = ContextWindow(recent_turns=3, max_tokens=1000, excerpt_tokens=1000)
+    state = consultation(10)
+
+    messages, update = window.apply(state)
+
+    assert messages == state["messages"][-7:]
+    assert isinstance(messages[0], HumanMessage)
+    assert update["trimmed"] == len(state["messages"]) - 7
+    assert update["excerpt"].splitlines()[0] == "Doctor: Question number 0?"
+    assert update["excerpt"].splitlines()[-1] == "You: Answer number 6."
+    assert update["dropped"] == []
+
+    # Nothing new falls out of the window until the next turn.
+    state.update(update)
+    assert window.apply(state) == (messages, {})
+
+
+def test_window_respects_token_budgets():
+    window = ContextWindow(recent_turns=50, max_tokens=30, excerpt_tokens=20)
+    state = consultation(40)
+
+    messages, update = window.apply(state)
+
+    assert sum(estimate_tokens(m.content) for m in messages) <= 30
+    assert isinstance(messages[0], HumanMessage)
+    assert estimate_tokens(update["excerpt"]) <= 20
+
+
+def test_patient_prompt_includes_excerpt_once_history_is_trimmed(monkeypatch):
+    monkeypatch.setattr(agent, "context_window", lambda: ContextWindow(recent_turns=2))
+    state = consultation(5)
+    state["convo_stage"] = "general_question"
+    state["revealed_symptoms"] = ["chills"]
+
+    prompt, update = agent.patient_prompt(state)
+
+    assert isinstance(prompt[0], SystemMessage)
+    system = agent.message_text(prompt[0])
+    assert "Earlier in this chat" in system
+    assert "already mentioned: chills" in system
+    assert len(prompt) == 1 + 5
+    assert update["trimmed"] == 6
+
+    monkeypatch.setattr(agent, "context_window", lambda: ContextWindow(recent_turns=0))
+    prompt, update = agent.patient_prompt(state)
+    assert len(prompt) == 1 + len(state["messages"])
+    assert update == {}
+
+
+def test_lines_pushed_out_of_the_excerpt_are_handed_back():
+    window = ContextWindow(recent_turns=2, max_tokens=1000, excerpt_tokens=20)
+    state = consultation(10)
+
+    messages, update = window.apply(state)
+
+    lines = update["dropped"] + update["excerpt"].splitlines()
+    assert lines[0] == "Doctor: Question number 0?"
+    assert lines[-1] == "You: Answer number 7."
+    assert update["dropped"] and estimate_tokens(update["excerpt"]) <= 20
+
+
+class SummaryFails(FakeChatModel):
+    def _next_content(self, messages, stop=None, max_tokens=None):
+        if "New lines:" in agent.message_text(messages[-1]):
+            raise RuntimeError("helper down")
+        return super()._next_content(messages, stop, max_tokens)
+
+
+def long_session(monkeypatch, helper) -> Patient:
+    window = ContextWindow(recent_turns=2, max_tokens=1000, excerpt_tokens=30, summary_tokens=20)
+    monkeypatch.setattr(agent, "context_window", lambda: window)
+    monkeypatch.setattr(patient_module, "context_window", lambda: window)
+    monkeypatch.setitem(models.MODELS, "helper", helper)
+    monkeypatch.setitem(models.MODELS, "patient", FakeChatModel(responses=["Nothing new, doctor."]))
+
+    patient = Patient("fever", ["chills", "sweating"])
+    for i in range(12):
+        assert patient.doc_turn(f"Anything else, number {i}?") == "Nothing new, doctor."
+    return patient
+
+
+def test_dropped_lines_are_folded_into_the_summary(monkeypatch):
+    notes = "The doctor keeps asking whether there is anything else; I said nothing new."
+    helper = FakeChatModel(responses=["general_question"], script={"New lines:": notes})
+    patient = long_session(monkeypatch, helper)
+
+    assert patient.summary == ContextWindow(summary_tokens=20).cap(notes)
+    assert "number 0?" not in patient.excerpt
+    restored = Patient.restore(patient.snapshot())
+    assert restored.summary == patient.summary
+
+    prompt, _ = agent.patient_prompt(patient.state)
+    system = agent.message_text(prompt[0])
+    assert f"Earlier in this chat (summary):\n{patient.summary}" in system
+    assert "Then (shortened):" in system
+
+
+def test_failed_summary_does_not_fail_the_turn(monkeypatch):
+    patient = long_session(monkeypatch, SummaryFails(responses=["general_question"]))
+    assert patient.summary == ""
+    assert patient.excerpt
+
+
+@pytest.mark.parametrize("budget", [5, 20])
+def test_summary_is_held_to_its_budget(budget):
+    assert estimate_tokens(ContextWindow(summary_tokens=budget).cap("word " * 200)) <= budget
+
+
+def test_zero_summary_budget_drops_lines_without_a_model_call(monkeypatch):
+    helper = FakeChatModel(responses=["unused"])
+    monkeypatch.setitem(models.MODELS, "helper", helper)
+    assert ContextWindow(summary_tokens=0).fold("kept", ["Doctor: hi"]) == "kept"
+    assert helper.calls == 0
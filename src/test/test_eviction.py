@@ -0,0 +1,91 @@
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import main
+from patient import models
+from patient.fake import FakeChatModel
+from patient.store import InMemoryStore
+
+
+def test_reaper_evicts_idle_unconnected_patients():
+    manager = main.ConnectionManager(InMemoryStore(), session_ttl=60)
+    manager.create_patient("doc_1", "p1")
+    manager.create_patient("doc_1", "p2")
+    manager.patient_connections["p2"] = object()
+
+    assert manager.reap(now=time.time() + 30) == 0
+    assert manager.reap(now=time.time() + 120) == 1
+    assert manager.get_patient("p1") is None
+    assert manager.get_patient("p2") is not None
+    assert main.LIVE_SESSIONS.value() == 1
+
+
+def test_limits_evict_least_recently_active_patient():
+    manager = main.ConnectionManager(InMemoryStore(), max_patients=3, max_patients_per_doctor=2)
+    manager.create_patient("doc_1", "p1")
+    manager.create_patient("doc_1", "p2")
+    manager.store.touch("p1")
+
+    manager.create_patient("doc_1", "p3")
+    assert manager.get_doctor_patients("doc_1") == ["p1", "p3"]
+
+    manager.create_patient("doc_2", "p4")
+    manager.create_patient("doc_2", "p5")
+    assert manager.get_patient("p1") is None
+    assert manager.store.count() == 3
+
+
+def test_limits_never_evict_connected_patients():
+    manager = main.ConnectionManager(InMemoryStore(), max_patients_per_doctor=1)
+    manager.create_patient("doc_1", "p1")
+    manager.patient_connections["p1"] = object()
+
+    with pytest.raises(main.SessionLimitError):
+        manager.create_patient("doc_1", "p2")
+
+
+def test_unanswered_ping_closes_the_socket(monkeypatch):
+    monkeypatch.setattr(main, "manager", main.ConnectionManager(InMemoryStore()))
+    monkeypatch.setattr(main, "WS_PING_INTERVAL", 0.1)
+    client = TestClient(main.app)
+    patient_id = client.post("/api/doctor/doc_1/create-patient").json()["patient_id"]
+
+    with client.websocket_connect("/ws/doctor/doc_1") as ws:
+        assert ws.receive_json()["type"] == "system"
+        ws.send_json({"type": "attach", "patient_id": patient_id})
+        assert ws.receive_json()["type"] == "system"
+        assert ws.receive_json()["type"] == "ping"
+        ws.send_json({"type": "pong"})
+        assert ws.receive_json()["type"] == "ping"
+        with pytest.raises(WebSocketDisconnect):
+            ws.receive_json()
+
+    assert patient_id not in main.manager.patient_connections
+    assert main.manager.get_patient(patient_id) is not None
+
+
+def test_legacy_patient_socket_is_not_pinged(monkeypatch):
+    monkeypatch.setattr(main, "manager", main.ConnectionManager(InMemoryStore()))
+    monkeypatch.setattr(main, "WS_PING_INTERVAL", 0.05)
+    monkeypatch.setitem(models.MODELS, "patient", FakeChatModel(responses=["Still here."]))
+    client = TestClient(main.app)
+    patient_id = client.post("/api/doctor/doc_1/create-patient").json()["patient_id"]
+
+    with client.websocket_connect(f"/ws/patient/{patient_id}") as ws:
+        assert ws.receive_json()["type"] == "system"
+        time.sleep(0.3)
+        ws.send_json({"message": "Are you still there?"})
+        frame = ws.receive_json()
+        while frame["type"] == "patient_response_delta":
+            frame = ws.receive_json()
+        assert frame["content"] == "Still here."
+        assert patient_id in main.manager.patient_connections
@@ -0,0 +1,83 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import pytest
+
+from patient import fused, models
+from patient.agent import create_graph
+from patient.fake import FakeChatModel
+from patient.patient import Patient
+
+
+@pytest.fixture
+def fused_patient(monkeypatch):
+    graph = create_graph("fused")
+    monkeypatch.setattr("patient.patient.shared_graph", lambda: graph)
+    return Patient("common cold", ["runny nose", "sore throat", "mild cough", "congestion"])
+
+
+def run_turn(patient: Patient, message: str) -> list:
+    async def collect():
+        return [delta async for delta in patient.astream_turn(message)]
+    return asyncio.run(collect())
+
+
+def answer(intent: str, reply: str, disclosed=()) -> str:
+    return json.dumps({"intent": intent, "disclosed": list(disclosed), "reply": reply})
+
+
+def test_one_call_sets_stage_reply_and_disclosures(fused_patient, monkeypatch):
+    reply = 'My nose is "always" running and my throat hurts.'
+    model = FakeChatModel(responses=[answer("symptom_inquiry", reply, ["runny nose", "sore throat", "rash"])])
+    helper = FakeChatModel(responses=["general_question"])
+    monkeypatch.setitem(models.MODELS, "patient", model)
+    monkeypatch.setitem(models.MODELS, "helper", helper)
+
+    deltas = run_turn(fused_patient, "What have you been feeling lately?")
+
+    assert len(deltas) > 1
+    assert "".join(deltas) == reply
+    state = fused_patient.state
+    assert state["messages"][-1].content == reply
+    assert state["convo_stage"] == "symptom_inquiry"
+    # Only symptoms offered to the model can be disclosed.
+    assert state["revealed_symptoms"] == ["runny nose", "sore throat"]
+    assert model.calls == 1 and helper.calls == 0
+
+
+def test_treatment_decision_is_deterministic(fused_patient, monkeypatch):
+    monkeypatch.setitem(models.MODELS, "patient", FakeChatModel(responses=[
+        answer("treatment_prescription", "Okay, thanks doctor."),
+        answer("treatment_prescription", "Could we try something else?"),
+    ]))
+
+    run_turn(fused_patient, "I'd recommend rest and plenty of fluids.")
+    assert fused_patient.state["accepted"] is True
+
+    fused_patient.state["accepted"] = False
+    run_turn(fused_patient, "Take antibiotics twice a day.")
+    assert fused_patient.state["accepted"] is False
+
+
+def test_unparseable_answer_falls_back_to_text(fused_patient, monkeypatch):
+    monkeypatch.setitem(models.MODELS, "patient", FakeChatModel(responses=["Hi doctor, I'm alright."]))
+    fallbacks = fused.FUSED_TURNS.value(result="fallback")
+
+    deltas = run_turn(fused_patient, "Hello there!")
+
+    assert "".join(deltas) == "Hi doctor, I'm alright."
+    assert fused_patient.state["convo_stage"] in ("greeting", "general_question")
+    assert fused.FUSED_TURNS.value(result="fallback") == fallbacks + 1
+
+
+def test_reply_stream_decodes_partial_json():
+    stream = fused.ReplyStream()
+    text = '{"intent": "greeting", "disclosed": [], "reply": "Caf\\u00e9 line\\nbreak \\"quoted\\""}'
+    out = "".join(stream.feed(text[i:i + 3]) for i in range(0, len(text), 3))
+    assert out == 'Café line\nbreak "quoted"'
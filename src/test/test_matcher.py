@@ -0,0 +1,68 @@
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from langchain_core.messages import HumanMessage
+
+from patient.agent import disclosed_symptoms, init_condition, treatment_analysis
+from patient.matcher import KeywordMatcher
+
+
+def prescribe(condition: str, message: str) -> bool:
+    state = init_condition(condition, [])
+    state["messages"] = [HumanMessage(message)]
+    state["convo_stage"] = "treatment_prescription"
+    return treatment_analysis(state)["accepted"]
+
+
+def test_matches_whole_words_and_plurals():
+    matcher = KeywordMatcher({"rest": "accepted", "steroid": "rejected", "pain reliever": "accepted"})
+
+    assert matcher.scan("I'm interested in your arrest record") == []
+    assert [hit.term for hit in matcher.scan("Steroids and pain relievers, then REST")] == [
+        "steroid", "pain reliever", "rest",
+    ]
+
+
+def test_longest_keyword_wins():
+    matcher = KeywordMatcher({"saline": "a", "saline nasal spray": "b"})
+    assert [hit.label for hit in matcher.scan("use a saline nasal spray")] == ["b"]
+
+
+def test_negated_treatments_are_ignored():
+    assert prescribe("common cold", "Get some rest and drink fluids.")
+    assert not prescribe("common cold", "I'm prescribing antibiotics.")
+    assert not prescribe("common cold", "Don't take ibuprofen, I'm prescribing antibiotics.")
+    assert prescribe("common cold", "No antibiotics needed, just rest.")
+    assert not prescribe("common cold", "I'm interested in prescribing antibiotics.")
+
+
+def test_negation_after_the_keyword_and_extra_cues():
+    assert not prescribe("common cold", "rest won't help, take antibiotics")
+    assert not prescribe("common cold", "Rest is not needed; antibiotics")
+    assert not prescribe("fever", "I wouldn't give you paracetamol")
+    assert not prescribe("fever", "You can't have paracetamol")
+    # Only the negated treatment is dropped.
+    assert prescribe("common cold", "You don't need antibiotics, just rest")
+
+
+def test_prescribed_rejected_treatment_vetoes_acceptance():
+    assert not prescribe("dengue", "paracetamol and ibuprofen")
+    assert not prescribe("dengue", "Take paracetamol, and ibuprofen for the pain")
+    # Ruling the contraindicated drug out leaves the prescription standing.
+    assert prescribe("dengue", "paracetamol is fine but no ibuprofen")
+
+
+def test_named_symptoms_are_disclosed_first():
+    state = init_condition("dengue", ["high fever", "joint pain", "rash"])
+    state["messages"] = [HumanMessage("Have you noticed a rash anywhere?")]
+    assert disclosed_symptoms(state) == {"revealed_symptoms": ["rash"]}
+
+    state["messages"] = [HumanMessage("What symptoms are you experiencing?")]
+    assert disclosed_symptoms(state) == {"revealed_symptoms": ["high fever", "joint pain"]}
+
+    state["messages"] = [HumanMessage("Did you travel recently?")]
+    assert disclosed_symptoms(state) == {}
@@ -0,0 +1,54 @@
+import asyncio
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from patient import models
+from patient.fake import FakeChatModel, load_script
+from patient.patient import Patient
+
+RECORDING = PROJECT_ROOT / "bench" / "data" / "consultations.jsonl"
+
+
+def test_fake_provider_is_selected_from_env(monkeypatch):
+    monkeypatch.setenv("PATBOT_MODEL_PROVIDER", "fake")
+    monkeypatch.setenv("PATBOT_FAKE_LATENCY", "uniform:0.5,0.1")
+    monkeypatch.setattr(models, "MODELS", {})
+
+    patient_model = models.get_model("patient")
+    assert isinstance(patient_model, FakeChatModel)
+    assert patient_model.latency_distribution == "uniform"
+    assert models.get_model("patient") is patient_model
+    assert models.get_model("helper").responses == ["general_question"]
+
+
+def test_use_models_restores_previous_models():
+    fake = FakeChatModel(responses=["Hi."])
+    with models.use_models(patient=fake):
+        assert models.get_model("patient") is fake
+    assert models.MODELS.get("patient") is not fake
+
+
+def test_seeded_latency_is_reproducible():
+    def draws():
+        model = FakeChatModel(latency=0.4, latency_distribution="lognormal", latency_spread=0.5, seed=7)
+        return [model.sample_latency() for _ in range(5)]
+
+    first = draws()
+    assert first == draws()
+    assert all(delay > 0 for delay in first)
+
+
+def test_recorded_consultation_replays_through_graph():
+    helper = FakeChatModel(script=load_script(str(RECORDING), "helper"), responses=["general_question"])
+    patient_model = FakeChatModel(script=load_script(str(RECORDING), "patient"))
+
+    with models.use_models(helper=helper, patient=patient_model):
+        patient = Patient("migraine", ["throbbing headache", "sensitivity to light", "nausea"])
+        reply = asyncio.run(patient.adoc_turn("How often do they happen?"))
+
+    assert reply == "Maybe twice a week lately."
+    assert patient.state["convo_stage"] == "general_question"
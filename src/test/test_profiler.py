@@ -0,0 +1,95 @@
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from fastapi.testclient import TestClient
+
+import main
+from patient import models
+from patient.fake import FakeChatModel
+from patient.instrumentation import timed_node
+from patient.profiler import Profiler
+
+
+def busy(state: dict) -> dict:
+    end = time.perf_counter() + 0.1
+    while time.perf_counter() < end:
+        pass
+    return {}
+
+
+def test_samples_are_attributed_to_nodes(tmp_path):
+    profiler = Profiler(str(tmp_path), interval=0.001)
+    run = profiler.start(turns=1, patient_id="p1")
+    assert profiler.claim("p2", lambda: "doc_1") is None
+    assert profiler.claim("p1", lambda: "doc_1") is run
+
+    async def turn():
+        await timed_node("busy", busy).ainvoke({})
+        yield "done"
+
+    async def consume():
+        return [delta async for delta in profiler.profiled(run, turn())]
+
+    assert asyncio.run(consume()) == ["done"]
+    assert profiler.claim("p1", lambda: "doc_1") is None
+    profiler.stop()
+
+    assert run.samples > 10
+    assert "busy" in run.stacks
+    assert "busy (test_profiler.py" in (run.output / "busy.collapsed").read_text()
+    speedscope = json.loads((run.output / "profile.speedscope.json").read_text())
+    assert "busy" in [p["name"] for p in speedscope["profiles"]]
+    assert profiler.run is None and profiler.current() is run
+
+
+def test_runs_are_capped_at_max_seconds(tmp_path):
+    profiler = Profiler(str(tmp_path), interval=0.001, max_seconds=0.05)
+    run = profiler.start(turns=5)
+    assert run.status()["overhead"]
+
+    deadline = time.monotonic() + 2
+    while profiler.run is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert profiler.run is None and run.done()
+    assert run.switch_interval == 0.0001
+
+    run = profiler.start(seconds=3600)
+    assert run.deadline - time.monotonic() <= 0.05
+    profiler.stop()
+
+
+def test_admin_profile_endpoints(monkeypatch, tmp_path):
+    monkeypatch.setitem(models.MODELS, "patient", FakeChatModel(responses=["I feel hot."]))
+    profiler = Profiler(str(tmp_path), interval=0.001)
+    monkeypatch.setattr(main, "profiler", lambda: profiler)
+    client = TestClient(main.app)
+    auth = {"Authorization": "Bearer secret"}
+
+    assert client.post("/api/admin/profile", json={"turns": 1}).status_code == 404
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+    assert client.post("/api/admin/profile", json={"turns": 1}).status_code == 403
+    wrong = {"Authorization": "Bearer secreT"}
+    assert client.post("/api/admin/profile", json={"turns": 1}, headers=wrong).status_code == 403
+
+    patient_id = client.post("/api/doctor/doc_1/create-patient").json()["patient_id"]
+    status = client.post("/api/admin/profile", json={"turns": 1, "doctor_id": "doc_1"}, headers=auth).json()
+    assert status["turns_left"] == 1
+    assert client.post("/api/admin/profile", json={"seconds": 5}, headers=auth).status_code == 409
+
+    with client.websocket_connect(f"/ws/patient/{patient_id}") as ws:
+        ws.receive_json()
+        ws.send_json({"message": "Do you have a fever?"})
+        while ws.receive_json()["type"] != "patient_response":
+            pass
+
+    status = client.delete("/api/admin/profile", headers=auth).json()
+    assert status["turns"] == 1 and status["done"]
+    assert Path(status["output"], "profile.speedscope.json").exists()
+    assert client.get("/api/admin/profile", headers=auth).json()["id"] == status["id"]
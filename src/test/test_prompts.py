@@ -0,0 +1,43 @@
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from langchain_core.messages import HumanMessage
+
+from patient import agent, models
+from patient.fake import FakeChatModel
+
+
+def test_system_prompt_prefix_is_stable_across_stages():
+    state = agent.init_condition("dengue", ["high fever", "rash"])
+    state["messages"].append(HumanMessage("Hello"))
+    greeting, _ = agent.patient_prompt(state)
+
+    state["messages"].append(HumanMessage("I prescribe ibuprofen"))
+    state["convo_stage"] = "treatment_prescription"
+    treatment, _ = agent.patient_prompt(state)
+
+    prefix, suffix = greeting[0].content
+    assert prefix == treatment[0].content[0]
+    assert prefix["cache_control"] == {"type": "ephemeral"}
+    assert "dengue" in prefix["text"]
+    assert "Hello" not in prefix["text"] and "Hello" in suffix["text"]
+    assert "ibuprofen" in treatment[0].content[1]["text"]
+
+
+def test_prompt_cache_reads_are_recorded(monkeypatch):
+    monkeypatch.setitem(models.MODELS, "patient", FakeChatModel(responses=["Hi."]))
+    agent.PROMPT_TOKENS.reset()
+
+    state = agent.init_condition("migraine", ["nausea"])
+    for message in ["Hello", "Good morning"]:
+        state["messages"].append(HumanMessage(message))
+        state["messages"] += agent.res_patient(state)["messages"]
+
+    assert agent.PROMPT_TOKENS.count(kind="cache_read") == 2
+    assert agent.PROMPT_TOKENS.sum(kind="cache_creation") > 0
+    assert agent.PROMPT_TOKENS.sum(kind="cache_read") == agent.PROMPT_TOKENS.sum(kind="cache_creation")
+    assert agent.PROMPT_TOKENS.sum(kind="uncached") > 0
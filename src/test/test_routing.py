@@ -0,0 +1,76 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import pytest
+
+from patient import models, routing
+from patient.fake import FakeChatModel
+from patient.patient import Patient
+from patient.routing import ROUTE_SECONDS, ROUTE_TOKENS, RoutingTable
+
+
+def test_most_specific_route_wins():
+    table = RoutingTable({
+        "*": {"max_tokens": 500},
+        "generate_response": {"max_tokens": 300},
+        "generate_response:greeting": {"max_tokens": 50, "stop": ["Doctor:"]},
+        "*:treatment_prescription": {"temperature": 0.2},
+    })
+    assert table.route("generate_response", "greeting").kwargs() == {"max_tokens": 50, "stop": ["Doctor:"]}
+    assert table.route("generate_response", "symptom_inquiry").name == "generate_response"
+    assert table.route("fused_turn", "treatment_prescription").name == "*:treatment_prescription"
+    assert table.route("conversation_stage").name == "*"
+    assert RoutingTable({}).route("generate_response", "greeting").kwargs() == {}
+
+
+def test_routes_from_env(monkeypatch, tmp_path):
+    monkeypatch.setenv("PATBOT_ROUTES", json.dumps({
+        "generate_response:greeting": {"max_tokens": None, "model": "claude-sonnet-4-5"},
+        "conversation_stage": {"temperature": None},
+    }))
+    table = RoutingTable.from_env()
+    assert table.route("generate_response", "greeting").kwargs() == {"model": "claude-sonnet-4-5"}
+    assert table.route("conversation_stage").kwargs() == {"max_tokens": 16}
+
+    path = tmp_path / "routes.json"
+    path.write_text(json.dumps({"fused_turn": {"max_tokens": 200}}))
+    monkeypatch.setenv("PATBOT_ROUTES", str(path))
+    monkeypatch.setenv("PATBOT_ROUTE_DEFAULTS", "0")
+    assert RoutingTable.from_env().routes.keys() == {"fused_turn"}
+
+    with pytest.raises(ValueError):
+        RoutingTable({"fused_turn": {"max_output": 10}})
+
+
+def test_no_whitespace_only_stop_sequences():
+    # The Anthropic API answers these with a 400; FakeChatModel would not.
+    for settings in routing.DEFAULT_ROUTES.values():
+        assert all(sequence.strip() for sequence in settings.get("stop") or [])
+    with pytest.raises(ValueError):
+        RoutingTable({"conversation_stage": {"stop": ["\n"]}})
+
+
+def test_turn_uses_stage_routes(monkeypatch):
+    table = RoutingTable({
+        "conversation_stage": {"max_tokens": 16},
+        "generate_response:greeting": {"max_tokens": 3},
+    })
+    monkeypatch.setattr(routing, "routing_table", lambda: table)
+    monkeypatch.setitem(models.MODELS, "helper", FakeChatModel(responses=["greeting\nThe doctor is saying hello."]))
+    monkeypatch.setitem(models.MODELS, "patient", FakeChatModel(responses=["Hello doctor, I have been better."]))
+    replies = ROUTE_SECONDS.count(route="generate_response:greeting")
+    labels = ROUTE_TOKENS.value(route="conversation_stage", direction="output")
+
+    patient = Patient("fever", ["chills", "sweating"])
+    reply = asyncio.run(patient.adoc_turn("Lovely to meet you, I am Dr Patel"))
+
+    assert patient.state["convo_stage"] == "greeting"
+    assert reply == "Hello doctor"
+    assert ROUTE_SECONDS.count(route="generate_response:greeting") == replies + 1
+    assert ROUTE_TOKENS.value(route="conversation_stage", direction="output") > labels
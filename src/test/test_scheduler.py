@@ -0,0 +1,127 @@
+import asyncio
+import sys
+import threading
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import pytest
+
+from patient.fake import FakeChatModel
+from patient.scheduler import MODEL_RETRIES, ModelOverloaded, ModelScheduler, TokenBucket, scheduling_key
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class FlakyModel(FakeChatModel):
+    failures: int = 1
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise RateLimitError("rate limited")
+        return await super()._agenerate(messages, stop, run_manager, **kwargs)
+
+
+def test_concurrency_limit_and_fair_queueing():
+    scheduler = ModelScheduler(limit=2)
+    model = FakeChatModel(responses=["ok"], latency=0.05)
+    order = []
+    peak = [0]
+
+    async def call(doctor: str, i: int):
+        scheduling_key.set(doctor)
+        async with scheduler.slot("patient"):
+            peak[0] = max(peak[0], scheduler.active)
+            order.append(doctor)
+            await model.ainvoke("hi")
+
+    async def run():
+        busy = [asyncio.create_task(call("doc_a", i)) for i in range(6)]
+        await asyncio.sleep(0.01)
+        quiet = asyncio.create_task(call("doc_b", 0))
+        await asyncio.gather(*busy, quiet)
+
+    asyncio.run(run())
+    assert peak[0] == 2
+    # doc_b waits behind at most one queued doc_a call, not all four.
+    assert order.index("doc_b") <= 3
+    assert scheduler.active == 0 and scheduler.queued == 0
+
+
+def test_threads_and_the_event_loop_share_one_limit():
+    scheduler = ModelScheduler(limit=2)
+    in_flight, peak = [0], [0]
+    lock = threading.Lock()
+
+    def enter():
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+
+    def leave():
+        with lock:
+            in_flight[0] -= 1
+
+    class CountingModel(FakeChatModel):
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            enter()
+            try:
+                return super()._generate(messages, stop, run_manager, **kwargs)
+            finally:
+                leave()
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+            enter()
+            try:
+                return await super()._agenerate(messages, stop, run_manager, **kwargs)
+            finally:
+                leave()
+
+    model = CountingModel(responses=["ok"], latency=0.02)
+
+    async def run():
+        threaded = [asyncio.to_thread(scheduler.invoke, model, "hi", "helper") for _ in range(3)]
+        looped = [scheduler.ainvoke(model, "hi", "patient") for _ in range(3)]
+        return await asyncio.gather(*threaded, *looped)
+
+    results = asyncio.run(run())
+    assert [r.content for r in results] == ["ok"] * 6
+    assert peak[0] == 2
+    assert scheduler.active == 0 and scheduler.queued == 0
+
+
+def test_retries_transient_errors_with_backoff():
+    scheduler = ModelScheduler(limit=1, retries=2, backoff=0.01)
+    model = FlakyModel(responses=["ok"], failures=2)
+    retries = MODEL_RETRIES.value(role="helper")
+
+    assert asyncio.run(scheduler.ainvoke(model, "hi", "helper")).content == "ok"
+    assert MODEL_RETRIES.value(role="helper") == retries + 2
+
+    with pytest.raises(RateLimitError):
+        asyncio.run(ModelScheduler(retries=0).ainvoke(FlakyModel(failures=1), "hi", "helper"))
+
+
+def test_token_bucket_spaces_out_calls():
+    bucket = TokenBucket(rate=100, burst=2)
+    delays = [bucket.reserve() for _ in range(4)]
+    assert delays[:2] == [0.0, 0.0]
+    assert 0.005 < delays[2] < delays[3] <= 0.021
+
+
+def test_full_queue_is_rejected():
+    scheduler = ModelScheduler(limit=1, max_queue=1)
+    model = FakeChatModel(responses=["ok"], latency=0.1)
+
+    async def run():
+        calls = [asyncio.create_task(scheduler.ainvoke(model, "hi", "patient")) for _ in range(3)]
+        return await asyncio.gather(*calls, return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert sum(isinstance(r, ModelOverloaded) for r in results) == 1
+    assert scheduler.active == 0
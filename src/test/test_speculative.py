@@ -0,0 +1,85 @@
+import asyncio
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import pytest
+
+from patient import models, speculative
+from patient.agent import create_graph
+from patient.fake import FakeChatModel
+from patient.patient import Patient
+
+
+@pytest.fixture
+def speculative_patient(monkeypatch):
+    graph = create_graph("speculative")
+    monkeypatch.setattr("patient.patient.shared_graph", lambda: graph)
+    monkeypatch.setattr(speculative, "known_intent", lambda message: None)
+    monkeypatch.setattr(speculative, "predictor", speculative.StagePredictor())
+    return Patient("common cold", ["runny nose", "sore throat", "mild cough", "congestion"])
+
+
+class FailsFirstCall(FakeChatModel):
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        if not self.calls:
+            self.calls += 1
+            raise RuntimeError("draft failed")
+        async for chunk in super()._astream(messages, stop, run_manager, **kwargs):
+            yield chunk
+
+
+def run_turn(patient: Patient, message: str) -> list:
+    async def collect():
+        return [delta async for delta in patient.astream_turn(message)]
+    return asyncio.run(collect())
+
+
+def test_confirmed_draft_is_streamed(speculative_patient, monkeypatch):
+    helper = FakeChatModel(responses=["general_question"], latency=0.1)
+    model = FakeChatModel(responses=["I work from home, mostly at a desk."], latency=0.1)
+    monkeypatch.setitem(models.MODELS, "helper", helper)
+    monkeypatch.setitem(models.MODELS, "patient", model)
+    hits = speculative.SPECULATIONS.value(result="hit")
+
+    deltas = run_turn(speculative_patient, "What do you do for work?")
+
+    assert "".join(deltas) == "I work from home, mostly at a desk."
+    assert speculative_patient.state["messages"][-1].content == "I work from home, mostly at a desk."
+    assert speculative_patient.state["convo_stage"] == "general_question"
+    assert len(speculative_patient.state["messages"]) == 2
+    assert model.calls == 1
+    assert speculative.SPECULATIONS.value(result="hit") == hits + 1
+
+
+def test_mispredicted_draft_is_regenerated(speculative_patient, monkeypatch):
+    helper = FakeChatModel(responses=["symptom_inquiry"], latency=0.05)
+    model = FakeChatModel(responses=["My nose won't stop running and my throat hurts."], latency=0.3)
+    monkeypatch.setitem(models.MODELS, "helper", helper)
+    monkeypatch.setitem(models.MODELS, "patient", model)
+    misses = speculative.SPECULATIONS.value(result="miss")
+
+    deltas = run_turn(speculative_patient, "What have you been feeling lately?")
+
+    assert "".join(deltas) == "My nose won't stop running and my throat hurts."
+    assert speculative_patient.state["convo_stage"] == "symptom_inquiry"
+    assert speculative_patient.state["revealed_symptoms"] == ["runny nose", "sore throat"]
+    assert len(speculative_patient.state["messages"]) == 2
+    assert speculative.SPECULATIONS.value(result="miss") == misses + 1
+    assert speculative.predictor.predict("greeting", "anything") == "symptom_inquiry"
+
+
+def test_failed_draft_does_not_fail_a_mispredicted_turn(speculative_patient, monkeypatch):
+    helper = FakeChatModel(responses=["symptom_inquiry"], latency=0.05)
+    model = FailsFirstCall(responses=["My throat is really sore."])
+    monkeypatch.setitem(models.MODELS, "helper", helper)
+    monkeypatch.setitem(models.MODELS, "patient", model)
+
+    deltas = run_turn(speculative_patient, "What have you been feeling lately?")
+
+    assert "".join(deltas) == "My throat is really sore."
+    assert speculative_patient.state["convo_stage"] == "symptom_inquiry"
+    assert model.calls == 2
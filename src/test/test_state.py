@@ -0,0 +1,51 @@
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from patient import models
+from patient.context import context_window
+from patient.fake import FakeChatModel
+from patient.patient import Patient
+from patient.state import SymptomSet, TurnLog
+
+
+def test_turn_log_materializes_messages():
+    log = TurnLog([HumanMessage("Hello"), AIMessage("Hi doctor.")])
+    log += [HumanMessage("How are you?")]
+    assert len(log) == 3
+    assert isinstance(log[-1], HumanMessage) and log[-1].content == "How are you?"
+    assert [type(m) for m in log[1:]] == [AIMessage, HumanMessage]
+    assert log == [HumanMessage("Hello"), AIMessage("Hi doctor."), HumanMessage("How are you?")]
+
+
+def test_symptom_set_keeps_reveal_order():
+    symptoms = SymptomSet(["chills", "sweating", "headache"])
+    for name in ("headache", "chills", "headache", "unknown"):
+        symptoms.add(name)
+    assert symptoms.order == ["headache", "chills"]
+    assert "chills" in symptoms and "sweating" not in symptoms
+    assert symptoms.remaining() == ["sweating"]
+
+
+def test_long_session_passes_only_the_window(monkeypatch):
+    monkeypatch.setitem(models.MODELS, "helper", FakeChatModel(responses=["general_question"]))
+    monkeypatch.setitem(models.MODELS, "patient", FakeChatModel(responses=["Not much else to say."]))
+
+    patient = Patient("fever", ["chills", "sweating"])
+    sizes = []
+    for i in range(40):
+        sizes.append(len(patient.log) - patient.trimmed + 1)
+        assert patient.doc_turn(f"Anything else, number {i}?") == "Not much else to say."
+
+    assert len(patient.state["messages"]) == 80
+    assert max(sizes) <= 2 * context_window().recent_turns + 3
+    assert "number 30?" in patient.excerpt and "number 31?" not in patient.excerpt
+
+    restored = Patient.restore(patient.snapshot())
+    assert restored.state["messages"] == patient.state["messages"]
+    assert restored.trimmed == patient.trimmed
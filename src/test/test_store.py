@@ -0,0 +1,146 @@
+import asyncio
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessage, HumanMessage
+
+import main
+from patient import models
+from patient.fake import FakeChatModel
+from patient.patient import Patient
+from patient.store import InMemoryStore, SessionGone, SessionSummary, SQLiteStore
+
+CREATE_IN_OTHER_WORKER = """
+import json
+from fastapi.testclient import TestClient
+from main import app
+print(json.dumps(TestClient(app).post("/api/doctor/doc_7/create-patient").json()))
+"""
+
+
+def test_sqlite_store_round_trip(tmp_path):
+    store = SQLiteStore(str(tmp_path / "sessions.db"))
+    patient = Patient("fever", ["chills", "sweating"])
+    store.add("p1", "doc_1", patient)
+
+    patient.state["messages"] += [HumanMessage("Hello"), AIMessage("Hi doctor.")]
+    patient.state["convo_stage"] = "greeting"
+    store.save("p1", patient)
+
+    restored = SQLiteStore(str(tmp_path / "sessions.db")).get("p1")
+    assert restored.condition == "fever"
+    assert restored.state["messages"] == patient.state["messages"]
+    assert restored.state["convo_stage"] == "greeting"
+    assert store.doctor_of("p1") == "doc_1"
+    assert store.doctor_patients("doc_1") == ["p1"]
+
+    store.remove("p1")
+    assert store.get("p1") is None
+    assert store.doctor_patients("doc_1") == []
+
+
+def test_summaries_track_saved_state(tmp_path):
+    for store in (InMemoryStore(), SQLiteStore(str(tmp_path / "sessions.db"))):
+        patient = Patient("fever", ["chills", "sweating"])
+        store.add("p1", "doc_1", patient)
+        store.add("p2", "doc_2", Patient("migraine", ["aura"]))
+        assert store.summaries("doc_1") == [SessionSummary("p1", "fever", False, [])]
+
+        patient.state["revealed_symptoms"] = ["chills"]
+        patient.state["accepted"] = True
+        store.save("p1", patient)
+        assert store.summaries("doc_1") == [SessionSummary("p1", "fever", True, ["chills"])]
+
+
+def test_listing_patients_does_not_load_their_state(tmp_path, monkeypatch):
+    store = SQLiteStore(str(tmp_path / "sessions.db"))
+    monkeypatch.setattr(main, "manager", main.ConnectionManager(store, pool_size=0))
+    client = TestClient(main.app)
+    patient_id = client.post("/api/doctor/doc_1/create-patient").json()["patient_id"]
+
+    monkeypatch.setattr(store, "get", None)
+    patients = client.get("/api/doctor/doc_1/patients").json()["patients"]
+    assert [(p["patient_id"], p["accepted"], p["revealed_symptoms"]) for p in patients] == [(patient_id, False, [])]
+
+
+def test_sqlite_store_adds_summary_columns_to_older_files(tmp_path):
+    db = str(tmp_path / "sessions.db")
+    conn = sqlite3.connect(db)
+    conn.execute(
+        "CREATE TABLE sessions (patient_id TEXT PRIMARY KEY, doctor_id TEXT NOT NULL, condition TEXT NOT NULL,"
+        " state_type TEXT NOT NULL, state BLOB NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+    )
+    conn.close()
+
+    store = SQLiteStore(db)
+    store.add("p1", "doc_1", Patient("fever", ["chills"]))
+    assert store.summaries("doc_1") == [SessionSummary("p1", "fever", False, [])]
+
+
+def test_in_memory_store_drops_empty_doctors():
+    store = InMemoryStore()
+    store.add("p1", "doc_1", Patient("fever", ["chills"]))
+    store.remove("p1")
+
+    assert store.get("p1") is None
+    assert store.doctor_patients("doc_1") == []
+    assert store.doctor_patients_map == {}
+
+
+def test_save_after_remove_reports_the_session_gone(tmp_path):
+    for store in (InMemoryStore(), SQLiteStore(str(tmp_path / "sessions.db"))):
+        patient = Patient("fever", ["chills"])
+        store.add("p1", "doc_1", patient)
+        store.save("p1", patient)
+        store.remove("p1")
+        with pytest.raises(SessionGone):
+            store.save("p1", patient)
+
+
+def test_blocking_stores_are_called_off_the_event_loop(tmp_path):
+    async def caller_thread(store):
+        manager = main.ConnectionManager(store, pool_size=0)
+        return threading.get_ident(), await manager.in_store(threading.get_ident)
+
+    loop_thread, store_thread = asyncio.run(caller_thread(SQLiteStore(str(tmp_path / "sessions.db"))))
+    assert store_thread != loop_thread
+    loop_thread, store_thread = asyncio.run(caller_thread(InMemoryStore()))
+    assert store_thread == loop_thread
+
+
+def test_patient_created_in_one_worker_converses_in_another(tmp_path, monkeypatch):
+    db = tmp_path / "sessions.db"
+    env = dict(os.environ, PATBOT_SESSION_STORE=f"sqlite:{db}")
+    out = subprocess.run(
+        [sys.executable, "-c", CREATE_IN_OTHER_WORKER],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    created = json.loads(out.stdout.strip().splitlines()[-1])
+
+    monkeypatch.setattr(main, "manager", main.ConnectionManager(SQLiteStore(str(db))))
+    monkeypatch.setitem(models.MODELS, "patient", FakeChatModel(responses=["I feel awful."]))
+
+    with TestClient(main.app).websocket_connect(f"/ws/patient/{created['patient_id']}") as ws:
+        assert ws.receive_json()["content"].endswith(created["condition"])
+        ws.send_json({"message": "How are you feeling?"})
+        frame = ws.receive_json()
+        while frame["type"] == "patient_response_delta":
+            frame = ws.receive_json()
+
+        assert frame["content"] == "I feel awful."
+        resumed = SQLiteStore(str(db)).get(created["patient_id"])
+        assert [m.content for m in resumed.state["messages"]] == ["How are you feeling?", "I feel awful."]
+
+    # A clean close from the doctor ends the consultation everywhere.
+    assert SQLiteStore(str(db)).get(created["patient_id"]) is None
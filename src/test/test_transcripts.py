@@ -0,0 +1,59 @@
+import gzip
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from patient.transcripts import DeferredQueueHandler, TranscriptHandler, transcript
+
+
+def test_transcripts_are_written_per_patient_and_rotated(tmp_path):
+    handler = TranscriptHandler(str(tmp_path), max_bytes=300, compress=True)
+    logger = logging.getLogger("patbot.transcript")
+    level = logger.level
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    try:
+        transcript("p1", "doctor", text="Hello, how are you?")
+        transcript("p2", "doctor", text="Any fever?")
+        for i in range(5):
+            transcript("p1", "patient", text=f"reply {i}", stage="greeting", accepted=False)
+        logging.getLogger("other").info("not a transcript")
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(level)
+        handler.close()
+
+    rotated = sorted(tmp_path.glob("p1.*.jsonl.gz"))
+    assert rotated
+    lines = [json.loads(line) for line in gzip.open(rotated[0], "rt")]
+    assert lines[0]["event"] == "doctor"
+    assert lines[0]["text"] == "Hello, how are you?"
+    assert lines[1] == {**lines[1], "patient_id": "p1", "event": "patient", "stage": "greeting"}
+
+    p2 = [json.loads(line) for line in open(tmp_path / "p2.jsonl")]
+    assert [line["text"] for line in p2] == ["Any fever?"]
+
+
+def test_queue_handler_defers_formatting():
+    records: queue.Queue = queue.Queue()
+    handler = DeferredQueueHandler(records)
+
+    class Lazy:
+        formatted = False
+
+        def __str__(self):
+            Lazy.formatted = True
+            return "lazy"
+
+    record = logging.LogRecord("x", logging.INFO, __file__, 1, "value: %s", (Lazy(),), None)
+    handler.handle(record)
+
+    assert not Lazy.formatted
+    assert records.get_nowait().getMessage() == "value: lazy"
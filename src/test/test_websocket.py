@@ -0,0 +1,164 @@
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import logging
+import time
+
+import ormsgpack
+from fastapi.testclient import TestClient
+
+from main import app, manager
+from patient import models
+from patient.fake import FakeChatModel
+from patient.transcripts import TRANSCRIPT_LOGGER
+
+
+def test_patient_websocket_streams_deltas(monkeypatch):
+    monkeypatch.setitem(models.MODELS, "patient", FakeChatModel(responses=["I have a sore throat."]))
+    client = TestClient(app)
+
+    patient_id = client.post("/api/doctor/doc_1/create-patient").json()["patient_id"]
+
+    with client.websocket_connect(f"/ws/patient/{patient_id}") as ws:
+        assert ws.receive_json()["type"] == "system"
+        ws.send_json({"message": "What symptoms are you experiencing?"})
+
+        deltas = []
+        frame = ws.receive_json()
+        while frame["type"] == "patient_response_delta":
+            deltas.append(frame["content"])
+            frame = ws.receive_json()
+
+    assert "".join(deltas) == "I have a sore throat."
+    assert frame["type"] == "patient_response"
+    assert frame["content"] == "I have a sore throat."
+    assert frame["stage"] == "symptom_inquiry"
+    assert len(frame["revealed_symptoms"]) == 2
+    assert frame["accepted"] is False
+
+    metrics = client.get("/metrics").text
+    assert "# TYPE patbot_turn_ttft_seconds histogram" in metrics
+    assert 'patbot_turn_ttft_seconds_bucket{stage="symptom_inquiry",condition=' in metrics
+    assert 'patbot_node_seconds_count{node="generate_response",stage="symptom_inquiry"' in metrics
+    assert 'patbot_llm_tokens_total{node="generate_response",direction="output"}' in metrics
+    assert 'patbot_turn_tokens_count{direction="input",stage="symptom_inquiry"' in metrics
+    assert 'patbot_ws_send_seconds_count{frame="patient_response"}' in metrics
+
+
+def test_doctor_channel_multiplexes_patients(monkeypatch):
+    monkeypatch.setitem(models.MODELS, "patient", FakeChatModel(responses=["My throat hurts."]))
+    client = TestClient(app)
+
+    first = client.post("/api/doctor/doc_mux/create-patient").json()["patient_id"]
+    second = client.post("/api/doctor/doc_mux/create-patient").json()["patient_id"]
+    other = client.post("/api/doctor/doc_other/create-patient").json()["patient_id"]
+
+    with client.websocket_connect("/ws/doctor/doc_mux?encoding=msgpack") as ws:
+        def receive():
+            return ormsgpack.unpackb(ws.receive_bytes())
+
+        def send(frame):
+            ws.send_bytes(ormsgpack.packb(frame))
+
+        hello = receive()
+        assert hello["encoding"] == "msgpack"
+        assert {first, second} <= set(hello["patients"])
+
+        send({"type": "attach", "patient_id": first})
+        attached = receive()
+        assert attached["patient_id"] == first
+        assert attached["revealed_symptoms"] == [] and attached["stage"] == "greeting"
+
+        send({"type": "attach", "patient_id": second})
+        assert receive()["patient_id"] == second
+
+        send({"type": "attach", "patient_id": other})
+        assert receive()["type"] == "error"
+
+        send({"type": "message", "patient_id": first, "message": "What symptoms are you experiencing?"})
+        send({"type": "message", "patient_id": second, "message": "What symptoms are you experiencing?"})
+        responses = {}
+        while len(responses) < 2:
+            frame = receive()
+            if frame["type"] == "patient_response":
+                responses[frame["patient_id"]] = frame
+
+        for frame in responses.values():
+            assert frame["content"] == "My throat hurts."
+            assert len(frame["new_symptoms"]) == 2
+            assert frame["stage"] == "symptom_inquiry"
+            assert "revealed_symptoms" not in frame and "accepted" not in frame
+
+        send({"type": "message", "patient_id": first, "message": "What symptoms are you experiencing?"})
+        frame = receive()
+        while frame["type"] != "patient_response":
+            frame = receive()
+        assert "stage" not in frame
+
+        send({"type": "close", "patient_id": second})
+        assert receive() == {"type": "closed", "patient_id": second}
+
+    patients = client.get("/api/doctor/doc_mux/patients").json()["patients"]
+    assert [p["patient_id"] for p in patients] == [first]
+
+
+class BrokenModel(FakeChatModel):
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        raise RuntimeError("model down")
+        yield
+
+
+def test_doctor_disconnect_releases_patients_whose_turn_failed(monkeypatch):
+    monkeypatch.setitem(models.MODELS, "patient", BrokenModel())
+    client = TestClient(app)
+    patient_id = client.post("/api/doctor/doc_broken/create-patient").json()["patient_id"]
+
+    with client.websocket_connect("/ws/doctor/doc_broken") as ws:
+        ws.receive_json()
+        # Attached by the message itself, with no frame sent before the turn fails.
+        ws.send_json({"type": "message", "patient_id": patient_id, "message": "What symptoms are you experiencing?"})
+        frame = ws.receive_json()
+        while frame["type"] != "error":
+            frame = ws.receive_json()
+        assert "model down" in frame["content"]
+
+    assert patient_id not in manager.patient_connections
+    manager.reap(now=time.time() + manager.session_ttl + 1)
+    assert manager.get_patient(patient_id) is None
+
+
+def test_unknown_patient_websocket_writes_no_transcript():
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    logger = logging.getLogger(TRANSCRIPT_LOGGER)
+    logger.addHandler(handler)
+    try:
+        with TestClient(app).websocket_connect("/ws/patient/patient_missing") as ws:
+            frame = ws.receive_json()
+    finally:
+        logger.removeHandler(handler)
+
+    assert frame["type"] == "error"
+    assert "patient_missing" not in manager.patient_connections
+    assert [r for r in records if r.patient_id == "patient_missing"] == []
+
+
+def test_turn_reports_a_session_ended_mid_consultation(monkeypatch):
+    monkeypatch.setitem(models.MODELS, "patient", FakeChatModel(responses=["I feel dizzy."]))
+    client = TestClient(app)
+    patient_id = client.post("/api/doctor/doc_gone/create-patient").json()["patient_id"]
+
+    with client.websocket_connect(f"/ws/patient/{patient_id}") as ws:
+        ws.receive_json()
+        manager.store.remove(patient_id)
+        ws.send_json({"message": "How are you feeling?"})
+        frame = ws.receive_json()
+
+    # The turn is refused before the model runs, not after it streamed.
+    assert frame["type"] == "error"
+    assert "session has ended" in frame["content"]